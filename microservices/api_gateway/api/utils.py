@@ -1,85 +1,131 @@
 import json
-from typing import Optional, Union
+from typing import AsyncIterator, Optional, Union
 from urllib.parse import urljoin
 
 import httpx
 from fastapi import Request
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 from microservices.api_gateway.config import logger
+from microservices.api_gateway.dependencies import upstream_pool
 from microservices.libs.schemas.common import ResponseWrapper
+from microservices.libs.utils.consistency import WRITE_TIMESTAMP_HEADER
+from microservices.libs.utils.http_pool import HOP_BY_HOP_HEADERS
 from microservices.libs.utils.logger import trace_id_var
 
+RAW_RESPONSE_HEADER = "x-raw-response"
+
+_ENVELOPE_PREFIX = b'{"data":'
+_ENVELOPE_SUFFIX = b',"success":true,"error":null}'
+_EMPTY_ENVELOPE = ResponseWrapper(success=True).model_dump()
+
 
 async def forward_request(
         base_url: str, path: Optional[str], request: Request
-) -> Union[JSONResponse, Response]:
+) -> Union[JSONResponse, Response, StreamingResponse]:
     if not base_url.endswith('/'):
         base_url += '/'
 
     url_to_forward = urljoin(base_url, path) if path is not None else base_url
 
-    headers = dict(request.headers)
+    headers = {k: v for k, v in request.headers.items() if k not in HOP_BY_HOP_HEADERS}
     headers.pop("host", None)
+    headers.pop(RAW_RESPONSE_HEADER, None)
     headers["X-Trace-ID"] = trace_id_var.get()
 
-    body = await request.body()
-    params = request.query_params
+    raw = request.headers.get(RAW_RESPONSE_HEADER, "").lower() == "true"
+    has_body = request.method not in ("GET", "HEAD", "DELETE", "OPTIONS")
+
+    try:
+        client = upstream_pool.get_client(url_to_forward)
+        upstream_request = client.build_request(
+            method=request.method,
+            url=url_to_forward,
+            headers=headers,
+            params=request.query_params,
+            content=request.stream() if has_body else None
+        )
+        response = await upstream_pool.send(client, upstream_request, stream=True)
+    except httpx.RequestError as e:
+        logger.error(f"Request failed for {url_to_forward}: {e}", exc_info=True)
+        wrapped_response = ResponseWrapper(
+            success=False, error=f"Service unavailable: {base_url}"
+        )
+        return JSONResponse(
+            content=wrapped_response.model_dump(),
+            status_code=503
+        )
 
-    async with httpx.AsyncClient() as client:
+    if response.is_error:
         try:
-            response = await client.request(
-                method=request.method,
-                url=url_to_forward,
-                headers=headers,
-                params=params,
-                content=body,
-                timeout=120.0,
-            )
-            response.raise_for_status()
-
-            if request.method == "HEAD":
-                return Response(status_code=response.status_code)
-
-            final_status_code = response.status_code
-
-            try:
-                response_data = response.json()
-                wrapped_response = ResponseWrapper(data=response_data, success=True)
-            except json.decoder.JSONDecodeError:
-                wrapped_response = ResponseWrapper(success=True)
-                final_status_code = 200
-
-            return JSONResponse(
-                content=wrapped_response.model_dump(),
-                status_code=final_status_code
-            )
-        except httpx.HTTPStatusError as e:
-            try:
-                error_details = e.response.json()
-                error_message = error_details.get("detail", e.response.text)
-            except json.JSONDecodeError:
-                error_message = e.response.text
-
-            wrapped_response = ResponseWrapper(success=False, error=error_message)
-            return JSONResponse(
-                content=wrapped_response.model_dump(),
-                status_code=e.response.status_code,
-            )
-        except httpx.RequestError as e:
-            logger.error(f"Request failed for {url_to_forward}: {e}", exc_info=True)
-            wrapped_response = ResponseWrapper(
-                success=False, error=f"Service unavailable: {base_url}"
-            )
-            return JSONResponse(
-                content=wrapped_response.model_dump(),
-                status_code=503
-            )
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error for {url_to_forward}: {e}", exc_info=True)
-            wrapped_response = ResponseWrapper(
-                success=False, error="Invalid response format from upstream service"
-            )
-            return JSONResponse(
-                content=wrapped_response.model_dump(), status_code=502
-            )
+            await response.aread()
+        finally:
+            await upstream_pool.close(response)
+        return _wrap_error(response)
+
+    # Consistency tokens (read-your-writes) are handed back to the client.
+    passthrough = {
+        name: response.headers[name] for name in (WRITE_TIMESTAMP_HEADER,) if name in response.headers
+    }
+
+    if request.method == "HEAD":
+        await upstream_pool.close(response)
+        return Response(status_code=response.status_code, headers=passthrough)
+
+    if raw or _is_stream(response):
+        return StreamingResponse(
+            _relay(response, envelope=False),
+            status_code=response.status_code,
+            media_type=response.headers.get("content-type"),
+            headers=passthrough
+        )
+
+    if not _has_json_body(response):
+        await upstream_pool.close(response)
+        return JSONResponse(content=_EMPTY_ENVELOPE, status_code=200, headers=passthrough)
+
+    return StreamingResponse(
+        _relay(response, envelope=True),
+        status_code=response.status_code,
+        media_type="application/json",
+        headers=passthrough
+    )
+
+
+async def _relay(response: httpx.Response, envelope: bool) -> AsyncIterator[bytes]:
+    """
+    Streams the upstream body, optionally spliced into the ResponseWrapper envelope without decoding it.
+    """
+    try:
+        if envelope:
+            yield _ENVELOPE_PREFIX
+        async for chunk in response.aiter_bytes():
+            yield chunk
+        if envelope:
+            yield _ENVELOPE_SUFFIX
+    finally:
+        await upstream_pool.close(response)
+
+
+def _is_stream(response: httpx.Response) -> bool:
+    return response.headers.get("content-type", "").startswith("application/x-ndjson")
+
+
+def _has_json_body(response: httpx.Response) -> bool:
+    if response.status_code == 204 or response.headers.get("content-length") == "0":
+        return False
+    return "json" in response.headers.get("content-type", "")
+
+
+def _wrap_error(response: httpx.Response) -> JSONResponse:
+    try:
+        error_details = response.json()
+        error_message = error_details.get("detail", response.text)
+    except json.JSONDecodeError:
+        error_message = response.text
+
+    wrapped_response = ResponseWrapper(success=False, error=error_message)
+    return JSONResponse(
+        content=wrapped_response.model_dump(),
+        status_code=response.status_code,
+    )
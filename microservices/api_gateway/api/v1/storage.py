@@ -1,9 +1,18 @@
+from typing import Any, Dict
+
 from fastapi import APIRouter, Request, Body, Depends
 
 from microservices.api_gateway.api.utils import forward_request
 from microservices.api_gateway.auth import verify_admin
 from microservices.api_gateway.config import config
-from microservices.libs.schemas.router import TableDefinition, CreateRecordRequest
+from microservices.libs.schemas.router import (
+    BatchCreateRequest,
+    BatchKeysRequest,
+    CreateRecordRequest,
+    TableDefinition,
+    UpdateRecordRequest
+)
+from microservices.libs.schemas.shard import IndexQuery
 
 router = APIRouter()
 
@@ -33,12 +42,61 @@ async def proxy_create_record(request: Request, body: CreateRecordRequest = Body
     return await forward_request(config.router_service_url, "records", request)
 
 
+@router.post("/records/{table_name}/batch/put", summary="Create multiple records")
+async def proxy_create_records(table_name: str, request: Request, body: BatchCreateRequest = Body(...)):
+    path = f"records/{table_name}/batch/put"
+    return await forward_request(config.router_service_url, path, request)
+
+
+@router.post("/records/{table_name}/batch/get", summary="Read multiple records")
+async def proxy_read_records(table_name: str, request: Request, body: BatchKeysRequest = Body(...)):
+    path = f"records/{table_name}/batch/get"
+    return await forward_request(config.router_service_url, path, request)
+
+
+@router.post("/records/{table_name}/batch/delete", summary="Delete multiple records")
+async def proxy_delete_records(table_name: str, request: Request, body: BatchKeysRequest = Body(...)):
+    path = f"records/{table_name}/batch/delete"
+    return await forward_request(config.router_service_url, path, request)
+
+
+@router.get("/records/{table_name}", summary="Scan a table as NDJSON, ordered by primary key")
+async def proxy_scan_records(table_name: str, request: Request):
+    path = f"records/{table_name}"
+    return await forward_request(config.router_service_url, path, request)
+
+
+@router.post("/records/{table_name}/_index/{field}", summary="Look up records by index")
+async def proxy_lookup_index(table_name: str, field: str, request: Request, body: IndexQuery = Body(...)):
+    path = f"records/{table_name}/_index/{field}"
+    return await forward_request(config.router_service_url, path, request)
+
+
 @router.get("/records/{table_name}/{primary_key}", summary="Read a record")
 async def proxy_read_record(table_name: str, primary_key: str, request: Request):
     path = f"records/{table_name}/{primary_key}"
     return await forward_request(config.router_service_url, path, request)
 
 
+@router.post("/records/{table_name}/{primary_key}/update", summary="Atomically update record fields")
+async def proxy_update_record(
+        table_name: str, primary_key: str, request: Request, body: UpdateRecordRequest = Body(...)
+):
+    path = f"records/{table_name}/{primary_key}/update"
+    return await forward_request(config.router_service_url, path, request)
+
+
+@router.patch("/records/{table_name}/{primary_key}", summary="Apply a JSON merge-patch to a record")
+async def proxy_patch_record(
+        table_name: str,
+        primary_key: str,
+        request: Request,
+        body: Dict[str, Any] = Body(..., media_type="application/merge-patch+json")
+):
+    path = f"records/{table_name}/{primary_key}"
+    return await forward_request(config.router_service_url, path, request)
+
+
 @router.delete("/records/{table_name}/{primary_key}", summary="Delete a record")
 async def proxy_delete_record(table_name: str, primary_key: str, request: Request):
     path = f"records/{table_name}/{primary_key}"
@@ -22,6 +22,12 @@ class Config:
         self.supabase_url: str = self._get_env_variable("SUPABASE_URL")
         self.supabase_key: str = self._get_env_variable("SUPABASE_KEY")
 
+        # Upstream connection pool
+        self.upstream_pool_max_connections: int = int(os.environ.get("UPSTREAM_POOL_MAX_CONNECTIONS", "200"))
+        self.upstream_pool_max_keepalive: int = int(os.environ.get("UPSTREAM_POOL_MAX_KEEPALIVE", "50"))
+        self.upstream_connect_timeout_seconds: float = float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT_SECONDS", "5"))
+        self.upstream_timeout_seconds: float = float(os.environ.get("UPSTREAM_TIMEOUT_SECONDS", "120"))
+
     @staticmethod
     def _get_env_variable(var_name: str) -> str:
         value = os.environ.get(var_name)
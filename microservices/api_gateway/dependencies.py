@@ -0,0 +1,11 @@
+from microservices.api_gateway.config import config, logger
+from microservices.libs.utils.http_pool import HttpClientPool
+
+upstream_pool = HttpClientPool(
+    name="gateway-upstreams",
+    logger=logger,
+    max_connections=config.upstream_pool_max_connections,
+    max_keepalive_connections=config.upstream_pool_max_keepalive,
+    connect_timeout=config.upstream_connect_timeout_seconds,
+    timeout=config.upstream_timeout_seconds
+)
@@ -1,14 +1,26 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
 
 from api.v1.router import router as router_v1
+from microservices.api_gateway.dependencies import upstream_pool
 from microservices.libs.utils.middleware import TraceIdMiddleware
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await upstream_pool.start()
+    yield
+    await upstream_pool.stop()
+
+
 app = FastAPI(
     title="API Gateway",
     description="The single entry point for all microservices.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(TraceIdMiddleware)
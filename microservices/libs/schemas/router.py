@@ -1,25 +1,88 @@
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Union
 
 from pydantic import BaseModel, Field, HttpUrl
 
+from microservices.libs.schemas.shard import AckMode, IndexDefinition
+
 
 class TableDefinition(BaseModel):
     table_name: str = Field(..., description="The name of the table to define")
     primary_key: str = Field(..., description="The name of the primary key field")
+    ack_mode: Optional[AckMode] = Field(
+        None, description="Replication acknowledgement mode for writes (shard default if omitted)"
+    )
+    indexes: List[IndexDefinition] = Field(
+        default_factory=list, description="Secondary indexes on value fields"
+    )
+    cache_ttl_seconds: Optional[float] = Field(
+        None, ge=0, description="How long routers may cache reads of this table (router default if omitted, 0 disables)"
+    )
+    ttl_seconds: Optional[float] = Field(
+        None, gt=0, description="Default time to live of the table's records (records never expire if omitted)"
+    )
 
 
 class CreateRecordRequest(BaseModel):
     table_name: str = Field(..., description="The name of the table to insert the record into")
     value: Dict[str, Any] = Field(..., description="The record data to store")
+    ttl_seconds: Optional[float] = Field(
+        None, gt=0, description="Time to live of the record (table default if omitted)"
+    )
+    if_absent: bool = Field(False, description="Only create the record if the key does not exist yet")
+    if_version: Optional[int] = Field(None, description="Only overwrite the record if it is at this version")
+
+
+class UpdateRecordRequest(BaseModel):
+    patch: Optional[Dict[str, Any]] = Field(
+        None, description="RFC 7396 merge-patch, applied before `merge` and `increment`"
+    )
+    increment: Dict[str, Union[int, float]] = Field(
+        default_factory=dict, description="Numeric fields to add to (missing fields start at 0)"
+    )
+    merge: Dict[str, Any] = Field(
+        default_factory=dict, description="Fields to set; nested objects are merged into the existing ones"
+    )
+    if_version: Optional[int] = Field(None, description="Only apply if the record is at this version")
+    upsert: bool = Field(False, description="Create the record if it does not exist")
 
 
 class RecordResponse(BaseModel):
     table_name: str
     primary_key: str
     value: Any
+    version: Optional[int] = Field(None, description="Timestamp of the last write, usable as `if_version`")
+
+
+class BatchCreateRequest(BaseModel):
+    values: List[Dict[str, Any]] = Field(..., description="The records to store, each containing the primary key")
+    ttl_seconds: Optional[float] = Field(
+        None, gt=0, description="Time to live of the records (table default if omitted)"
+    )
+
+
+class BatchKeysRequest(BaseModel):
+    primary_keys: List[str] = Field(..., description="The primary keys of the records to read or delete")
+
+
+class BatchRecordResult(BaseModel):
+    primary_key: Optional[str]
+    success: bool
+    status_code: int
+    value: Any = None
+    error: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    table_name: str
+    succeeded: int
+    failed: int
+    results: List[BatchRecordResult]
 
 
 class ShardRegistration(BaseModel):
     shard_url: HttpUrl = Field(..., description="The advertised URL of the shard that is registering")
     group_id: str = Field(..., description="The ID of the shard group (replica set)")
     is_leader: bool = Field(False, description="Whether this node is the leader of the group")
+    epoch: int = Field(0, ge=0, description="Leadership epoch the node last took part in")
+    replication_topic: Optional[str] = Field(None, description="Kafka topic the group replicates its writes through")
+    weight: int = Field(1, ge=1, le=64, description="Relative share of the ring for the group (taken from leaders)")
@@ -1,21 +1,164 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Literal, Optional, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+AckMode = Literal["local", "kafka", "replicas"]
+IndexKind = Literal["hash", "sorted"]
 
 
 class RecordData(BaseModel):
     value: Dict[str, Any]
+    ttl_seconds: Optional[float] = Field(None, gt=0, description="Expire the record after this many seconds")
+
+
+class RecordUpdate(BaseModel):
+    patch: Optional[Dict[str, Any]] = Field(
+        None, description="RFC 7396 merge-patch, applied before `merge` and `increment`"
+    )
+    increment: Dict[str, Union[int, float]] = Field(
+        default_factory=dict, description="Numeric fields to add to (missing fields start at 0)"
+    )
+    merge: Dict[str, Any] = Field(
+        default_factory=dict, description="Fields to set; nested objects are merged into the existing ones"
+    )
+    if_version: Optional[int] = Field(None, description="Only apply if the record is at this version")
+    initial: Optional[Dict[str, Any]] = Field(
+        None, description="Value to start from when the record does not exist (404 if omitted)"
+    )
+    ttl_seconds: Optional[float] = Field(None, gt=0, description="Expiry of a record created by this update")
 
 
 class RecordResponse(BaseModel):
     table_name: str
     primary_key: str
     value: Any
+    version: Optional[int] = None
+
+
+class BatchRecordItem(BaseModel):
+    primary_key: str
+    value: Dict[str, Any]
+    ttl_seconds: Optional[float] = Field(None, gt=0, description="Expire the record after this many seconds")
+
+
+class BatchWriteData(BaseModel):
+    records: List[BatchRecordItem]
+
+
+class BatchKeysData(BaseModel):
+    primary_keys: List[str]
+
+
+class MigratedRecord(BaseModel):
+    primary_key: str
+    value: Any
+    timestamp: int
+    expires_at: Optional[int] = None
+
+
+class MigrationData(BaseModel):
+    records: List[MigratedRecord]
+
+
+class MigrationResult(BaseModel):
+    table_name: str
+    imported: int
+    skipped: int
+
+
+class BatchItemResult(BaseModel):
+    primary_key: str
+    status_code: int
+    value: Any = None
+    error: Optional[str] = None
+
+
+class BatchResult(BaseModel):
+    table_name: str
+    results: List[BatchItemResult]
+
+
+class ScanRecord(BaseModel):
+    primary_key: str
+    value: Any
+    timestamp: Optional[int] = None
+    expires_at: Optional[int] = None
+
+
+class ScanPage(BaseModel):
+    table_name: str
+    records: List[ScanRecord]
+    next_cursor: Optional[str] = None
+
+
+class IndexDefinition(BaseModel):
+    field: str = Field(..., description="The value field to index")
+    kind: IndexKind = Field("hash", description="'hash' for equality lookups, 'sorted' for equality and ranges")
+
+
+class TableIndexes(BaseModel):
+    indexes: List[IndexDefinition]
+
+
+class IndexQuery(BaseModel):
+    value: Any = Field(None, description="Exact value to look up")
+    start: Any = Field(None, description="Inclusive lower bound (sorted indexes only)")
+    end: Any = Field(None, description="Exclusive upper bound (sorted indexes only)")
+    limit: int = Field(1000, ge=1, le=10000)
+
+    @property
+    def is_range(self) -> bool:
+        return "value" not in self.model_fields_set
+
+
+class IndexMatch(BaseModel):
+    primary_key: str
+    index_value: Any
+    value: Any
+
+
+class IndexLookupResult(BaseModel):
+    table_name: str
+    field: str
+    records: List[IndexMatch]
+
+
+class NodeStatus(BaseModel):
+    group_id: str
+    role: Literal["leader", "follower"]
+    epoch: int
+    applied_timestamp: int
+
+
+class TableMemoryUsage(BaseModel):
+    records: int
+    payload_bytes: int = Field(..., description="Serialized record values")
+    key_bytes: int = Field(..., description="Primary key strings")
+    overhead_bytes: int = Field(..., description="Estimated record, hash map and key list overhead")
+    total_bytes: int
+    cold_records: int = Field(0, description="Records whose value was spilled to cold storage")
+    cold_bytes: int = Field(0, description="Spilled record values (on disk, not included in total_bytes)")
+
+
+class MemoryUsage(BaseModel):
+    tables: Dict[str, TableMemoryUsage]
+    total_bytes: int
+    hot_memory_limit: Optional[int] = None
+    cold_storage: Optional[Dict[str, int]] = None
+
+
+class EpochChange(BaseModel):
+    epoch: int = Field(..., ge=0, description="Leadership epoch of the group after the change")
 
 
 class ReplicationMessage(BaseModel):
     operation: str
     table_name: str
-    primary_key: str
+    primary_key: str = ""
     value: Optional[Dict[str, Any]] = None
     timestamp: int
+    epoch: int = 0
+    expires_at: Optional[int] = None
+    # Version a "patch" was made against.
+    base_timestamp: Optional[int] = None
+    batch: Optional[List["ReplicationMessage"]] = None
@@ -0,0 +1,114 @@
+import logging
+import mmap
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+_SEGMENT_PREFIX = "cold-"
+_SEGMENT_SUFFIX = ".seg"
+
+
+class ColdSegment:
+    """
+    Space of rewritten, deleted or promoted payloads is only reclaimed when the segment is compacted away.
+    """
+
+    def __init__(self, segment_id: int, path: str, capacity: int):
+        self.segment_id = segment_id
+        self.path = path
+        self.capacity = capacity
+        self.size = 0
+        self.live_bytes = 0
+        self.sealed = False
+
+        self._file = open(path, "w+b")
+        self._file.truncate(capacity)
+        self._map = mmap.mmap(self._file.fileno(), capacity)
+
+    def append(self, payload: bytes) -> Optional[int]:
+        offset = self.size
+        if offset + len(payload) > self.capacity:
+            return None
+        self._map[offset:offset + len(payload)] = payload
+        self.size += len(payload)
+        self.live_bytes += len(payload)
+        return offset
+
+    def read(self, offset: int, length: int) -> bytes:
+        return self._map[offset:offset + length]
+
+    def release(self, length: int):
+        self.live_bytes -= length
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class ColdStore:
+    """
+    A cache of the in-memory state, not a durability mechanism: it is wiped on startup and rebuilt from the WAL.
+    """
+
+    def __init__(self, directory: str, logger: logging.Logger, segment_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.logger = logger
+        self.segment_bytes = segment_bytes
+
+        self._segments: Dict[int, ColdSegment] = {}
+        self._active: Optional[ColdSegment] = None
+        self._next_segment_id = 0
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX):
+                os.remove(os.path.join(self.directory, name))
+        self.logger.info(f"Cold storage tier enabled in '{self.directory}'")
+
+    def close(self):
+        for segment in list(self._segments.values()):
+            self.drop(segment)
+        self._active = None
+
+    def write(self, payload: bytes) -> Tuple[ColdSegment, int]:
+        if self._active is not None:
+            offset = self._active.append(payload)
+            if offset is not None:
+                return self._active, offset
+            self._active.sealed = True
+
+        self._active = self._new_segment(max(self.segment_bytes, len(payload)))
+        return self._active, self._active.append(payload)
+
+    def reclaimable(self, max_live_ratio: float) -> Tuple[List[ColdSegment], List[ColdSegment]]:
+        """
+        Sealed segments that can be dropped right away, and sparse ones whose payloads must be relocated first.
+        """
+        empty, sparse = [], []
+        for segment in self._segments.values():
+            if not segment.sealed:
+                continue
+            if segment.live_bytes <= 0:
+                empty.append(segment)
+            elif segment.live_bytes < segment.size * max_live_ratio:
+                sparse.append(segment)
+        return empty, sparse
+
+    def drop(self, segment: ColdSegment):
+        self._segments.pop(segment.segment_id, None)
+        segment.close()
+        os.remove(segment.path)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "segments": len(self._segments),
+            "disk_bytes": sum(segment.size for segment in self._segments.values()),
+            "live_bytes": sum(segment.live_bytes for segment in self._segments.values())
+        }
+
+    def _new_segment(self, capacity: int) -> ColdSegment:
+        segment_id = self._next_segment_id
+        self._next_segment_id += 1
+        path = os.path.join(self.directory, f"{_SEGMENT_PREFIX}{segment_id:08d}{_SEGMENT_SUFFIX}")
+        segment = self._segments[segment_id] = ColdSegment(segment_id, path, capacity)
+        return segment
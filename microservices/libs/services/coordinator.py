@@ -1,43 +1,160 @@
+import asyncio
+import heapq
 import json
 import logging
-import random
-from typing import Any, Dict, List
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from urllib.parse import urljoin
 
 import httpx
 from fastapi import HTTPException, Request, Response
-from prometheus_client import Gauge
+from prometheus_client import Counter, Gauge
 
-from microservices.libs.schemas.router import RecordResponse, TableDefinition
+from microservices.libs.schemas.router import (
+    BatchRecordResult,
+    BatchResponse,
+    CreateRecordRequest,
+    RecordResponse,
+    TableDefinition,
+    UpdateRecordRequest
+)
+from microservices.libs.schemas.shard import IndexLookupResult, IndexMatch, IndexQuery
 from microservices.libs.services.hashing import ConsistentHashingRing
+from microservices.libs.services.health import HealthMonitor
+from microservices.libs.services.load_balancer import ReadBalancer
+from microservices.libs.services.metadata_store import MetadataStore
+from microservices.libs.services.rebalancer import Rebalancer
+from microservices.libs.services.record_cache import RecordCache
+from microservices.libs.services.table import term_sort_key
+from microservices.libs.utils.consistency import APPLIED_TIMESTAMP_HEADER, LEADER_EPOCH_HEADER, consistency_var
+from microservices.libs.utils.http_pool import HOP_BY_HOP_HEADERS, HttpClientPool
 from microservices.libs.utils.logger import trace_id_var
+from microservices.libs.utils.singleflight import SingleFlight
+
+FAILOVERS = Counter('router_leader_failovers_total', 'Leader failovers performed by the router', ['group'])
+GROUP_REQUESTS = Counter('router_group_requests_total', 'Records requested from each shard group', ['group'])
 
 
 class CoordinatorService:
-    def __init__(self, hashing_ring: ConsistentHashingRing, logger: logging.Logger):
+    def __init__(
+            self,
+            hashing_ring: ConsistentHashingRing,
+            http_pool: HttpClientPool,
+            logger: logging.Logger,
+            read_balancer: Optional[ReadBalancer] = None,
+            record_cache: Optional[RecordCache] = None,
+            metadata_store: Optional[MetadataStore] = None,
+            scan_page_size: int = 500,
+            rebalance_batch_size: int = 500,
+            rebalance_batch_interval: float = 0.05,
+            health_check_interval: float = 1.0,
+            health_check_timeout: float = 0.5,
+            health_failure_threshold: int = 3,
+            health_recovery_successes: int = 2
+    ):
         self.hashing_ring = hashing_ring
+        self.http_pool = http_pool
         self.logger = logger
+        self.read_balancer = read_balancer or ReadBalancer(logger)
+        self.record_cache = record_cache or RecordCache(logger)
+        self.metadata_store = metadata_store
+        self._read_flights = SingleFlight("router-shard-reads")
+        self.scan_page_size = scan_page_size
         self._table_definitions: Dict[str, TableDefinition] = {}
         self._shard_topology: Dict[str, Dict[str, Any]] = {}
+        self._ring_revision = 0
+        self.rebalancer = Rebalancer(
+            self, logger, batch_size=rebalance_batch_size, batch_interval=rebalance_batch_interval
+        )
+        self.health = HealthMonitor(
+            self,
+            logger,
+            interval=health_check_interval,
+            timeout=health_check_timeout,
+            failure_threshold=health_failure_threshold,
+            recovery_successes=health_recovery_successes
+        )
         Gauge('router_active_shards_total', 'Number of active shard groups').set(len(self._shard_topology))
 
+    async def start(self):
+        await self.http_pool.start()
+        if self.metadata_store:
+            await self.metadata_store.start(self._apply_metadata)
+        await self.record_cache.start()
+        await self.health.start()
+        await self.rebalancer.start()
+
+    async def stop(self):
+        await self.health.stop()
+        await self.record_cache.stop()
+        await self.rebalancer.stop()
+        if self.metadata_store:
+            await self.metadata_store.stop()
+        await self.http_pool.stop()
+
+    @property
+    def is_controller(self) -> bool:
+        """
+        The holder of the controller lease, or the only router.
+        """
+        return self.metadata_store is None or self.metadata_store.is_controller
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        return self.http_pool.get_stats()
+
     def get_topology_status(self) -> Dict[str, Any]:
         return {
             "shards_count": len(self._shard_topology),
             "tables_count": len(self._table_definitions),
             "topology": self._shard_topology,
+            "ring": self.hashing_ring.get_groups(),
+            "ring_shares": self.hashing_ring.get_shares(),
+            "health": self.health.get_status(),
+            "controller": self.is_controller,
             "tables": [t.table_name for t in self._table_definitions.values()]
         }
 
-    async def register_shard_node(self, group_id: str, shard_url: str, is_leader: bool):
+    def get_rebalance_status(self) -> Dict[str, Any]:
+        return self.rebalancer.get_status()
+
+    def get_read_balancer_stats(self) -> Dict[str, Any]:
+        return self.read_balancer.get_stats()
+
+    def get_record_cache_stats(self) -> Dict[str, Any]:
+        return self.record_cache.get_stats()
+
+    async def register_shard_node(
+            self,
+            group_id: str,
+            shard_url: str,
+            is_leader: bool,
+            epoch: int = 0,
+            replication_topic: Optional[str] = None,
+            weight: int = 1
+    ) -> Dict[str, Any]:
+        """
+        A leader that comes back after its group failed over rejoins as a follower.
+        """
         if group_id not in self._shard_topology:
-            self._shard_topology[group_id] = {"leader": None, "followers": []}
-            await self.hashing_ring.add_group(group_id)
+            self._shard_topology[group_id] = {"leader": None, "followers": [], "epoch": 0}
+        group_info = self._shard_topology[group_id]
+        group_info["epoch"] = max(group_info["epoch"], epoch)
+        if replication_topic:
+            group_info["replication_topic"] = replication_topic
+        self.health.forget(shard_url)
+
+        old_leader = group_info["leader"]
+        if is_leader and old_leader and old_leader != shard_url and self.health.is_available(old_leader):
+            self.logger.warning(
+                f"{shard_url} registered as leader of {group_id}, but {old_leader} leads epoch {group_info['epoch']}"
+            )
+            is_leader = False
 
         if is_leader:
-            old_leader = self._shard_topology[group_id]["leader"]
+            group_info["weight"] = weight
             if old_leader and old_leader != shard_url:
                 self.logger.warning(f"Replacing leader for {group_id}: {old_leader} -> {shard_url}")
+                group_info["epoch"] += 1
             self._shard_topology[group_id]["leader"] = shard_url
             if shard_url in self._shard_topology[group_id]["followers"]:
                 self._shard_topology[group_id]["followers"].remove(shard_url)
@@ -47,24 +164,281 @@ class CoordinatorService:
             if self._shard_topology[group_id]["leader"] == shard_url:
                 self._shard_topology[group_id]["leader"] = None
 
+        self.read_balancer.set_node(group_id, shard_url, is_leader)
+        if replication_topic:
+            self.record_cache.watch_topic(replication_topic)
         self.logger.info(f"Registered node {shard_url} for group {group_id} (Leader: {is_leader})")
+        await self._publish_topology(f"group/{group_id}", group_info)
+
+        if is_leader:
+            await self.rebalancer.reconcile()
+        return {"role": "leader" if is_leader else "follower", "epoch": group_info["epoch"]}
+
+    def get_nodes(self) -> List[Tuple[str, str]]:
+        return [
+            (group_id, node)
+            for group_id, group_info in self._shard_topology.items()
+            for node in [group_info["leader"], *group_info["followers"]]
+            if node
+        ]
+
+    def get_shard_groups(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self._shard_topology)
+
+    def get_group_weight(self, group_id: str) -> int:
+        return self._shard_topology.get(group_id, {}).get("weight", 1)
+
+    def get_group(self, group_id: str) -> Dict[str, Any]:
+        group_info = self._shard_topology.get(group_id)
+        if group_info is None:
+            raise HTTPException(status_code=404, detail=f"Shard group '{group_id}' not found")
+        return group_info
+
+    def get_leader(self, group_id: str) -> Optional[str]:
+        group_info = self._shard_topology.get(group_id)
+        return group_info["leader"] if group_info else None
+
+    async def fail_over(self, group_id: str):
+        """
+        Every attempt takes a fresh epoch: a promotion that timed out may still have gone through.
+        """
+        group_info = self._shard_topology.get(group_id)
+        if not group_info or not self.is_controller:
+            return
+        old_leader = group_info["leader"]
+        candidates = sorted(
+            (node for node in group_info["followers"] if self.health.is_available(node)),
+            key=self.health.applied_timestamp,
+            reverse=True
+        )
+        if not candidates:
+            self.logger.error(f"Leader of group {group_id} is down and no follower can take over")
+            return
 
-    def register_table(self, table: TableDefinition) -> None:
+        epoch = max(group_info["epoch"], *(self.health.epoch(node) for node in candidates))
+        for candidate in candidates:
+            epoch += 1
+            try:
+                response = await self.http_pool.request(
+                    "POST",
+                    urljoin(candidate, "api/v1/node/promote"),
+                    json={"epoch": epoch},
+                    headers={"X-Trace-ID": trace_id_var.get()}
+                )
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                self.logger.error(f"Failed to promote {candidate} in group {group_id}: {e}")
+                continue
+
+            group_info["followers"].remove(candidate)
+            if old_leader:
+                group_info["followers"].append(old_leader)
+                self.read_balancer.set_node(group_id, old_leader, False)
+            group_info["leader"] = candidate
+            group_info["epoch"] = epoch
+            self.read_balancer.set_node(group_id, candidate, True)
+            FAILOVERS.labels(group_id).inc()
+            self.logger.warning(f"Failed over group {group_id}: {old_leader} -> {candidate} (epoch {epoch})")
+            await self._publish_topology(f"group/{group_id}", group_info)
+            return
+
+    async def demote_node(self, group_id: str, node: str):
+        epoch = self._shard_topology[group_id]["epoch"]
+        try:
+            response = await self.http_pool.request(
+                "POST",
+                urljoin(node, "api/v1/node/demote"),
+                json={"epoch": epoch},
+                headers={"X-Trace-ID": trace_id_var.get()}
+            )
+            response.raise_for_status()
+            self.logger.warning(f"Deposed leader {node} of group {group_id} stepped down (epoch {epoch})")
+        except httpx.HTTPError as e:
+            self.logger.error(f"Failed to demote {node} in group {group_id}: {e}")
+
+    async def remove_shard_group(self, group_id: str):
+        """
+        Marks the group as draining; the controller moves its keys away and then forgets it.
+        """
+        group_info = self._shard_topology.get(group_id)
+        if group_info is None:
+            raise HTTPException(status_code=404, detail=f"Shard group '{group_id}' not found")
+        group_info["draining"] = True
+        if self.metadata_store:
+            await self.metadata_store.put(f"group/{group_id}", group_info)
+        await self.rebalancer.reconcile()
+        self.logger.info(f"Scheduled shard group '{group_id}' to be drained")
+
+    async def forget_group(self, group_id: str):
+        self._drop_group(group_id)
+        self.logger.info(f"Removed shard group '{group_id}' from the topology")
+        await self._publish_topology(f"group/{group_id}", None)
+
+    async def publish_ring(self) -> int:
+        """
+        A failure is raised: migrations wait for all routers to apply the revision.
+        """
+        self._ring_revision += 1
+        if self.metadata_store:
+            await self.metadata_store.put("ring", {**self.hashing_ring.get_state(), "revision": self._ring_revision})
+            self.metadata_store.set_status({"ring_revision": self._ring_revision})
+        return self._ring_revision
+
+    def routers_behind(self, revision: int) -> List[str]:
+        if not self.metadata_store:
+            return []
+        return [
+            router for router, status in self.metadata_store.live_routers().items()
+            if status.get("ring_revision", 0) < revision
+        ]
+
+    def _drop_group(self, group_id: str):
+        group_info = self._shard_topology.pop(group_id, None)
+        if group_info:
+            for node in [group_info["leader"], *group_info["followers"]]:
+                if node:
+                    self.read_balancer.remove_node(node)
+                    self.health.forget(node)
+
+    async def _publish_topology(self, key: str, value: Optional[Dict[str, Any]]):
+        """
+        A router that misses a change picks the group up again when it next changes.
+        """
+        if not self.metadata_store:
+            return
+        try:
+            await self.metadata_store.put(key, value)
+        except HTTPException:
+            pass
+
+    def _apply_metadata(self, key: str, value: Optional[Dict[str, Any]]):
+        kind, _, name = key.partition("/")
+        if kind == "table":
+            if value is None:
+                if self._table_definitions.pop(name, None):
+                    self.record_cache.invalidate_table(name)
+            else:
+                self._table_definitions[name] = TableDefinition(**value)
+        elif kind == "group":
+            if value is None:
+                self._drop_group(name)
+                return
+            previous = self._shard_topology.get(name)
+            nodes = {value["leader"], *value["followers"]} - {None}
+            if previous:
+                for node in {previous["leader"], *previous["followers"]} - {None} - nodes:
+                    self.read_balancer.remove_node(node)
+                    self.health.forget(node)
+                # updated in place: failover and registration keep a reference across awaits
+                previous.clear()
+                previous.update(value)
+            else:
+                self._shard_topology[name] = value
+            for node in nodes:
+                self.read_balancer.set_node(name, node, node == value["leader"])
+            if value.get("replication_topic"):
+                self.record_cache.watch_topic(value["replication_topic"])
+        elif kind == "ring":
+            self.hashing_ring.restore(value)
+            self._ring_revision = value.get("revision", self._ring_revision)
+            self.metadata_store.set_status({"ring_revision": self._ring_revision})
+
+    def get_group_leader(self, group_id: str) -> str:
+        return self._get_group_node(group_id, write_op=True)
+
+    async def register_table(self, table: TableDefinition) -> None:
         if table.table_name in self._table_definitions:
             raise HTTPException(status_code=409, detail="Table already exists")
         self._table_definitions[table.table_name] = table
+        if self.metadata_store:
+            try:
+                await self.metadata_store.put(f"table/{table.table_name}", table.model_dump())
+            except HTTPException:
+                self._table_definitions.pop(table.table_name, None)
+                raise
         self.logger.info(f"Registered table '{table.table_name}' with primary key '{table.primary_key}'")
+        if table.indexes:
+            await self._push_table_indexes(table.table_name, [index.model_dump() for index in table.indexes])
 
     def get_all_tables(self) -> List[TableDefinition]:
         return list(self._table_definitions.values())
 
-    def delete_table(self, table_name: str) -> None:
+    async def delete_table(self, table_name: str) -> None:
         if table_name not in self._table_definitions:
             raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found")
-        del self._table_definitions[table_name]
+        if self.metadata_store:
+            await self.metadata_store.put(f"table/{table_name}", None)
+        table = self._table_definitions.pop(table_name)
+        self.record_cache.invalidate_table(table_name)
         self.logger.info(f"Deleted table definition for '{table_name}'")
+        if table.indexes:
+            await self._push_table_indexes(table_name, [])
+
+    async def _push_table_indexes(self, table_name: str, indexes: List[Dict[str, Any]]):
+        async def push(shard_url: str):
+            try:
+                response = await self.http_pool.request(
+                    "PUT",
+                    urljoin(shard_url, f"api/v1/tables/{table_name}/indexes"),
+                    json={"indexes": indexes},
+                    headers={"X-Trace-ID": trace_id_var.get()}
+                )
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                self.logger.error(f"Failed to push indexes of '{table_name}' to shard '{shard_url}': {e}")
+
+        await asyncio.gather(*(push(shard_url) for shard_url in self._all_nodes()))
+
+    async def lookup_index(self, table_name: str, field: str, query: IndexQuery) -> IndexLookupResult:
+        table_definition = self._get_table_definition(table_name)
+        index = next((index for index in table_definition.indexes if index.field == field), None)
+        if index is None:
+            raise HTTPException(status_code=400, detail=f"Field '{field}' is not indexed in table '{table_name}'")
+        if query.is_range and index.kind != "sorted":
+            raise HTTPException(status_code=400, detail=f"Range lookups need a sorted index on '{field}'")
+        if not self._shard_topology:
+            raise HTTPException(status_code=503, detail="No available shard groups")
+
+        async def probe(group_id: str) -> List[IndexMatch]:
+            shard_url = self._get_group_node(group_id, write_op=False)
+            try:
+                response = await self._shard_request(
+                    shard_url,
+                    "POST",
+                    urljoin(shard_url, f"api/v1/records/{table_name}/_index/{field}"),
+                    json=query.model_dump(exclude_unset=True),
+                    headers={"X-Trace-ID": trace_id_var.get()}
+                )
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                self._handle_shard_error(e, shard_url)
+            except httpx.RequestError as e:
+                self._handle_connection_error(e, shard_url)
+            return [IndexMatch(**match) for match in response.json()["records"]]
 
-    async def create_record_on_shard(self, table_name: str, value: Dict[str, Any]) -> RecordResponse:
+        group_ids = list(self._shard_topology)
+        matches_by_key: Dict[str, IndexMatch] = {}
+        for group_id, group_matches in zip(group_ids, await asyncio.gather(*(probe(g) for g in group_ids))):
+            for match in group_matches:
+                if match.primary_key in matches_by_key and not self._owns_key(group_id, table_name, match.primary_key):
+                    continue
+                matches_by_key[match.primary_key] = match
+
+        matches = sorted(
+            matches_by_key.values(), key=lambda match: (term_sort_key(match.index_value), match.primary_key)
+        )
+        return IndexLookupResult(table_name=table_name, field=field, records=matches[:query.limit])
+
+    def _all_nodes(self) -> List[str]:
+        nodes = []
+        for group_info in self._shard_topology.values():
+            if group_info.get("leader"):
+                nodes.append(group_info["leader"])
+            nodes.extend(group_info.get("followers", []))
+        return nodes
+
+    async def create_record_on_shard(self, record: CreateRecordRequest) -> RecordResponse:
+        table_name, value = record.table_name, record.value
         table_definition = self._get_table_definition(table_name)
         primary_key_field = table_definition.primary_key
         primary_key_value = value.get(primary_key_field)
@@ -72,6 +446,17 @@ class CoordinatorService:
         if not primary_key_value:
             raise HTTPException(status_code=400, detail=f"Primary key '{primary_key_field}' is missing")
 
+        params = self._write_params(table_definition)
+        if record.if_absent:
+            params["if_absent"] = "true"
+            if await self._read_from_previous_group(table_name, str(primary_key_value)) is not None:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Record with key '{primary_key_value}' already exists in table '{table_name}'"
+                )
+        if record.if_version is not None:
+            params["if_version"] = str(record.if_version)
+
         shard_url = self._get_target_node(table_name, primary_key_value, write_op=True)
 
         path = f"api/v1/records/{table_name}/{primary_key_value}"
@@ -80,63 +465,478 @@ class CoordinatorService:
 
         headers = {"X-Trace-ID": trace_id_var.get()}
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    url=url_to_forward,
-                    json={"value": value},
-                    headers=headers,
-                    timeout=10.0
-                )
-                response.raise_for_status()
-                response_data = response.json()
-                return RecordResponse(
-                    table_name=table_name,
-                    primary_key=str(primary_key_value),
-                    value=response_data.get("value")
-                )
-            except httpx.HTTPStatusError as e:
-                self._handle_shard_error(e, shard_url)
-            except httpx.RequestError as e:
-                self._handle_connection_error(e, shard_url)
+        try:
+            response = await self._shard_request(
+                shard_url,
+                "POST",
+                url_to_forward,
+                write_op=True,
+                json={"value": value, "ttl_seconds": record.ttl_seconds or table_definition.ttl_seconds},
+                headers=headers,
+                params=params
+            )
+            response.raise_for_status()
+            self.record_cache.invalidate(table_name, str(primary_key_value), self._applied_timestamp(response))
+            response_data = response.json()
+            return RecordResponse(
+                table_name=table_name,
+                primary_key=str(primary_key_value),
+                value=response_data.get("value"),
+                version=response_data.get("version")
+            )
+        except httpx.HTTPStatusError as e:
+            self._handle_shard_error(e, shard_url)
+        except httpx.RequestError as e:
+            self._handle_connection_error(e, shard_url)
+
+    async def update_record_on_shard(
+            self, table_name: str, primary_key_value: str, update: UpdateRecordRequest
+    ) -> RecordResponse:
+        table_definition = self._get_table_definition(table_name)
+        primary_key_field = table_definition.primary_key
+        if any(primary_key_field in fields for fields in (update.patch or {}, update.merge, update.increment)):
+            raise HTTPException(status_code=400, detail=f"Primary key '{primary_key_field}' cannot be updated")
+        body = update.model_dump(exclude={"upsert"})
+        body["ttl_seconds"] = table_definition.ttl_seconds
+
+        # A key that is being migrated may not have been copied to its new group yet.
+        previous = await self._read_from_previous_group(table_name, primary_key_value)
+        if previous is not None:
+            body["initial"] = previous.get("value")
+        elif update.upsert:
+            body["initial"] = {primary_key_field: primary_key_value}
+
+        shard_url = self._get_target_node(table_name, primary_key_value, write_op=True)
+
+        path = f"api/v1/records/{table_name}/{primary_key_value}/update"
+        url_to_forward = urljoin(shard_url, path)
+        self.logger.info(f"Forwarding WRITE (Update) to Leader: {url_to_forward}")
+
+        try:
+            response = await self._shard_request(
+                shard_url,
+                "POST",
+                url_to_forward,
+                write_op=True,
+                json=body,
+                headers={"X-Trace-ID": trace_id_var.get()},
+                params=self._write_params(table_definition)
+            )
+            response.raise_for_status()
+            self.record_cache.invalidate(table_name, primary_key_value, self._applied_timestamp(response))
+            response_data = response.json()
+            return RecordResponse(
+                table_name=table_name,
+                primary_key=primary_key_value,
+                value=response_data.get("value"),
+                version=response_data.get("version")
+            )
+        except httpx.HTTPStatusError as e:
+            self._handle_shard_error(e, shard_url)
+        except httpx.RequestError as e:
+            self._handle_connection_error(e, shard_url)
+
+    async def _read_from_previous_group(self, table_name: str, primary_key_value: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns None when there is no previous group or it does not have the record.
+        """
+        previous_url = self._get_previous_node(table_name, primary_key_value, write_op=True)
+        if not previous_url:
+            return None
+        url = urljoin(previous_url, f"api/v1/records/{table_name}/{primary_key_value}")
+        try:
+            response = await self._shard_request(previous_url, "GET", url, headers={"X-Trace-ID": trace_id_var.get()})
+        except httpx.RequestError as e:
+            self._handle_connection_error(e, previous_url)
+        if response.status_code == 404:
+            return None
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            self._handle_shard_error(e, previous_url)
+        return response.json()
 
     async def forward_request_to_shard(self, table_name: str, primary_key_value: str, request: Request):
         is_write = request.method in ["DELETE", "POST", "PUT", "PATCH"]
 
+        if not is_write:
+            cached, record = self.record_cache.get(table_name, primary_key_value, consistency_var.get())
+            if cached:
+                if request.method == "HEAD":
+                    return Response(status_code=200)
+                return RecordResponse(table_name=table_name, primary_key=primary_key_value, **record)
+
+        headers = {k: v for k, v in request.headers.items() if k not in HOP_BY_HOP_HEADERS}
+        headers.pop("host", None)
+        headers["X-Trace-ID"] = trace_id_var.get()
+
+        params = dict(request.query_params)
+        table_definition = self._table_definitions.get(table_name)
+        if is_write and table_definition:
+            params.update(self._write_params(table_definition))
+
+        if is_write:
+            shard_url, response = await self._exchange_with_shard(
+                table_name, primary_key_value, request.method, True, headers, params, await request.body() or None
+            )
+        else:
+            # Concurrent identical reads share one upstream request.
+            consistency = consistency_var.get()
+            flight_key = (
+                request.method, table_name, primary_key_value, str(request.query_params),
+                consistency.min_timestamp if consistency else None,
+                consistency.max_staleness_ns if consistency else None
+            )
+            shard_url, response = await self._read_flights.do(
+                flight_key,
+                lambda: self._exchange_with_shard(
+                    table_name, primary_key_value, request.method, False, headers, params, None
+                )
+            )
+
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            self._handle_shard_error(e, shard_url)
+
+        if is_write:
+            self.record_cache.invalidate(table_name, primary_key_value, self._applied_timestamp(response))
+        if request.method in ["HEAD", "DELETE"]:
+            return Response(status_code=response.status_code)
+
+        response_data = response.json()
+        if request.method == "GET" and not self.hashing_ring.is_migrating:
+            self.record_cache.put(
+                table_name,
+                primary_key_value,
+                {"value": response_data.get("value"), "version": response_data.get("version")},
+                self._cache_ttl(table_name),
+                as_of=self._applied_timestamp(response),
+                size=len(response.content)
+            )
+        return RecordResponse(
+            table_name=table_name,
+            primary_key=primary_key_value,
+            value=response_data.get("value"),
+            version=response_data.get("version")
+        )
+
+    async def _exchange_with_shard(
+            self,
+            table_name: str,
+            primary_key_value: str,
+            method: str,
+            is_write: bool,
+            headers: Dict[str, str],
+            params: Dict[str, str],
+            content: Optional[bytes]
+    ) -> Tuple[str, httpx.Response]:
         shard_url = self._get_target_node(table_name, primary_key_value, write_op=is_write)
 
         path = f"api/v1/records/{table_name}/{primary_key_value}"
         url_to_forward = urljoin(shard_url, path)
-        self.logger.info(f"Forwarding {request.method} to {'Leader' if is_write else 'Replica'}: {url_to_forward}")
+        self.logger.info(f"Forwarding {method} to {'Leader' if is_write else 'Replica'}: {url_to_forward}")
 
-        headers = dict(request.headers)
-        headers.pop("host", None)
-        headers["X-Trace-ID"] = trace_id_var.get()
+        # Deletes reach the previous group first, since a migration drops copies whose source is gone.
+        previous_url = self._get_previous_node(table_name, primary_key_value, write_op=is_write)
+        previous_response = None
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.request(
-                    method=request.method, url=url_to_forward, headers=headers,
-                    params=request.query_params, content=await request.body() or None, timeout=10.0
+        try:
+            if previous_url and method == "DELETE":
+                self.logger.info(f"Key is being migrated, forwarding {method} to {previous_url} as well")
+                current_url, shard_url = shard_url, previous_url
+                previous_response = await self._shard_request(
+                    previous_url, method, urljoin(previous_url, path),
+                    write_op=is_write, headers=headers, params=params, content=content
                 )
-                response.raise_for_status()
+                shard_url = current_url
+            response = await self._shard_request(
+                shard_url, method, url_to_forward,
+                write_op=is_write, headers=headers, params=params, content=content
+            )
+            if previous_url and not is_write and response.status_code == 404:
+                self.logger.info(f"Key is being migrated, forwarding {method} to {previous_url} as well")
+                shard_url = previous_url
+                previous_response = await self._shard_request(
+                    previous_url, method, urljoin(previous_url, path),
+                    write_op=is_write, headers=headers, params=params, content=content
+                )
+            if previous_response is not None and response.status_code == 404:
+                shard_url, response = previous_url, previous_response
+            return shard_url, response
+        except httpx.RequestError as e:
+            self._handle_connection_error(e, shard_url)
 
-                if request.method in ["HEAD", "DELETE"]:
-                    return Response(status_code=response.status_code)
+    async def create_records_on_shards(
+            self, table_name: str, values: List[Dict[str, Any]], ttl_seconds: Optional[float] = None
+    ) -> BatchResponse:
+        table_definition = self._get_table_definition(table_name)
+        primary_key_field = table_definition.primary_key
+        ttl_seconds = ttl_seconds or table_definition.ttl_seconds
 
-                response_data = response.json()
-                return RecordResponse(
-                    table_name=table_name,
-                    primary_key=primary_key_value,
-                    value=response_data.get("value")
+        results: List[Optional[BatchRecordResult]] = [None] * len(values)
+        items = []
+        for index, value in enumerate(values):
+            primary_key_value = value.get(primary_key_field)
+            if not primary_key_value:
+                results[index] = BatchRecordResult(
+                    primary_key=None,
+                    success=False,
+                    status_code=400,
+                    error=f"Primary key '{primary_key_field}' is missing"
                 )
+                continue
+            primary_key_value = str(primary_key_value)
+            items.append((
+                index,
+                primary_key_value,
+                {"primary_key": primary_key_value, "value": value, "ttl_seconds": ttl_seconds}
+            ))
+
+        await self._fan_out_batch(
+            table_name, "put", items, results, write_op=True, params=self._write_params(table_definition)
+        )
+        return self._build_batch_response(table_name, results)
+
+    async def read_records_from_shards(self, table_name: str, primary_keys: List[str]) -> BatchResponse:
+        self._get_table_definition(table_name)
+        results: List[Optional[BatchRecordResult]] = [None] * len(primary_keys)
+        items = [(index, key, key) for index, key in enumerate(primary_keys)]
+        await self._fan_out_batch(table_name, "get", items, results, write_op=False)
+
+        if self.hashing_ring.is_migrating:
+            misses = [item for item in items if results[item[0]].status_code == 404]
+            if misses:
+                await self._fan_out_batch(table_name, "get", misses, results, write_op=False, previous=True)
+        return self._build_batch_response(table_name, results)
+
+    async def delete_records_on_shards(self, table_name: str, primary_keys: List[str]) -> BatchResponse:
+        table_definition = self._get_table_definition(table_name)
+        results: List[Optional[BatchRecordResult]] = [None] * len(primary_keys)
+        items = [(index, key, key) for index, key in enumerate(primary_keys)]
+        params = self._write_params(table_definition)
+        if not self.hashing_ring.is_migrating:
+            await self._fan_out_batch(table_name, "delete", items, results, write_op=True, params=params)
+            return self._build_batch_response(table_name, results)
+
+        # The previous owners go first: a migration drops the copies whose source is gone.
+        previous_results: List[Optional[BatchRecordResult]] = [None] * len(primary_keys)
+        await self._fan_out_batch(
+            table_name, "delete", items, previous_results, write_op=True, params=params, previous=True
+        )
+        await self._fan_out_batch(table_name, "delete", items, results, write_op=True, params=params)
+        for index, previous_result in enumerate(previous_results):
+            if previous_result is not None and previous_result.success and not results[index].success:
+                results[index] = previous_result
+        return self._build_batch_response(table_name, results)
+
+    async def scan_table(
+            self,
+            table_name: str,
+            start: Optional[str] = None,
+            end: Optional[str] = None,
+            prefix: Optional[str] = None,
+            cursor: Optional[str] = None,
+            limit: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        The first page of every group is fetched up front, so that shard errors surface as HTTP errors.
+        """
+        self._get_table_definition(table_name)
+        if not self._shard_topology:
+            raise HTTPException(status_code=503, detail="No available shard groups")
+
+        filters = {key: value for key, value in {"start": start, "end": end, "prefix": prefix}.items() if value}
+        group_ids = list(self._shard_topology)
+        streams = [self._scan_group(group_id, table_name, filters, cursor) for group_id in group_ids]
+        try:
+            heads = await asyncio.gather(*(self._next_scan_item(stream) for stream in streams))
+        except Exception:
+            await asyncio.gather(*(stream.aclose() for stream in streams))
+            raise
+        return self._merge_scan_streams(table_name, group_ids, streams, heads, limit)
+
+    async def _scan_group(
+            self, group_id: str, table_name: str, filters: Dict[str, str], cursor: Optional[str]
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        shard_url = self._get_group_node(group_id, write_op=False)
+        url_to_forward = urljoin(shard_url, f"api/v1/records/{table_name}")
+        headers = {"X-Trace-ID": trace_id_var.get()}
+
+        while True:
+            params = {**filters, "limit": self.scan_page_size}
+            if cursor:
+                params["cursor"] = cursor
+            try:
+                response = await self._shard_request(shard_url, "GET", url_to_forward, params=params, headers=headers)
+                response.raise_for_status()
             except httpx.HTTPStatusError as e:
                 self._handle_shard_error(e, shard_url)
             except httpx.RequestError as e:
                 self._handle_connection_error(e, shard_url)
 
+            page = response.json()
+            for record in page["records"]:
+                yield record["primary_key"], record["value"]
+
+            cursor = page.get("next_cursor")
+            if not cursor:
+                return
+
+    @staticmethod
+    async def _next_scan_item(stream: AsyncIterator[Tuple[str, Any]]) -> Optional[Tuple[str, Any]]:
+        try:
+            return await stream.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    async def _merge_scan_streams(
+            self,
+            table_name: str,
+            group_ids: List[str],
+            streams: List[AsyncIterator[Tuple[str, Any]]],
+            heads: List[Optional[Tuple[str, Any]]],
+            limit: Optional[int]
+    ) -> AsyncIterator[bytes]:
+        """
+        A key found on several groups is emitted once, with the value held by the group that owns it.
+        """
+        heap = [(head[0], index, head[1]) for index, head in enumerate(heads) if head is not None]
+        heapq.heapify(heap)
+
+        emitted = 0
+        try:
+            while heap and (limit is None or emitted < limit):
+                primary_key, index, value = heapq.heappop(heap)
+                sources = [index]
+                while heap and heap[0][0] == primary_key:
+                    _, duplicate_index, duplicate_value = heapq.heappop(heap)
+                    sources.append(duplicate_index)
+                    if self._owns_key(group_ids[duplicate_index], table_name, primary_key):
+                        value = duplicate_value
+
+                yield (json.dumps({"primary_key": primary_key, "value": value}) + "\n").encode("utf-8")
+                emitted += 1
+
+                for source in sources:
+                    following = await self._next_scan_item(streams[source])
+                    if following is not None:
+                        heapq.heappush(heap, (following[0], source, following[1]))
+        except HTTPException as e:
+            self.logger.error(f"Scan aborted after {emitted} records: {e.detail}")
+            yield (json.dumps({"error": e.detail}) + "\n").encode("utf-8")
+        finally:
+            await asyncio.gather(*(stream.aclose() for stream in streams))
+
+    async def _fan_out_batch(
+            self,
+            table_name: str,
+            operation: str,
+            items: List[Tuple[int, str, Any]],
+            results: List[Optional[BatchRecordResult]],
+            write_op: bool,
+            params: Optional[Dict[str, str]] = None,
+            previous: bool = False
+    ):
+        """
+        With `previous`, only migrating keys are sent, to the group they are moving away from.
+        """
+        groups_for_keys = (
+            self.hashing_ring.get_previous_groups_for_keys if previous else self.hashing_ring.get_groups_for_keys
+        )
+        group_ids = groups_for_keys([f"{table_name}::{item[1]}" for item in items])
+        items_by_group: Dict[Optional[str], List[Tuple[int, str, Any]]] = defaultdict(list)
+        for item, group_id in zip(items, group_ids):
+            if previous and group_id is None:
+                continue
+            items_by_group[group_id].append(item)
+
+        await asyncio.gather(*(
+            self._send_batch_to_group(table_name, operation, group_id, group_items, results, write_op, params)
+            for group_id, group_items in items_by_group.items()
+        ))
+
+    async def _send_batch_to_group(
+            self,
+            table_name: str,
+            operation: str,
+            group_id: Optional[str],
+            items: List[Tuple[int, str, Any]],
+            results: List[Optional[BatchRecordResult]],
+            write_op: bool,
+            params: Optional[Dict[str, str]]
+    ):
+        def fail_all(status_code: int, error: str):
+            for index, primary_key, _ in items:
+                results[index] = BatchRecordResult(
+                    primary_key=primary_key, success=False, status_code=status_code, error=error
+                )
+
+        if group_id:
+            GROUP_REQUESTS.labels(group_id).inc(len(items))
+        shard_url = None
+        try:
+            shard_url = self._get_group_node(group_id, write_op)
+            url_to_forward = urljoin(shard_url, f"api/v1/records/{table_name}/batch/{operation}")
+            payload_field = "records" if operation == "put" else "primary_keys"
+            self.logger.info(f"Forwarding batch {operation.upper()} of {len(items)} records to {url_to_forward}")
+
+            response = await self._shard_request(
+                shard_url,
+                "POST",
+                url_to_forward,
+                write_op=write_op,
+                json={payload_field: [payload for _, _, payload in items]},
+                headers={"X-Trace-ID": trace_id_var.get()},
+                params=params
+            )
+            response.raise_for_status()
+
+            applied_timestamp = self._applied_timestamp(response)
+            for (index, primary_key, _), result in zip(items, response.json()["results"]):
+                results[index] = BatchRecordResult(
+                    primary_key=result["primary_key"],
+                    success=result["status_code"] < 400,
+                    status_code=result["status_code"],
+                    value=result.get("value"),
+                    error=result.get("error")
+                )
+                if write_op:
+                    self.record_cache.invalidate(table_name, primary_key, applied_timestamp)
+        except HTTPException as e:
+            fail_all(e.status_code, e.detail)
+        except httpx.HTTPStatusError as e:
+            error_detail = self._extract_error_detail(e)
+            self.logger.error(f"Error from shard '{shard_url}': {e.response.status_code} - {error_detail}")
+            fail_all(e.response.status_code, error_detail)
+        except httpx.RequestError as e:
+            self.logger.error(f"Cannot connect to shard '{shard_url}': {e}")
+            fail_all(503, f"Shard '{shard_url}' is unavailable.")
+
+    @staticmethod
+    def _build_batch_response(table_name: str, results: List[BatchRecordResult]) -> BatchResponse:
+        succeeded = sum(1 for result in results if result.success)
+        return BatchResponse(
+            table_name=table_name,
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+            results=results
+        )
+
     def _get_target_node(self, table_name: str, primary_key_value: Any, write_op: bool) -> str:
         group_id = self.hashing_ring.get_group_for_key(f"{table_name}::{primary_key_value}")
+        if group_id:
+            GROUP_REQUESTS.labels(group_id).inc()
+        return self._get_group_node(group_id, write_op)
+
+    def _get_previous_node(self, table_name: str, primary_key_value: Any, write_op: bool) -> Optional[str]:
+        group_id = self.hashing_ring.get_previous_group_for_key(f"{table_name}::{primary_key_value}")
+        return self._get_group_node(group_id, write_op) if group_id else None
+
+    def _owns_key(self, group_id: str, table_name: str, primary_key: str) -> bool:
+        return self.hashing_ring.get_group_for_key(f"{table_name}::{primary_key}") == group_id
+
+    def _get_group_node(self, group_id: Optional[str], write_op: bool) -> str:
         if not group_id:
             raise HTTPException(status_code=503, detail="No available shard groups")
 
@@ -144,21 +944,66 @@ class CoordinatorService:
         if not group_info:
             raise HTTPException(status_code=503, detail=f"Topology info missing for group {group_id}")
 
+        leader = group_info.get("leader")
+        if leader and not self.health.is_available(leader):
+            leader = None
+
         if write_op:
-            leader = group_info.get("leader")
             if not leader:
                 raise HTTPException(status_code=503, detail=f"No leader available for group {group_id}")
             return leader
         else:
-            candidates = []
-            if group_info.get("leader"):
-                candidates.append(group_info["leader"])
-            candidates.extend(group_info.get("followers", []))
-
-            if not candidates:
+            followers = [node for node in group_info.get("followers", []) if self.health.is_available(node)]
+            node = self.read_balancer.choose(group_id, leader, followers, consistency_var.get())
+            if not node:
                 raise HTTPException(status_code=503, detail=f"No active nodes for group {group_id}")
+            return node
+
+    async def _shard_request(
+            self, shard_url: str, method: str, url: str, write_op: bool = False, **kwargs
+    ) -> httpx.Response:
+        """
+        Feeds latency, failures and applied timestamps back into the read balancer.
+        """
+        if write_op:
+            epoch = self._leader_epoch(shard_url)
+            if epoch is not None:
+                kwargs["headers"] = {**(kwargs.get("headers") or {}), LEADER_EPOCH_HEADER: str(epoch)}
+
+        started = self.read_balancer.request_started(shard_url)
+        try:
+            response = await self.http_pool.request(method, url, **kwargs)
+        except httpx.RequestError:
+            self.read_balancer.request_finished(shard_url, started, failed=True)
+            self.health.record_failure(shard_url)
+            raise
 
-            return random.choice(candidates)
+        applied_timestamp = self._applied_timestamp(response) or None
+        self.read_balancer.request_finished(
+            shard_url, started, failed=response.status_code >= 500, applied_timestamp=applied_timestamp
+        )
+
+        consistency = consistency_var.get()
+        if write_op and applied_timestamp and response.is_success and consistency is not None:
+            consistency.note_write(applied_timestamp)
+        return response
+
+    @staticmethod
+    def _applied_timestamp(response: httpx.Response) -> int:
+        applied_timestamp = response.headers.get(APPLIED_TIMESTAMP_HEADER)
+        return int(applied_timestamp) if applied_timestamp else 0
+
+    def _cache_ttl(self, table_name: str) -> float:
+        table_definition = self._table_definitions.get(table_name)
+        if table_definition is None or table_definition.cache_ttl_seconds is None:
+            return self.record_cache.default_ttl
+        return table_definition.cache_ttl_seconds
+
+    def _leader_epoch(self, shard_url: str) -> Optional[int]:
+        for group_info in self._shard_topology.values():
+            if group_info["leader"] == shard_url:
+                return group_info["epoch"]
+        return None
 
     def _get_table_definition(self, table_name: str) -> TableDefinition:
         table_definition = self._table_definitions.get(table_name)
@@ -166,11 +1011,21 @@ class CoordinatorService:
             raise HTTPException(status_code=404, detail=f"Table '{table_name}' is not registered")
         return table_definition
 
-    def _handle_shard_error(self, exc: httpx.HTTPStatusError, shard_url: str):
+    @staticmethod
+    def _write_params(table_definition: TableDefinition) -> Dict[str, str]:
+        if table_definition.ack_mode:
+            return {"ack": table_definition.ack_mode}
+        return {}
+
+    @staticmethod
+    def _extract_error_detail(exc: httpx.HTTPStatusError) -> str:
         try:
-            error_detail = exc.response.json().get("detail", exc.response.text)
+            return exc.response.json().get("detail", exc.response.text)
         except json.JSONDecodeError:
-            error_detail = exc.response.text or f"Shard returned status {exc.response.status_code}"
+            return exc.response.text or f"Shard returned status {exc.response.status_code}"
+
+    def _handle_shard_error(self, exc: httpx.HTTPStatusError, shard_url: str):
+        error_detail = self._extract_error_detail(exc)
         self.logger.error(f"Error from shard '{shard_url}': {exc.response.status_code} - {error_detail}")
         raise HTTPException(status_code=exc.response.status_code, detail=error_detail)
 
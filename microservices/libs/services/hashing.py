@@ -1,33 +1,328 @@
 import asyncio
+import hashlib
 import logging
-from typing import Optional
+from bisect import bisect
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-import uhashring
+import numpy as np
+from prometheus_client import Gauge
+
+# Same virtual nodes and hash as uhashring's default ring, so keys keep their groups.
+VNODES_PER_GROUP = 160
+_HASH_SPACE = 1 << 128
+# Prefixes that contain no virtual node resolve single keys without a bisect.
+_PREFIX_BYTES = 2
+_PREFIX_SHIFT = 128 - 8 * _PREFIX_BYTES
+_md5 = hashlib.md5
+
+KEY_SHARE = Gauge('router_ring_key_share', 'Share of the key space owned by each shard group', ['group'])
+
+
+def key_digest(key: str) -> bytes:
+    return _md5(key.encode("utf-8")).digest()
+
+
+def key_hash(key: str) -> int:
+    return int.from_bytes(key_digest(key), "big")
+
+
+def key_hashes(keys: Sequence[str]) -> np.ndarray:
+    """
+    128-bit hashes of the keys as rows of (upper, lower) 64-bit halves.
+    """
+    digests = b"".join(_md5(key.encode("utf-8")).digest() for key in keys)
+    return np.frombuffer(digests, dtype=">u8").reshape(-1, 2).astype(np.uint64)
+
+
+class RingLayout:
+    """
+    With a `load_factor`, every arc goes to the first group from its owner onwards that stays within its bound.
+    """
+
+    __slots__ = (
+        "groups", "weights", "load_factor", "shares", "_points", "_owners", "_prefix_owners", "_high_points",
+        "_owner_indexes"
+    )
+
+    def __init__(
+            self,
+            groups: Sequence[str],
+            weights: Optional[Dict[str, int]] = None,
+            load_factor: Optional[float] = None
+    ):
+        self.groups: Tuple[str, ...] = tuple(groups)
+        self.weights: Dict[str, int] = {group: (weights or {}).get(group, 1) for group in self.groups}
+        self.load_factor = load_factor
+
+        ring: Dict[int, int] = {}
+        for index, group in enumerate(self.groups):
+            for vnode in range(VNODES_PER_GROUP * self.weights[group]):
+                ring[key_hash(f"{group}-{vnode}")] = index
+        self._points: List[int] = sorted(ring)
+
+        owner_indexes = [ring[point] for point in self._points]
+        previous_points = [self._points[-1] - _HASH_SPACE] + self._points if self._points else []
+        arcs = [point - previous for previous, point in zip(previous_points, self._points)]
+        if load_factor and len(self.groups) > 1:
+            owner_indexes = self._bound_loads(owner_indexes, arcs)
+
+        owned = [0] * len(self.groups)
+        for index, arc in zip(owner_indexes, arcs):
+            owned[index] += arc
+        self.shares: Dict[str, float] = {group: owned[index] / _HASH_SPACE for index, group in enumerate(self.groups)}
+
+        # One extra owner for hashes past the last virtual node, which wrap around.
+        self._owners: List[str] = [self.groups[index] for index in owner_indexes + owner_indexes[:1]]
+        self._prefix_owners = self._build_prefix_owners()
+        self._high_points = np.array([point >> 64 for point in self._points], dtype=np.uint64)
+        self._owner_indexes = np.array(owner_indexes, dtype=np.intp)
+
+    def _bound_loads(self, owner_indexes: List[int], arcs: List[int]) -> List[int]:
+        total_weight = sum(self.weights.values())
+        capacity = [self.load_factor * _HASH_SPACE * self.weights[group] / total_weight for group in self.groups]
+        load = [0] * len(self.groups)
+        bounded = []
+        for position, arc in enumerate(arcs):
+            for step in range(len(owner_indexes)):
+                candidate = owner_indexes[(position + step) % len(owner_indexes)]
+                if load[candidate] + arc <= capacity[candidate]:
+                    break
+            else:
+                candidate = min(range(len(self.groups)), key=lambda index: load[index] / capacity[index])
+            load[candidate] += arc
+            bounded.append(candidate)
+        return bounded
+
+    def _build_prefix_owners(self) -> List[Optional[str]]:
+        prefix_owners: List[Optional[str]] = []
+        if not self._points:
+            return prefix_owners
+        position = 0
+        for prefix in range(1 << (8 * _PREFIX_BYTES)):
+            start = prefix << _PREFIX_SHIFT
+            while position < len(self._points) and self._points[position] < start:
+                position += 1
+            prefix_owners.append(self._owners[position])
+        for point in self._points:
+            prefix_owners[point >> _PREFIX_SHIFT] = None
+        return prefix_owners
+
+    def to_state(self) -> Dict[str, Any]:
+        return {"groups": list(self.groups), "weights": dict(self.weights), "load_factor": self.load_factor}
+
+    def moved_from(self, target: "RingLayout") -> List[str]:
+        """
+        Groups of this layout that own keys `target` assigns to another group.
+        """
+        sources = set()
+        for point in sorted(set(self._points) | set(target._points)):
+            owner = self.owner(point)
+            if owner != target.owner(point):
+                sources.add(owner)
+        return [group for group in self.groups if group in sources]
+
+    def __bool__(self) -> bool:
+        return bool(self.groups)
+
+    def owner(self, hashed: int) -> str:
+        return self._owners[bisect(self._points, hashed)]
+
+    def digest_owner(self, digest: bytes) -> str:
+        group = self._prefix_owners[int.from_bytes(digest[:_PREFIX_BYTES], "big")]
+        if group is None:
+            group = self._owners[bisect(self._points, int.from_bytes(digest, "big"))]
+        return group
+
+    def owners(self, hashes: np.ndarray) -> List[str]:
+        high = hashes[:, 0]
+        positions = np.searchsorted(self._high_points, high, side="right")
+        # Points sharing the key's upper 64 bits need the full hash to be ordered.
+        ties = np.flatnonzero(np.searchsorted(self._high_points, high, side="left") != positions)
+        for index in ties.tolist():
+            positions[index] = bisect(self._points, (int(hashes[index, 0]) << 64) | int(hashes[index, 1]))
+        positions[positions == len(self._points)] = 0
+        return [self.groups[index] for index in self._owner_indexes[positions].tolist()]
+
+
+class RingSnapshot:
+    """
+    Never changed: every change publishes a new snapshot, so lookups never wait for a lock.
+    """
+
+    __slots__ = ("version", "current", "pending", "target")
+
+    def __init__(self, version: int, current: RingLayout, pending: Optional[RingLayout] = None):
+        self.version = version
+        self.current = current
+        self.pending = pending
+        self.target: RingLayout = pending if pending is not None else current
+
+    def get_group_for_key(self, key: str) -> Optional[str]:
+        target = self.target
+        if not target:
+            return None
+        return target.digest_owner(_md5(key.encode("utf-8")).digest())
+
+    def get_groups_for_keys(self, keys: Sequence[str]) -> List[Optional[str]]:
+        target = self.target
+        if not target:
+            return [None] * len(keys)
+        return target.owners(key_hashes(keys))
+
+    def get_previous_group_for_key(self, key: str) -> Optional[str]:
+        if self.pending is None or not self.current or not self.pending:
+            return None
+        digest = key_digest(key)
+        previous_group = self.current.digest_owner(digest)
+        return previous_group if previous_group != self.pending.digest_owner(digest) else None
+
+    def get_previous_groups_for_keys(self, keys: Sequence[str]) -> List[Optional[str]]:
+        if self.pending is None or not self.current or not self.pending:
+            return [None] * len(keys)
+        hashes = key_hashes(keys)
+        return [
+            previous_group if previous_group != target_group else None
+            for previous_group, target_group in zip(self.current.owners(hashes), self.pending.owners(hashes))
+        ]
 
 
 class ConsistentHashingRing:
-    def __init__(self, logger: logging.Logger):
+    """
+    During a rebalance keys are owned by their group in the target layout.
+    """
+
+    def __init__(
+            self,
+            logger: logging.Logger,
+            load_factor: Optional[float] = None
+    ):
+        if load_factor is not None and load_factor < 1:
+            raise ValueError(f"The ring load factor must be at least 1, got {load_factor}")
         self.logger = logger
-        self.ring = uhashring.HashRing(nodes={})
+        self.load_factor = load_factor
+        self._snapshot = RingSnapshot(0, RingLayout(()))
         self._lock = asyncio.Lock()
 
-    async def add_group(self, group_id: str):
+    @property
+    def snapshot(self) -> RingSnapshot:
+        return self._snapshot
+
+    @property
+    def is_migrating(self) -> bool:
+        return self._snapshot.pending is not None
+
+    def _publish(self, current: RingLayout, pending: Optional[RingLayout]):
+        self._snapshot = RingSnapshot(self._snapshot.version + 1, current, pending)
+        KEY_SHARE.clear()
+        for group, share in self._snapshot.target.shares.items():
+            KEY_SHARE.labels(group).set(share)
+
+    def _layout(self, groups: Sequence[str], weights: Dict[str, int]) -> RingLayout:
+        return RingLayout(groups, weights, self.load_factor)
+
+    def get_groups(self) -> List[str]:
+        return list(self._snapshot.current.groups)
+
+    def get_shares(self) -> Dict[str, float]:
+        return dict(self._snapshot.target.shares)
+
+    def get_weight(self, group_id: str) -> Optional[int]:
+        return self._snapshot.target.weights.get(group_id)
+
+    def get_state(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        pending = snapshot.pending.to_state() if snapshot.pending is not None else None
+        return {
+            **snapshot.current.to_state(),
+            "pending": pending["groups"] if pending is not None else None,
+            "pending_weights": pending["weights"] if pending is not None else None,
+            "pending_load_factor": pending["load_factor"] if pending is not None else None
+        }
+
+    def restore(self, state: Dict[str, Any]):
+        pending = state.get("pending")
+        self._publish(
+            RingLayout(state["groups"], state.get("weights"), state.get("load_factor")),
+            RingLayout(pending, state.get("pending_weights"), state.get("pending_load_factor"))
+            if pending is not None else None
+        )
+        self.logger.info(f"Restored ring: {state['groups']}" + (f" -> {pending}" if pending is not None else ""))
+
+    def migration_sources(self) -> List[str]:
+        snapshot = self._snapshot
+        if snapshot.pending is None:
+            return []
+        return snapshot.current.moved_from(snapshot.pending)
+
+    def _with_group(self, layout: Optional[RingLayout], group_id: str, weight: int) -> Optional[RingLayout]:
+        if layout is None or group_id in layout.groups:
+            return layout
+        return self._layout(layout.groups + (group_id,), {**layout.weights, group_id: weight})
+
+    def _without_group(self, layout: Optional[RingLayout], group_id: str) -> Optional[RingLayout]:
+        if layout is None or group_id not in layout.groups:
+            return layout
+        return self._layout([group for group in layout.groups if group != group_id], layout.weights)
+
+    async def add_group(self, group_id: str, weight: int = 1):
+        """
+        During a migration the group joins the target layout too.
+        """
         async with self._lock:
-            if group_id not in self.ring.get_nodes():
-                self.ring.add_node(group_id)
+            snapshot = self._snapshot
+            current = self._with_group(snapshot.current, group_id, weight)
+            pending = self._with_group(snapshot.pending, group_id, weight)
+            if current is not snapshot.current or pending is not snapshot.pending:
+                self._publish(current, pending)
                 self.logger.info(
                     f"Added shard group '{group_id}' to the ring. "
-                    f"Current groups: {list(self.ring.get_nodes())}"
+                    f"Current groups: {self.get_groups()}"
                 )
 
     async def remove_group(self, group_id: str):
+        """
+        During a migration the group leaves the target layout too.
+        """
         async with self._lock:
-            if group_id in self.ring.get_nodes():
-                self.ring.remove_node(group_id)
+            snapshot = self._snapshot
+            current = self._without_group(snapshot.current, group_id)
+            pending = self._without_group(snapshot.pending, group_id)
+            if current is not snapshot.current or pending is not snapshot.pending:
+                self._publish(current, pending)
                 self.logger.info(f"Removed shard group '{group_id}' from the ring")
 
+    async def begin_migration(
+            self,
+            add: Optional[str] = None,
+            remove: Optional[str] = None,
+            weights: Optional[Dict[str, int]] = None
+    ):
+        async with self._lock:
+            snapshot = self._snapshot
+            if snapshot.pending is not None:
+                raise RuntimeError("A ring migration is already in progress")
+            nodes = [node for node in snapshot.current.groups if node != remove]
+            if add and add not in nodes:
+                nodes.append(add)
+            target = self._layout(nodes, {**snapshot.current.weights, **(weights or {})})
+            self._publish(snapshot.current, target)
+            self.logger.info(f"Started ring migration: {snapshot.current.weights} -> {target.weights}")
+
+    def commit_migration(self):
+        snapshot = self._snapshot
+        if snapshot.pending is None:
+            return
+        self._publish(snapshot.pending, None)
+        self.logger.info(f"Ring cut over. Current groups: {self.get_groups()}")
+
     def get_group_for_key(self, key: str) -> Optional[str]:
-        if not self.ring.get_nodes():
-            self.logger.error("Hashing ring has no active shard groups")
-            return None
-        return self.ring.get_node(key)
+        return self._snapshot.get_group_for_key(key)
+
+    def get_groups_for_keys(self, keys: Sequence[str]) -> List[Optional[str]]:
+        return self._snapshot.get_groups_for_keys(keys)
+
+    def get_previous_group_for_key(self, key: str) -> Optional[str]:
+        return self._snapshot.get_previous_group_for_key(key)
+
+    def get_previous_groups_for_keys(self, keys: Sequence[str]) -> List[Optional[str]]:
+        return self._snapshot.get_previous_groups_for_keys(keys)
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from urllib.parse import urljoin
+
+import httpx
+from prometheus_client import Gauge
+
+if TYPE_CHECKING:
+    from microservices.libs.services.coordinator import CoordinatorService
+
+NODE_AVAILABLE = Gauge('router_shard_node_available', 'Whether a shard node is admitted for routing', ['node'])
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 3, recovery_successes: int = 2):
+        self.failure_threshold = failure_threshold
+        self.recovery_successes = recovery_successes
+        self.is_open = False
+        self._failures = 0
+        self._successes = 0
+
+    def record_success(self) -> bool:
+        """
+        Returns True when this success closed the breaker.
+        """
+        self._failures = 0
+        if not self.is_open:
+            return False
+        self._successes += 1
+        if self._successes >= self.recovery_successes:
+            self.is_open = False
+            self._successes = 0
+            return True
+        return False
+
+    def record_failure(self) -> bool:
+        """
+        Returns True when this failure opened the breaker.
+        """
+        self._successes = 0
+        if self.is_open:
+            return False
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            self.is_open = True
+            return True
+        return False
+
+
+class HealthMonitor:
+    """
+    Every router probes for its own routing, but only the controller fails groups over.
+    """
+
+    def __init__(
+            self,
+            coordinator: "CoordinatorService",
+            logger: logging.Logger,
+            interval: float = 1.0,
+            timeout: float = 0.5,
+            failure_threshold: int = 3,
+            recovery_successes: int = 2
+    ):
+        self.coordinator = coordinator
+        self.http_pool = coordinator.http_pool
+        self.logger = logger
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.recovery_successes = recovery_successes
+
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._statuses: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._probe_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def is_available(self, node: str) -> bool:
+        breaker = self._breakers.get(node)
+        return breaker is None or not breaker.is_open
+
+    def applied_timestamp(self, node: str) -> int:
+        return self._statuses.get(node, {}).get("applied_timestamp", 0)
+
+    def epoch(self, node: str) -> int:
+        return self._statuses.get(node, {}).get("epoch", 0)
+
+    def record_success(self, node: str):
+        if self._breaker(node).record_success():
+            self._on_admitted(node)
+
+    def record_failure(self, node: str):
+        if self._breaker(node).record_failure():
+            self._on_evicted(node)
+
+    def forget(self, node: str):
+        self._breakers.pop(node, None)
+        self._statuses.pop(node, None)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            node: {"available": not breaker.is_open, **self._statuses.get(node, {})}
+            for node, breaker in self._breakers.items()
+        }
+
+    def _breaker(self, node: str) -> CircuitBreaker:
+        breaker = self._breakers.get(node)
+        if breaker is None:
+            breaker = self._breakers[node] = CircuitBreaker(self.failure_threshold, self.recovery_successes)
+            NODE_AVAILABLE.labels(node).set(1)
+        return breaker
+
+    def _on_evicted(self, node: str):
+        NODE_AVAILABLE.labels(node).set(0)
+        self.logger.warning(f"Shard node {node} is unreachable, evicted from routing")
+
+    def _on_admitted(self, node: str):
+        NODE_AVAILABLE.labels(node).set(1)
+        self.logger.info(f"Shard node {node} is healthy again, re-admitted to routing")
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                nodes = self.coordinator.get_nodes()
+                await asyncio.gather(*(self._probe(node) for _, node in nodes))
+                if self.coordinator.is_controller:
+                    await self._reconcile_leaders(nodes)
+            except Exception as e:
+                self.logger.error(f"Health check round failed: {e}")
+
+    async def _probe(self, node: str):
+        try:
+            response = await self.http_pool.request(
+                "GET", urljoin(node, "api/v1/node/status"), timeout=self.timeout
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            self._statuses.pop(node, None)
+            self.record_failure(node)
+            self.logger.debug(f"Health check of {node} failed: {e}")
+            return
+
+        status = response.json()
+        self._statuses[node] = status
+        self.coordinator.read_balancer.observe_applied(node, status["applied_timestamp"])
+        self.record_success(node)
+
+    async def _reconcile_leaders(self, nodes: List[Tuple[str, str]]):
+        for group_id in {group_id for group_id, _ in nodes}:
+            leader = self.coordinator.get_leader(group_id)
+            if leader is not None and not self.is_available(leader):
+                await self.coordinator.fail_over(group_id)
+
+        for group_id, node in nodes:
+            status = self._statuses.get(node)
+            if status and status["role"] == "leader" and node != self.coordinator.get_leader(group_id):
+                await self.coordinator.demote_node(group_id, node)
@@ -0,0 +1,181 @@
+import logging
+import math
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from prometheus_client import Counter, Gauge
+
+from microservices.libs.utils.consistency import ReadConsistency
+
+NODE_LATENCY = Gauge('router_node_latency_ewma_seconds', 'Peak EWMA latency of shard nodes', ['node'])
+NODE_LAG = Gauge('router_node_replication_lag_seconds', 'Observed replication lag of shard followers', ['node'])
+READ_ROUTING = Counter('router_read_routing_total', 'Reads routed to shard nodes by role', ['role'])
+
+
+class _NodeStats:
+    __slots__ = ("group_id", "is_leader", "ewma", "updated_at", "in_flight", "applied_timestamp", "failed_until")
+
+    def __init__(self, group_id: str, is_leader: bool, initial_latency: float):
+        self.group_id = group_id
+        self.is_leader = is_leader
+        self.ewma = initial_latency
+        self.updated_at = time.monotonic()
+        self.in_flight = 0
+        self.applied_timestamp = 0
+        self.failed_until = 0.0
+
+
+class ReadBalancer:
+    """
+    Power-of-two-choices on peak-EWMA latency; followers too far behind the request's token are not eligible.
+    """
+
+    def __init__(
+            self,
+            logger: logging.Logger,
+            decay_seconds: float = 10.0,
+            error_penalty_seconds: float = 5.0,
+            initial_latency: float = 0.005
+    ):
+        self.logger = logger
+        self.decay_seconds = decay_seconds
+        self.error_penalty_seconds = error_penalty_seconds
+        self.initial_latency = initial_latency
+        self._nodes: Dict[str, _NodeStats] = {}
+        self._group_write_timestamps: Dict[str, int] = {}
+
+    def set_node(self, group_id: str, node: str, is_leader: bool):
+        stats = self._nodes.get(node)
+        if stats is None:
+            self._nodes[node] = _NodeStats(group_id, is_leader, self.initial_latency)
+        else:
+            stats.group_id, stats.is_leader = group_id, is_leader
+
+    def remove_node(self, node: str):
+        self._nodes.pop(node, None)
+
+    def choose(
+            self,
+            group_id: str,
+            leader: Optional[str],
+            followers: List[str],
+            consistency: Optional[ReadConsistency] = None
+    ) -> Optional[str]:
+        candidates = [node for node in followers if self._is_fresh_enough(group_id, node, consistency)]
+        if leader:
+            candidates.append(leader)
+        if not candidates:
+            return None
+
+        now = time.monotonic()
+        healthy = [node for node in candidates if self._stats(group_id, node).failed_until <= now]
+        candidates = healthy or candidates
+
+        if len(candidates) == 1:
+            chosen = candidates[0]
+        else:
+            first, second = random.sample(candidates, 2)
+            chosen = first if self._cost(group_id, first, now) <= self._cost(group_id, second, now) else second
+
+        READ_ROUTING.labels("leader" if chosen == leader else "follower").inc()
+        return chosen
+
+    def request_started(self, node: str) -> float:
+        stats = self._nodes.get(node)
+        if stats is not None:
+            stats.in_flight += 1
+        return time.monotonic()
+
+    def request_finished(
+            self, node: str, started: float, failed: bool = False, applied_timestamp: Optional[int] = None
+    ):
+        stats = self._nodes.get(node)
+        if stats is None:
+            return
+        now = time.monotonic()
+        stats.in_flight = max(0, stats.in_flight - 1)
+
+        if failed:
+            stats.failed_until = now + self.error_penalty_seconds
+        else:
+            self._observe_latency(stats, now - started, now)
+            NODE_LATENCY.labels(node).set(stats.ewma)
+
+        if applied_timestamp is not None:
+            self.observe_applied(node, applied_timestamp)
+
+    def observe_applied(self, node: str, applied_timestamp: int):
+        stats = self._nodes.get(node)
+        if stats is None:
+            return
+        stats.applied_timestamp = max(stats.applied_timestamp, applied_timestamp)
+        if stats.is_leader:
+            self._group_write_timestamps[stats.group_id] = max(
+                self._group_write_timestamps.get(stats.group_id, 0), applied_timestamp
+            )
+        else:
+            lag_ns = self._lag_ns(stats)
+            if lag_ns is not None:
+                NODE_LAG.labels(node).set(lag_ns / 1e9)
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            node: {
+                "group_id": stats.group_id,
+                "role": "leader" if stats.is_leader else "follower",
+                "ewma_ms": 1000 * self._decayed(stats, now),
+                "in_flight": stats.in_flight,
+                "lag_ms": lag_ns / 1e6 if (lag_ns := self._lag_ns(stats)) is not None else None,
+                "penalized": stats.failed_until > now
+            }
+            for node, stats in self._nodes.items()
+        }
+
+    def _stats(self, group_id: str, node: str) -> _NodeStats:
+        stats = self._nodes.get(node)
+        if stats is None:
+            stats = self._nodes[node] = _NodeStats(group_id, False, self.initial_latency)
+        return stats
+
+    def _is_fresh_enough(self, group_id: str, node: str, consistency: Optional[ReadConsistency]) -> bool:
+        if consistency is None or consistency.is_relaxed:
+            return True
+        applied = self._stats(group_id, node).applied_timestamp
+        group_written = self._group_write_timestamps.get(group_id, 0)
+
+        # Caught up with everything its leader is known to have written, whatever the token says.
+        if consistency.min_timestamp is not None and applied < min(consistency.min_timestamp, group_written):
+            return False
+        if consistency.max_staleness_ns is not None and applied < group_written:
+            return time.time_ns() - applied <= consistency.max_staleness_ns
+        return True
+
+    def _lag_ns(self, stats: _NodeStats) -> Optional[int]:
+        """
+        None if the follower was never seen applying anything.
+        """
+        group_written = self._group_write_timestamps.get(stats.group_id, 0)
+        if stats.is_leader or stats.applied_timestamp >= group_written:
+            return 0
+        if not stats.applied_timestamp:
+            return None
+        return max(0, time.time_ns() - stats.applied_timestamp)
+
+    def _cost(self, group_id: str, node: str, now: float) -> float:
+        stats = self._stats(group_id, node)
+        return self._decayed(stats, now) * (stats.in_flight + 1)
+
+    def _decayed(self, stats: _NodeStats, now: float) -> float:
+        # Idle nodes drift back towards the initial estimate, so a slow node is retried eventually.
+        weight = math.exp(-(now - stats.updated_at) / self.decay_seconds)
+        return stats.ewma * weight + self.initial_latency * (1 - weight)
+
+    def _observe_latency(self, stats: _NodeStats, latency: float, now: float):
+        if latency > stats.ewma:
+            stats.ewma = latency
+        else:
+            weight = math.exp(-(now - stats.updated_at) / self.decay_seconds)
+            stats.ewma = stats.ewma * weight + latency * (1 - weight)
+        stats.updated_at = now
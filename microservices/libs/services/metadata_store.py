@@ -0,0 +1,282 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer, TopicPartition
+from fastapi import HTTPException
+from prometheus_client import Counter, Gauge
+
+from microservices.libs.utils.kafka_topics import ensure_topic
+
+METADATA_CHANGES = Counter('router_metadata_changes_total', 'Router metadata records applied', ['origin'])
+
+CONTROLLER_HELD = Gauge('router_controller', 'Whether this router holds the controller lease')
+
+MetadataListener = Callable[[str, Optional[Dict[str, Any]]], None]
+
+CONTROLLER_KEY = "controller"
+_ROUTER_PREFIX = "router/"
+# Keeps superseded records long enough for every router to judge lease claims on the same history.
+_MIN_COMPACTION_LAG_MS = 3_600_000
+
+
+class MetadataStore:
+    """
+    A claim of the controller lease takes the next term once it expired, judged alike by every router in log order.
+    """
+
+    def __init__(
+            self,
+            kafka_broker_url: str,
+            topic: str,
+            logger: logging.Logger,
+            replication_factor: int = 1,
+            lease_seconds: float = 10.0
+    ):
+        self.kafka_broker_url = kafka_broker_url
+        self.topic = topic
+        self.logger = logger
+        self.replication_factor = replication_factor
+        self.lease_seconds = lease_seconds
+
+        self._origin = uuid.uuid4().hex
+        self._sequence = 0
+        self._pending: Dict[str, int] = {}
+        self._listener: Optional[MetadataListener] = None
+        self._producer: Optional[AIOKafkaProducer] = None
+        self._consumer: Optional[AIOKafkaConsumer] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self._lease: Optional[Dict[str, Any]] = None
+        self._lease_ends = 0.0
+        self._holds_until = 0.0
+        self._lease_sent: Dict[int, float] = {}
+        self._status: Dict[str, Any] = {}
+        self._routers: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._announce = asyncio.Event()
+        self._lease_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_controller(self) -> bool:
+        lease = self._lease
+        return lease is not None and lease["holder"] == self._origin and time.monotonic() < self._holds_until
+
+    def live_routers(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        return {origin: status for origin, (seen, status) in self._routers.items() if now - seen < self.lease_seconds}
+
+    def set_status(self, status: Dict[str, Any]):
+        self._status = status
+        self._announce.set()
+
+    async def start(self, listener: MetadataListener):
+        """
+        Returns once the existing metadata has been handed to `listener`.
+        """
+        self._listener = listener
+        await ensure_topic(
+            self.kafka_broker_url,
+            self.topic,
+            self.logger,
+            replication_factor=self.replication_factor,
+            configs={
+                "cleanup.policy": "compact",
+                "message.timestamp.type": "LogAppendTime",
+                "min.compaction.lag.ms": str(_MIN_COMPACTION_LAG_MS)
+            },
+            enforce_configs=True
+        )
+
+        self._producer = AIOKafkaProducer(bootstrap_servers=self.kafka_broker_url, acks="all")
+        await self._producer.start()
+
+        partition = TopicPartition(self.topic, 0)
+        self._consumer = AIOKafkaConsumer(
+            bootstrap_servers=self.kafka_broker_url,
+            group_id=None,
+            enable_auto_commit=False,
+            auto_offset_reset="earliest"
+        )
+        await self._consumer.start()
+        self._consumer.assign([partition])
+        await self._consumer.seek_to_beginning(partition)
+
+        end_offset = (await self._consumer.end_offsets([partition]))[partition]
+        replayed = 0
+        while await self._consumer.position(partition) < end_offset:
+            batches = await self._consumer.getmany(partition, timeout_ms=500)
+            replayed += self._apply(batches.get(partition, []))
+        self.logger.info(f"Loaded {replayed} router metadata records from '{self.topic}'")
+
+        self._task = asyncio.create_task(self._follow(partition))
+        self._lease_task = asyncio.create_task(self._lease_loop())
+
+    async def stop(self):
+        if self._lease_task:
+            self._lease_task.cancel()
+            try:
+                await self._lease_task
+            except asyncio.CancelledError:
+                pass
+            self._lease_task = None
+            await self._leave()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._consumer:
+            await self._consumer.stop()
+            self._consumer = None
+        if self._producer:
+            await self._producer.stop()
+            self._producer = None
+
+    async def put(self, key: str, value: Optional[Dict[str, Any]]):
+        """
+        None deletes the key.
+        """
+        try:
+            await self._send(key, value, pending=True)
+        except Exception as e:
+            self.logger.error(f"Failed to publish router metadata '{key}': {e}")
+            raise HTTPException(status_code=503, detail="Router metadata store is unavailable")
+
+    async def _send(self, key: str, value: Optional[Dict[str, Any]], pending: bool = False):
+        self._sequence += 1
+        if pending:
+            self._pending[key] = self._sequence
+        if key == CONTROLLER_KEY:
+            self._lease_sent[self._sequence] = time.monotonic()
+        await self._producer.send_and_wait(
+            self.topic,
+            key=key.encode(),
+            value=json.dumps(value).encode() if value is not None else None,
+            headers=[("origin", self._origin.encode()), ("sequence", str(self._sequence).encode())]
+        )
+
+    async def _lease_loop(self):
+        interval = self.lease_seconds / 3
+        next_claim = 0.0
+        while True:
+            try:
+                await asyncio.wait_for(self._announce.wait(), timeout=max(next_claim - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                pass
+            self._announce.clear()
+            try:
+                await self._send(f"{_ROUTER_PREFIX}{self._origin}", self._status)
+                if time.monotonic() >= next_claim:
+                    next_claim = time.monotonic() + interval
+                    claim = self._next_claim()
+                    if claim is not None:
+                        await self._send(CONTROLLER_KEY, claim)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Failed to send router heartbeat: {e}")
+                await asyncio.sleep(1)
+
+    def _next_claim(self) -> Optional[Dict[str, Any]]:
+        lease = self._lease
+        claim = {"holder": self._origin, "lease_ms": int(self.lease_seconds * 1000)}
+        if lease is None:
+            return {**claim, "term": 1}
+        if time.monotonic() >= self._lease_ends:
+            return {**claim, "term": lease["term"] + 1}
+        if lease["holder"] == self._origin:
+            return {**claim, "term": lease["term"]}
+        return None
+
+    async def _leave(self):
+        """
+        Releases the lease and drops the heartbeat, so that another router takes over right away.
+        """
+        try:
+            if self.is_controller:
+                await self._send(CONTROLLER_KEY, {"holder": self._origin, "term": self._lease["term"], "lease_ms": 0})
+            await self._send(f"{_ROUTER_PREFIX}{self._origin}", None)
+        except Exception as e:
+            self.logger.warning(f"Failed to release the controller lease: {e}")
+
+    async def _follow(self, partition: TopicPartition):
+        while True:
+            try:
+                batches = await self._consumer.getmany(partition, timeout_ms=1000)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Router metadata stream failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            self._apply(batches.get(partition, []))
+
+    def _apply(self, messages: List[Any]) -> int:
+        applied = 0
+        for msg in messages:
+            key = msg.key.decode()
+            headers = {name: data.decode() for name, data in msg.headers or ()}
+            own = headers.get("origin") == self._origin
+            sequence = int(headers.get("sequence", 0))
+            if key == CONTROLLER_KEY:
+                self._apply_lease(msg, own, sequence)
+                continue
+            if key.startswith(_ROUTER_PREFIX):
+                self._apply_heartbeat(key[len(_ROUTER_PREFIX):], msg.value)
+                continue
+            if own:
+                if sequence < self._pending.get(key, 0):
+                    continue
+                self._pending.pop(key, None)
+            try:
+                value = json.loads(msg.value) if msg.value is not None else None
+                self._listener(key, value)
+            except Exception as e:
+                self.logger.error(f"Failed to apply router metadata '{key}' at offset {msg.offset}: {e}")
+                continue
+            METADATA_CHANGES.labels("local" if own else "remote").inc()
+            applied += 1
+        return applied
+
+    def _apply_lease(self, msg: Any, own: bool, sequence: int):
+        """
+        Decided from the log alone and the broker's clock, so that all routers agree.
+        """
+        sent_at = self._lease_sent.pop(sequence, None) if own else None
+        try:
+            claim = json.loads(msg.value)
+        except (TypeError, ValueError):
+            return
+        lease = self._lease
+        if lease is not None:
+            renewal = claim["holder"] == lease["holder"] and claim["term"] == lease["term"]
+            if renewal and msg.timestamp >= lease["expires_at"]:
+                return
+            if not renewal and (claim["term"] != lease["term"] + 1 or msg.timestamp < lease["expires_at"]):
+                return
+
+        expires_at = msg.timestamp + claim["lease_ms"]
+        self._lease = {"holder": claim["holder"], "term": claim["term"], "expires_at": expires_at}
+        self._lease_ends = time.monotonic() + claim["lease_ms"] / 1000
+        if claim["holder"] != self._origin:
+            self._holds_until = 0.0
+        elif sent_at is not None:
+            # The broker stamped the record after it was sent, so the lease outlasts this.
+            self._holds_until = sent_at + claim["lease_ms"] / 1000 * 2 / 3
+        if lease is None or lease["holder"] != claim["holder"]:
+            self.logger.info(
+                f"Router {claim['holder']} holds the controller lease (term {claim['term']})"
+                + (", this router is the controller" if claim["holder"] == self._origin else "")
+            )
+        CONTROLLER_HELD.set(1 if claim["holder"] == self._origin and claim["lease_ms"] > 0 else 0)
+
+    def _apply_heartbeat(self, origin: str, value: Optional[bytes]):
+        if value is None:
+            self._routers.pop(origin, None)
+        else:
+            self._routers[origin] = (time.monotonic(), json.loads(value))
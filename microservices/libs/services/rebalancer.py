@@ -0,0 +1,313 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from urllib.parse import urljoin
+
+import httpx
+from fastapi import HTTPException
+from prometheus_client import Counter, Gauge
+
+from microservices.libs.utils.logger import trace_id_var
+
+if TYPE_CHECKING:
+    from microservices.libs.services.coordinator import CoordinatorService
+
+REBALANCE_IN_PROGRESS = Gauge('router_rebalance_in_progress', 'Whether a shard group migration is running')
+REBALANCE_RECORDS = Counter('router_rebalance_records_total', 'Records handled by shard group migrations', ['stage'])
+
+
+class _LostControl(Exception):
+    pass
+
+
+class Rebalancer:
+    """
+    Imported records keep their original timestamps, so writes made during the copy win.
+    """
+
+    def __init__(
+            self,
+            coordinator: "CoordinatorService",
+            logger: logging.Logger,
+            batch_size: int = 500,
+            batch_interval: float = 0.05,
+            retry_interval: float = 1.0,
+            reconcile_interval: float = 1.0
+    ):
+        self.coordinator = coordinator
+        self.hashing_ring = coordinator.hashing_ring
+        self.http_pool = coordinator.http_pool
+        self.logger = logger
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.retry_interval = retry_interval
+        self.reconcile_interval = reconcile_interval
+
+        self._lock = asyncio.Lock()
+        self._tasks: Set[asyncio.Task] = set()
+        self._scheduled: Set[Tuple[str, str]] = set()
+        self._status: Dict[str, Any] = {"state": "idle"}
+        self._reconcile_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._reconcile_task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self):
+        tasks = [*self._tasks, *([self._reconcile_task] if self._reconcile_task else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            **self._status,
+            "controller": self.coordinator.is_controller,
+            "migrating": self.hashing_ring.is_migrating,
+            "queued": [{"group_id": group_id, "operation": operation} for operation, group_id in self._scheduled]
+        }
+
+    async def reconcile(self):
+        """
+        Does nothing on routers other than the controller.
+        """
+        if not self.coordinator.is_controller:
+            return
+        if self.hashing_ring.is_migrating and not self._scheduled:
+            self._schedule("resume", "")
+        groups = self.hashing_ring.get_groups()
+        for group_id, group_info in self.coordinator.get_shard_groups().items():
+            if group_info.get("draining"):
+                self._schedule("leave", group_id)
+            elif not group_info.get("leader"):
+                continue
+            elif group_id not in groups:
+                self._schedule("join", group_id)
+            elif self.hashing_ring.get_weight(group_id) not in (None, group_info.get("weight", 1)):
+                self._schedule("reweight", group_id)
+
+    async def _reconcile_loop(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                self.logger.error(f"Failed to reconcile the ring with the shard groups: {e}")
+
+    def _schedule(self, operation: str, group_id: str):
+        if (operation, group_id) in self._scheduled:
+            return
+        self._scheduled.add((operation, group_id))
+        task = asyncio.create_task(self._run(operation, group_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, operation: str, group_id: str):
+        async with self._lock:
+            try:
+                if not self.coordinator.is_controller:
+                    return
+                if self.hashing_ring.is_migrating:
+                    # Left half way by an interrupted run or by the previous controller.
+                    await self._migrate("resume", "", self.hashing_ring.migration_sources())
+                if operation == "resume":
+                    return
+
+                groups = self.hashing_ring.get_groups()
+                weight = self.coordinator.get_group_weight(group_id)
+                if operation == "join":
+                    if group_id in groups:
+                        return
+                    if not groups:
+                        await self.hashing_ring.add_group(group_id, weight)
+                        await self._publish_ring()
+                        return
+                    await self.hashing_ring.begin_migration(add=group_id, weights={group_id: weight})
+                elif operation == "reweight":
+                    if group_id not in groups or self.hashing_ring.get_weight(group_id) == weight:
+                        return
+                    await self.hashing_ring.begin_migration(weights={group_id: weight})
+                else:
+                    if group_id not in groups:
+                        await self.coordinator.forget_group(group_id)
+                        return
+                    if len(groups) == 1:
+                        self.logger.error(f"Refusing to drain '{group_id}': it is the last group in the ring")
+                        return
+                    await self.hashing_ring.begin_migration(remove=group_id)
+
+                await self._migrate(operation, group_id, self.hashing_ring.migration_sources())
+            except _LostControl:
+                self.logger.warning(
+                    f"Lost the controller lease during migration ({operation} '{group_id}'), "
+                    f"the next controller resumes it"
+                )
+            except asyncio.CancelledError:
+                self.logger.warning(f"Migration ({operation} '{group_id}') interrupted, ring stays in dual-read mode")
+                raise
+            finally:
+                self._scheduled.discard((operation, group_id))
+
+    async def _migrate(self, operation: str, group_id: str, sources: List[str]):
+        tables = [table.table_name for table in self.coordinator.get_all_tables()]
+        groups = self.hashing_ring.get_groups()
+        self._status = {
+            "state": "copying",
+            "operation": operation,
+            "group_id": group_id,
+            "tables_total": len(tables),
+            "tables_done": 0,
+            "copied": 0,
+            "dropped": 0,
+            "cleaned": 0,
+            "started_at": time.time()
+        }
+        REBALANCE_IN_PROGRESS.set(1)
+        try:
+            # No router may still send writes to the previous owners once their records are copied.
+            await self._wait_for_routers(await self._publish_ring())
+            for table_name in tables:
+                self._ensure_controller()
+                for source in sources:
+                    await self._copy_table(table_name, source)
+                self._status["tables_done"] += 1
+
+            self._ensure_controller()
+            self.hashing_ring.commit_migration()
+            await self._wait_for_routers(await self._publish_ring())
+
+            self._status["state"] = "cleaning"
+            remaining = [source for source in sources if source in self.hashing_ring.get_groups()]
+            for table_name in tables:
+                for source in remaining:
+                    await self._clean_table(table_name, source)
+            for removed in groups:
+                if removed not in self.hashing_ring.get_groups():
+                    await self.coordinator.forget_group(removed)
+
+            self._status.update(state="done", finished_at=time.time())
+            self.logger.info(
+                f"Migration ({operation} '{group_id}') finished: {self._status['copied']} records copied, "
+                f"{self._status['dropped']} deleted during the copy, {self._status['cleaned']} stale copies removed"
+            )
+        finally:
+            REBALANCE_IN_PROGRESS.set(0)
+
+    def _ensure_controller(self):
+        if not self.coordinator.is_controller:
+            raise _LostControl()
+
+    async def _publish_ring(self) -> int:
+        delay = self.retry_interval
+        while True:
+            self._ensure_controller()
+            try:
+                return await self.coordinator.publish_ring()
+            except HTTPException as e:
+                self.logger.warning(f"Failed to publish the ring: {e.detail}")
+                self._status["last_error"] = str(e.detail)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    async def _wait_for_routers(self, revision: int):
+        while True:
+            behind = self.coordinator.routers_behind(revision)
+            if not behind:
+                self._status.pop("waiting_for_routers", None)
+                return
+            self._ensure_controller()
+            self._status["waiting_for_routers"] = behind
+            await asyncio.sleep(self.retry_interval)
+
+    async def _copy_table(self, table_name: str, source: str):
+        async for moving in self._moving_records(table_name, source):
+            records_by_target: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+            for record, target in moving:
+                records_by_target[target].append(record)
+
+            for target, records in records_by_target.items():
+                result = await self._call_leader(
+                    target, "POST", f"api/v1/records/{table_name}/batch/import", json={"records": records}
+                )
+                REBALANCE_RECORDS.labels("copied").inc(result["imported"])
+                self._status["copied"] += result["imported"]
+                await self._drop_deleted(table_name, source, target, records)
+
+    async def _drop_deleted(self, table_name: str, source: str, target: str, records: List[Dict[str, Any]]):
+        """
+        A delete that reached the target before the import did went to the source first.
+        """
+        versions = {record["primary_key"]: record["timestamp"] for record in records}
+        result = await self._call_leader(
+            source, "POST", f"api/v1/records/{table_name}/batch/get", json={"primary_keys": list(versions)}
+        )
+        for item in result["results"]:
+            if item["status_code"] != 404:
+                continue
+            await self._call_leader(
+                target,
+                "DELETE",
+                f"api/v1/records/{table_name}/{item['primary_key']}",
+                accept=(404, 412),
+                params={"if_version": versions[item["primary_key"]]}
+            )
+            REBALANCE_RECORDS.labels("dropped").inc()
+            self._status["dropped"] += 1
+
+    async def _clean_table(self, table_name: str, source: str):
+        async for moving in self._moving_records(table_name, source):
+            primary_keys = [record["primary_key"] for record, _ in moving]
+            await self._call_leader(
+                source, "POST", f"api/v1/records/{table_name}/batch/delete", json={"primary_keys": primary_keys}
+            )
+            REBALANCE_RECORDS.labels("cleaned").inc(len(primary_keys))
+            self._status["cleaned"] += len(primary_keys)
+
+    async def _moving_records(
+            self, table_name: str, source: str
+    ) -> AsyncIterator[List[Tuple[Dict[str, Any], str]]]:
+        cursor = None
+        while True:
+            params = {"limit": self.batch_size, "with_timestamps": "true"}
+            if cursor:
+                params["cursor"] = cursor
+            page = await self._call_leader(source, "GET", f"api/v1/records/{table_name}", params=params)
+
+            moving = []
+            targets = self.hashing_ring.get_groups_for_keys(
+                [f"{table_name}::{record['primary_key']}" for record in page["records"]]
+            )
+            for record, target in zip(page["records"], targets):
+                if target != source:
+                    moving.append((record, target))
+            if moving:
+                yield moving
+
+            cursor = page.get("next_cursor")
+            if not cursor:
+                return
+            await asyncio.sleep(self.batch_interval)
+
+    async def _call_leader(
+            self, group_id: str, method: str, path: str, accept: Tuple[int, ...] = (), **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Giving up half way would leave records only reachable through dual reads.
+        """
+        delay = self.retry_interval
+        while True:
+            try:
+                leader = self.coordinator.get_group_leader(group_id)
+                response = await self.http_pool.request(
+                    method, urljoin(leader, path), headers={"X-Trace-ID": trace_id_var.get()}, **kwargs
+                )
+                if response.status_code in accept:
+                    return {}
+                response.raise_for_status()
+                return response.json() if response.content else {}
+            except (HTTPException, httpx.HTTPError) as e:
+                self.logger.warning(f"Migration request {method} {path} on group '{group_id}' failed: {e}")
+                self._status["last_error"] = str(e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
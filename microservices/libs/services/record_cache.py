@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from aiokafka import AIOKafkaConsumer
+from prometheus_client import Counter, Gauge
+
+from microservices.libs.utils.consistency import ReadConsistency
+from microservices.libs.utils.replication_codec import decode_record
+
+CACHE_REQUESTS = Counter('router_record_cache_requests_total', 'Record cache lookups', ['result'])
+CACHE_EVICTIONS = Counter('router_record_cache_evictions_total', 'Entries removed from the record cache', ['reason'])
+CACHE_ENTRIES = Gauge('router_record_cache_entries', 'Records held in the router cache')
+CACHE_BYTES = Gauge('router_record_cache_bytes', 'Approximate size of the records held in the router cache')
+
+
+class _CacheEntry:
+    __slots__ = ("value", "size", "expires_at", "stored_at_ns", "as_of")
+
+    def __init__(self, value: Any, size: int, expires_at: float, as_of: int):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.stored_at_ns = time.time_ns()
+        self.as_of = as_of
+
+
+class RecordCache:
+    """
+    Invalidated from the replication topics; an invalidation older than an entry's applied timestamp is ignored.
+    """
+
+    def __init__(
+            self,
+            logger: logging.Logger,
+            max_entries: int = 0,
+            max_bytes: int = 64 * 1024 * 1024,
+            default_ttl: float = 30.0,
+            kafka_broker_url: Optional[str] = None,
+            invalidation_memory: int = 10000
+    ):
+        self.logger = logger
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.kafka_broker_url = kafka_broker_url
+        self.invalidation_memory = invalidation_memory
+
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._invalidated: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+        self._topics: Set[str] = set()
+        self._consumer: Optional[AIOKafkaConsumer] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    async def start(self):
+        if not self.enabled:
+            return
+        if not self.kafka_broker_url:
+            self.logger.warning("Record cache runs without replication invalidation, entries live until their TTL")
+            return
+        self._consumer = AIOKafkaConsumer(
+            bootstrap_servers=self.kafka_broker_url,
+            group_id=f"router-cache-{uuid.uuid4()}",
+            auto_offset_reset="latest"
+        )
+        await self._consumer.start()
+        if self._topics:
+            self._consumer.subscribe(sorted(self._topics))
+        self._task = asyncio.create_task(self._invalidation_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._consumer:
+            await self._consumer.stop()
+            self._consumer = None
+
+    def watch_topic(self, topic: str):
+        if topic in self._topics:
+            return
+        self._topics.add(topic)
+        if self._consumer:
+            self._consumer.subscribe(sorted(self._topics))
+            self.logger.info(f"Record cache now follows replication topic '{topic}'")
+
+    def get(
+            self, table_name: str, primary_key: str, consistency: Optional[ReadConsistency] = None
+    ) -> Tuple[bool, Any]:
+        """
+        Returns `(hit, value)`; entries too stale for the request count as misses.
+        """
+        if not self.enabled:
+            return False, None
+        key = f"{table_name}::{primary_key}"
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._remove(key, "expired")
+            entry = None
+        if entry is not None and consistency is not None and not self._satisfies(entry, consistency):
+            entry = None
+
+        if entry is None:
+            self._misses += 1
+            CACHE_REQUESTS.labels("miss").inc()
+            return False, None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        CACHE_REQUESTS.labels("hit").inc()
+        return True, entry.value
+
+    def put(self, table_name: str, primary_key: str, value: Any, ttl: float, as_of: int, size: int):
+        if not self.enabled or ttl <= 0 or size > self.max_bytes:
+            return
+        key = f"{table_name}::{primary_key}"
+        if self._invalidated.get(key, 0) > as_of:
+            # The node answered before it applied a write we have already seen.
+            return
+
+        if key in self._entries:
+            self._remove(key, None)
+        self._entries[key] = _CacheEntry(value, size, time.monotonic() + ttl, as_of)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)), "capacity")
+        self._update_gauges()
+
+    def invalidate(self, table_name: str, primary_key: str, timestamp: int):
+        if not self.enabled:
+            return
+        key = f"{table_name}::{primary_key}"
+        self._invalidated[key] = max(self._invalidated.get(key, 0), timestamp)
+        self._invalidated.move_to_end(key)
+        if len(self._invalidated) > self.invalidation_memory:
+            self._invalidated.popitem(last=False)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.as_of < timestamp:
+            self._remove(key, "invalidated")
+            self._update_gauges()
+
+    def invalidate_table(self, table_name: str):
+        prefix = f"{table_name}::"
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            self._remove(key, "invalidated")
+        self._update_gauges()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": self._hits / lookups if lookups else None,
+            "topics": sorted(self._topics)
+        }
+
+    @staticmethod
+    def _satisfies(entry: _CacheEntry, consistency: ReadConsistency) -> bool:
+        if consistency.min_timestamp is not None and entry.as_of < consistency.min_timestamp:
+            return False
+        if consistency.max_staleness_ns is not None:
+            return time.time_ns() - entry.stored_at_ns <= consistency.max_staleness_ns
+        return True
+
+    def _remove(self, key: str, reason: Optional[str]):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        if reason:
+            CACHE_EVICTIONS.labels(reason).inc()
+
+    def _update_gauges(self):
+        CACHE_ENTRIES.set(len(self._entries))
+        CACHE_BYTES.set(self._bytes)
+
+    async def _invalidation_loop(self):
+        while True:
+            if not self._topics:
+                await asyncio.sleep(0.5)
+                continue
+            try:
+                batches = await self._consumer.getmany(timeout_ms=500, max_records=5000)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Record cache invalidation stream failed: {e}")
+                await asyncio.sleep(1)
+                continue
+
+            for messages in batches.values():
+                for msg in messages:
+                    try:
+                        update = decode_record(msg.key, msg.value, msg.headers)
+                    except Exception as e:
+                        self.logger.error(f"Failed to decode replication message for cache invalidation: {e}")
+                        continue
+                    for _, primary_key, timestamp, _, _ in update.operations:
+                        self.invalidate(update.table_name, primary_key, timestamp)
@@ -0,0 +1,318 @@
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer, TopicPartition
+from fastapi import HTTPException
+
+from microservices.libs.schemas.shard import AckMode, ReplicationMessage
+from microservices.libs.utils.kafka_topics import ensure_topic
+from microservices.libs.utils.replication_codec import (
+    WireFormat,
+    encode_message,
+    partition_for_key,
+    record_key,
+    tombstone_headers
+)
+
+# (key, value, partition, headers, timestamp) of a record sent to the replication topic
+_TopicRecord = Tuple[Optional[bytes], Optional[bytes], int, Optional[List[Tuple[str, bytes]]], int]
+
+
+class ReplicationPipeline:
+    """
+    Ack modes: "local" once queued, "kafka" once the broker confirmed, "replicas" once `replica_acks` followers applied.
+    """
+
+    def __init__(
+            self,
+            kafka_broker_url: str,
+            kafka_topic: str,
+            node_id: str,
+            logger: logging.Logger,
+            ack_mode: AckMode = "kafka",
+            replica_acks: int = 1,
+            ack_timeout: float = 5.0,
+            linger_ms: int = 5,
+            max_batch_bytes: int = 65536,
+            compression_type: Optional[str] = None,
+            progress_interval: float = 0.05,
+            wire_format: WireFormat = "binary",
+            partitions: int = 1,
+            compaction: bool = False,
+            replication_factor: int = 1,
+            idle_heartbeat_interval: float = 1.0,
+            worker_index: int = 0,
+            worker_count: int = 1
+    ):
+        self.kafka_broker_url = kafka_broker_url
+        self.kafka_topic = kafka_topic
+        self.acks_topic = f"{kafka_topic}-acks"
+        self.node_id = node_id
+        self.logger = logger
+        self.ack_mode = ack_mode
+        self.replica_acks = replica_acks
+        self.ack_timeout = ack_timeout
+        self.linger_ms = linger_ms
+        self.max_batch_bytes = max_batch_bytes
+        self.compression_type = compression_type
+        self.progress_interval = progress_interval
+        self.wire_format = wire_format
+        self.partitions = partitions
+        self.compaction = compaction
+        self.replication_factor = replication_factor
+        self.idle_heartbeat_interval = idle_heartbeat_interval
+        self.worker_index = worker_index
+        self.worker_count = worker_count
+
+        self.producer: Optional[AIOKafkaProducer] = None
+        self._acks_consumer: Optional[AIOKafkaConsumer] = None
+        self._task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+        self._partitions: List[int] = list(range(partitions))
+        self._sent_timestamps: Dict[int, int] = {}
+        self._sent_at: Dict[int, float] = {}
+        self._latest_sent = 0
+        # Set by the storage service.
+        self.epoch = 0
+        self.safe_timestamp: Callable[[], int] = lambda: self._latest_sent
+
+        self._replica_progress: Dict[str, int] = {}
+        self._replica_waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._applied_timestamp = 0
+        self._reported_timestamp = 0
+
+    async def start(self, is_leader: bool):
+        self._replica_progress = {}
+        self.producer = AIOKafkaProducer(
+            bootstrap_servers=self.kafka_broker_url,
+            linger_ms=self.linger_ms,
+            max_batch_size=self.max_batch_bytes,
+            compression_type=self.compression_type
+        )
+        await self.producer.start()
+
+        if is_leader or self.worker_count > 1:
+            await self._load_partitions()
+        if is_leader:
+            self._heartbeat_task = asyncio.create_task(self._send_heartbeats())
+
+            self._acks_consumer = AIOKafkaConsumer(
+                self.acks_topic,
+                bootstrap_servers=self.kafka_broker_url,
+                group_id=None,
+                auto_offset_reset="latest"
+            )
+            await self._acks_consumer.start()
+            self._task = asyncio.create_task(self._collect_replica_acks())
+        else:
+            self._task = asyncio.create_task(self._report_progress())
+
+    async def _load_partitions(self):
+        await ensure_topic(
+            self.kafka_broker_url,
+            self.kafka_topic,
+            self.logger,
+            partitions=self.partitions,
+            replication_factor=self.replication_factor,
+            configs={"cleanup.policy": "compact"} if self.compaction else None
+        )
+        self._partitions = sorted(await self.producer.partitions_for(self.kafka_topic))
+        if len(self._partitions) == self.partitions:
+            return
+        if self.worker_count > 1:
+            # The dispatcher splits keys over the workers by the configured count.
+            raise RuntimeError(
+                f"Topic '{self.kafka_topic}' has {len(self._partitions)} partitions, but REPLICATION_PARTITIONS is "
+                f"{self.partitions}; workers would not consume the keys they are sent"
+            )
+        self.logger.warning(
+            f"Topic '{self.kafka_topic}' has {len(self._partitions)} partitions, not {self.partitions}; "
+            f"keeping the existing layout"
+        )
+
+    async def stop(self):
+        """
+        `start` may be called again after a role change.
+        """
+        for task in (self._task, self._heartbeat_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._heartbeat_task = None
+        if self._acks_consumer:
+            await self._acks_consumer.stop()
+            self._acks_consumer = None
+        if self.producer:
+            await self.producer.stop()
+            self.producer = None
+        for _, _, waiter in self._replica_waiters:
+            if not waiter.done():
+                waiter.set_exception(HTTPException(status_code=503, detail="Node stopped leading the group"))
+
+    async def publish(self, msg: ReplicationMessage, ack_mode: Optional[AckMode] = None):
+        ack_mode = ack_mode or self.ack_mode
+        deliveries = []
+        for key, value, partition, headers, timestamp in self._records(msg):
+            deliveries.append(
+                await self.producer.send(self.kafka_topic, value, key=key, partition=partition, headers=headers)
+            )
+            self._sent_timestamps[partition] = max(self._sent_timestamps.get(partition, 0), timestamp)
+            self._sent_at[partition] = time.monotonic()
+        self._latest_sent = max(self._latest_sent, msg.timestamp)
+        self.epoch = msg.epoch
+
+        if ack_mode == "local":
+            for delivery in deliveries:
+                delivery.add_done_callback(self._log_delivery_failure)
+            return
+
+        try:
+            await asyncio.gather(*deliveries)
+        except Exception as e:
+            self.logger.error(f"Failed to replicate {msg.table_name}/{msg.primary_key}: {e}")
+            raise HTTPException(status_code=503, detail="Replication log is unavailable")
+
+        if ack_mode == "replicas":
+            await self._wait_for_replicas(msg.timestamp)
+
+    @property
+    def owned_partitions(self) -> List[int]:
+        return [partition for partition in self._partitions if partition % self.worker_count == self.worker_index]
+
+    def partition_for(self, table_name: str, primary_key: str) -> int:
+        return self._partitions[partition_for_key(table_name, primary_key, len(self._partitions))]
+
+    def _records(self, msg: ReplicationMessage) -> Iterator[_TopicRecord]:
+        operations = msg.batch if msg.operation == "batch" else [msg]
+        if self.compaction:
+            for operation in operations:
+                key = record_key(msg.table_name, operation.primary_key)
+                partition = self.partition_for(msg.table_name, operation.primary_key)
+                single = operation.model_copy(update={"table_name": msg.table_name, "epoch": msg.epoch})
+                if operation.operation == "delete":
+                    yield key, None, partition, tombstone_headers(single), single.timestamp
+                else:
+                    yield key, encode_message(single, self.wire_format), partition, None, single.timestamp
+            return
+        if msg.operation != "batch":
+            key = record_key(msg.table_name, msg.primary_key)
+            partition = self.partition_for(msg.table_name, msg.primary_key)
+            yield key, encode_message(msg, self.wire_format), partition, None, msg.timestamp
+            return
+
+        by_partition: Dict[int, List[ReplicationMessage]] = defaultdict(list)
+        for operation in operations:
+            by_partition[self.partition_for(msg.table_name, operation.primary_key)].append(operation)
+        for partition, batch in by_partition.items():
+            # Every part keeps the batch timestamp: the partition has nothing else up to it.
+            part = msg if len(by_partition) == 1 else msg.model_copy(update={"batch": batch})
+            key = record_key(msg.table_name, batch[0].primary_key) if len(batch) == 1 else None
+            yield key, encode_message(part, self.wire_format), partition, None, msg.timestamp
+
+    async def _send_heartbeats(self):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            now = time.monotonic()
+            for partition in self.owned_partitions:
+                if self._sent_timestamps.get(partition, 0) < self._latest_sent:
+                    timestamp = self._latest_sent
+                elif now - self._sent_at.get(partition, 0) >= self.idle_heartbeat_interval:
+                    timestamp = max(self._latest_sent, self.safe_timestamp())
+                else:
+                    continue
+                heartbeat = ReplicationMessage(
+                    operation="batch", table_name="", timestamp=timestamp, epoch=self.epoch, batch=[]
+                )
+                try:
+                    delivery = await self.producer.send(
+                        self.kafka_topic,
+                        encode_message(heartbeat, self.wire_format),
+                        key=b"" if self.compaction else None,
+                        partition=partition
+                    )
+                    delivery.add_done_callback(self._log_delivery_failure)
+                    self._sent_timestamps[partition] = timestamp
+                    self._sent_at[partition] = now
+                except Exception as e:
+                    self.logger.error(f"Failed to send replication heartbeat to partition {partition}: {e}")
+
+    async def log_end_offsets(self) -> Dict[int, int]:
+        """
+        Offset of the last message in every owned partition of the topic, -1 for an empty one.
+        """
+        partitions = [TopicPartition(self.kafka_topic, partition) for partition in self.owned_partitions]
+        consumer = AIOKafkaConsumer(bootstrap_servers=self.kafka_broker_url, group_id=None)
+        await consumer.start()
+        try:
+            end_offsets = await consumer.end_offsets(partitions)
+        finally:
+            await consumer.stop()
+        return {tp.partition: offset - 1 for tp, offset in end_offsets.items()}
+
+    def record_applied(self, timestamp: int):
+        if timestamp > self._applied_timestamp:
+            self._applied_timestamp = timestamp
+
+    async def _wait_for_replicas(self, timestamp: int):
+        if self._count_replicas_at(timestamp) >= self.replica_acks:
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (timestamp, self.replica_acks, waiter)
+        self._replica_waiters.append(entry)
+        try:
+            await asyncio.wait_for(waiter, timeout=self.ack_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=504,
+                detail=f"Write was not acknowledged by {self.replica_acks} replica(s) in time"
+            )
+        finally:
+            if entry in self._replica_waiters:
+                self._replica_waiters.remove(entry)
+
+    def _count_replicas_at(self, timestamp: int) -> int:
+        return sum(1 for applied in self._replica_progress.values() if applied >= timestamp)
+
+    async def _collect_replica_acks(self):
+        try:
+            async for msg in self._acks_consumer:
+                try:
+                    ack = json.loads(msg.value.decode("utf-8"))
+                    if ack.get("worker", 0) != self.worker_index:
+                        continue
+                    node, applied = ack["node"], ack["timestamp"]
+                    if applied > self._replica_progress.get(node, 0):
+                        self._replica_progress[node] = applied
+                    for timestamp, required, waiter in list(self._replica_waiters):
+                        if not waiter.done() and self._count_replicas_at(timestamp) >= required:
+                            waiter.set_result(None)
+                except Exception as e:
+                    self.logger.error(f"Failed to process replica ack: {e}")
+        except asyncio.CancelledError:
+            pass
+
+    async def _report_progress(self):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            if self._applied_timestamp == self._reported_timestamp:
+                continue
+            timestamp = self._applied_timestamp
+            try:
+                ack = {"node": self.node_id, "worker": self.worker_index, "timestamp": timestamp}
+                await self.producer.send(self.acks_topic, json.dumps(ack).encode("utf-8"))
+                self._reported_timestamp = timestamp
+            except Exception as e:
+                self.logger.error(f"Failed to report replication progress: {e}")
+
+    def _log_delivery_failure(self, delivery: asyncio.Future):
+        if not delivery.cancelled() and delivery.exception():
+            self.logger.error(f"Asynchronous replication failed: {delivery.exception()}")
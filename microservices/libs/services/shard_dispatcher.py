@@ -0,0 +1,362 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from fastapi import HTTPException, Request, Response
+from prometheus_client import Counter
+
+from microservices.libs.schemas.shard import MemoryUsage, NodeStatus, TableMemoryUsage
+from microservices.libs.utils.consistency import APPLIED_TIMESTAMP_HEADER
+from microservices.libs.utils.http_pool import HOP_BY_HOP_HEADERS
+from microservices.libs.utils.logger import trace_id_var
+from microservices.libs.utils.replication_codec import partition_for_key
+
+WORKER_REQUESTS = Counter('shard_worker_requests_total', 'Requests dispatched to shard workers', ['worker'])
+WORKER_RESTARTS = Counter('shard_worker_restarts_total', 'Shard workers started again after exiting', ['worker'])
+
+# Recomputed for the dispatcher's own response, or no longer true once the body was decoded.
+_RESPONSE_HEADERS_TO_DROP = HOP_BY_HOP_HEADERS | {
+    "content-length", "content-encoding", APPLIED_TIMESTAMP_HEADER.lower()
+}
+
+
+class ShardDispatcher:
+    """
+    Runs `worker_count` shard apps on unix sockets; worker i owns the partitions p with p % worker_count == i.
+    """
+
+    def __init__(
+            self,
+            worker_count: int,
+            partitions: int,
+            socket_dir: str,
+            worker_app: str,
+            router_service_url: str,
+            advertised_url: str,
+            group_id: str,
+            is_leader: bool,
+            kafka_topic: str,
+            logger: logging.Logger,
+            start_timeout: float = 30.0,
+            request_timeout: float = 30.0,
+            status_interval: float = 0.5,
+            weight: int = 1
+    ):
+        if partitions < worker_count:
+            raise ValueError(f"{worker_count} workers need at least as many replication partitions, got {partitions}")
+        self.worker_count = worker_count
+        self.partitions = partitions
+        self.socket_dir = socket_dir
+        self.worker_app = worker_app
+        self.router_service_url = router_service_url
+        self.advertised_url = advertised_url
+        self.group_id = group_id
+        self.weight = weight
+        self.is_leader = is_leader
+        self.kafka_topic = kafka_topic
+        self.logger = logger
+        self.start_timeout = start_timeout
+        self.request_timeout = request_timeout
+        self.status_interval = status_interval
+
+        self._processes: List[Optional[asyncio.subprocess.Process]] = [None] * worker_count
+        self._clients: List[httpx.AsyncClient] = []
+        self._applied: List[int] = [0] * worker_count
+        self._epochs: List[int] = [0] * worker_count
+        self._tasks: List[asyncio.Task] = []
+
+    def socket_path(self, worker: int) -> str:
+        return os.path.join(self.socket_dir, f"worker-{worker}.sock")
+
+    def worker_for(self, table_name: str, primary_key: str) -> int:
+        return partition_for_key(table_name, primary_key, self.partitions) % self.worker_count
+
+    def split_keys(self, table_name: str, primary_keys: List[str]) -> Dict[int, List[int]]:
+        positions: Dict[int, List[int]] = defaultdict(list)
+        for position, primary_key in enumerate(primary_keys):
+            positions[self.worker_for(table_name, primary_key)].append(position)
+        return positions
+
+    @property
+    def applied_timestamp(self) -> int:
+        return max(self._applied) if self.is_leader else min(self._applied)
+
+    async def start(self):
+        os.makedirs(self.socket_dir, exist_ok=True)
+        self._clients = [
+            httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(uds=self.socket_path(worker)),
+                base_url="http://shard-worker",
+                timeout=self.request_timeout
+            )
+            for worker in range(self.worker_count)
+        ]
+        await asyncio.gather(*(self._spawn(worker) for worker in range(self.worker_count)))
+        self.logger.info(f"Started {self.worker_count} shard workers in '{self.socket_dir}'")
+
+        self._tasks = [asyncio.create_task(self._supervise(worker)) for worker in range(self.worker_count)]
+        self._tasks.append(asyncio.create_task(self._poll_status()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+        for process in self._processes:
+            if process and process.returncode is None:
+                process.terminate()
+        for worker, process in enumerate(self._processes):
+            if not process:
+                continue
+            try:
+                await asyncio.wait_for(process.wait(), timeout=self.start_timeout)
+            except asyncio.TimeoutError:
+                self.logger.warning(f"Shard worker {worker} did not stop in time, killing it")
+                process.kill()
+                await process.wait()
+
+        for client in self._clients:
+            await client.aclose()
+        self._clients = []
+
+    async def _spawn(self, worker: int):
+        """
+        Returns once the worker serves requests, i.e. after its store was recovered.
+        """
+        path = self.socket_path(worker)
+        if os.path.exists(path):
+            os.unlink(path)
+        env = {**os.environ, "WORKER_INDEX": str(worker), "IS_LEADER": "true" if self.is_leader else "false"}
+        self._applied[worker] = 0
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", self.worker_app, "--uds", path, env=env
+        )
+        self._processes[worker] = process
+
+        deadline = time.monotonic() + self.start_timeout
+        while True:
+            try:
+                response = await self._clients[worker].get("/api/v1/node/status")
+                if response.is_success:
+                    self._note_status(worker, response.json())
+                    return
+            except httpx.TransportError:
+                pass
+            if process.returncode is not None:
+                raise RuntimeError(f"Shard worker {worker} exited with code {process.returncode} while starting")
+            if time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError(f"Shard worker {worker} did not start within {self.start_timeout}s")
+            await asyncio.sleep(0.1)
+
+    async def _supervise(self, worker: int):
+        while True:
+            code = await self._processes[worker].wait()
+            self.logger.error(f"Shard worker {worker} exited with code {code}, starting it again")
+            WORKER_RESTARTS.labels(str(worker)).inc()
+            try:
+                await self._spawn(worker)
+                # Brings the new process up to date with the table indexes, role and epoch.
+                await self.register_self()
+            except Exception as e:
+                self.logger.error(f"Failed to restart shard worker {worker}: {e}")
+                await asyncio.sleep(1)
+
+    async def _poll_status(self):
+        while True:
+            await asyncio.sleep(self.status_interval)
+            for worker, client in enumerate(self._clients):
+                try:
+                    response = await client.get("/api/v1/node/status")
+                    if response.is_success:
+                        self._note_status(worker, response.json())
+                except httpx.TransportError:
+                    pass
+
+    def _note_status(self, worker: int, status: Dict[str, Any]):
+        self._epochs[worker] = max(self._epochs[worker], status["epoch"])
+        self._applied[worker] = max(self._applied[worker], status["applied_timestamp"])
+
+    def _note_response(self, worker: int, response: httpx.Response):
+        applied_timestamp = response.headers.get(APPLIED_TIMESTAMP_HEADER)
+        if applied_timestamp:
+            self._applied[worker] = max(self._applied[worker], int(applied_timestamp))
+
+    async def _send(self, worker: int, request: httpx.Request, stream: bool = False) -> httpx.Response:
+        WORKER_REQUESTS.labels(str(worker)).inc()
+        try:
+            response = await self._clients[worker].send(request, stream=stream)
+        except httpx.RequestError as e:
+            self.logger.error(f"Shard worker {worker} failed to answer {request.method} {request.url.path}: {e}")
+            raise HTTPException(status_code=503, detail=f"Shard worker {worker} is unavailable")
+        self._note_response(worker, response)
+        return response
+
+    @staticmethod
+    def _forwarded_headers(request: Request) -> Dict[str, str]:
+        headers = {k: v for k, v in request.headers.items() if k not in HOP_BY_HOP_HEADERS}
+        headers.pop("host", None)
+        headers.pop("content-length", None)
+        headers["X-Trace-ID"] = trace_id_var.get()
+        return headers
+
+    async def forward(self, worker: int, request: Request) -> Response:
+        upstream = self._clients[worker].build_request(
+            request.method,
+            request.url.path,
+            params=request.query_params,
+            headers=self._forwarded_headers(request),
+            content=await request.body() or None
+        )
+        response = await self._send(worker, upstream)
+        headers = {k: v for k, v in response.headers.items() if k not in _RESPONSE_HEADERS_TO_DROP}
+        return Response(content=response.content, status_code=response.status_code, headers=headers)
+
+    async def stream(self, worker: int, request: Request, path: str) -> AsyncIterator[bytes]:
+        upstream = self._clients[worker].build_request("GET", path, headers=self._forwarded_headers(request))
+        response = await self._send(worker, upstream, stream=True)
+        if response.is_error:
+            await response.aread()
+            await response.aclose()
+            self._raise_for_status(response)
+
+        async def relay() -> AsyncIterator[bytes]:
+            try:
+                async for chunk in response.aiter_raw():
+                    yield chunk
+            finally:
+                await response.aclose()
+
+        return relay()
+
+    async def call(
+            self,
+            worker: int,
+            request: Request,
+            method: str,
+            path: str,
+            json: Any = None
+    ) -> Any:
+        """
+        Worker errors are raised as they are.
+        """
+        upstream = self._clients[worker].build_request(
+            method, path, params=request.query_params, headers=self._forwarded_headers(request), json=json
+        )
+        response = await self._send(worker, upstream)
+        self._raise_for_status(response)
+        return response.json()
+
+    async def broadcast(self, request: Request, method: str, path: str, json: Any = None) -> List[Any]:
+        return list(await asyncio.gather(
+            *(self.call(worker, request, method, path, json) for worker in range(self.worker_count))
+        ))
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response):
+        if not response.is_error:
+            return
+        try:
+            detail = response.json().get("detail", response.text)
+        except ValueError:
+            detail = response.text
+        raise HTTPException(status_code=response.status_code, detail=detail)
+
+    def merge_statuses(self, statuses: List[Dict[str, Any]]) -> NodeStatus:
+        for worker, status in enumerate(statuses):
+            self._note_status(worker, status)
+        return NodeStatus(
+            group_id=self.group_id,
+            role="leader" if self.is_leader else "follower",
+            epoch=max(status["epoch"] for status in statuses),
+            applied_timestamp=self.applied_timestamp
+        )
+
+    @staticmethod
+    def merge_memory_usage(usages: List[Dict[str, Any]]) -> MemoryUsage:
+        tables: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        cold_storage: Dict[str, int] = defaultdict(int)
+        for usage in usages:
+            for table_name, table_usage in usage["tables"].items():
+                for field, value in table_usage.items():
+                    tables[table_name][field] += value
+            for field, value in (usage.get("cold_storage") or {}).items():
+                cold_storage[field] += value
+        limits = [usage["hot_memory_limit"] for usage in usages if usage.get("hot_memory_limit") is not None]
+        return MemoryUsage(
+            tables={table_name: TableMemoryUsage(**usage) for table_name, usage in tables.items()},
+            total_bytes=sum(usage["total_bytes"] for usage in usages),
+            hot_memory_limit=sum(limits) if limits else None,
+            cold_storage=dict(cold_storage) if cold_storage else None
+        )
+
+    async def change_role(self, request: Request, is_leader: bool, epoch: int) -> NodeStatus:
+        action = "promote" if is_leader else "demote"
+        statuses = await self.broadcast(request, "POST", f"/api/v1/node/{action}", json={"epoch": epoch})
+        self.is_leader = is_leader
+        return self.merge_statuses(statuses)
+
+    async def register_self(self):
+        payload = {
+            "shard_url": self.advertised_url,
+            "group_id": self.group_id,
+            "is_leader": self.is_leader,
+            "epoch": max(self._epochs),
+            "replication_topic": self.kafka_topic,
+            "weight": self.weight
+        }
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.post(
+                    f"{self.router_service_url}/_internal/register_shard",
+                    json=payload,
+                    timeout=5
+                )
+            if response.is_success:
+                await self._apply_registration(response.json())
+            self.logger.info(
+                f"Successfully registered {self.worker_count} workers at router: {self.router_service_url} "
+                f"as {'Leader' if self.is_leader else 'Follower'}"
+            )
+        except httpx.RequestError:
+            self.logger.error("Could not register at router after all attempts")
+
+    async def _apply_registration(self, registration: Dict[str, Any]):
+        for table in registration.get("tables", []):
+            await self._post_all(
+                "PUT", f"/api/v1/tables/{table['table_name']}/indexes", {"indexes": table.get("indexes", [])}
+            )
+        if "epoch" not in registration:
+            return
+        # A restarted worker may be behind the others.
+        is_leader = self.is_leader and registration.get("role") != "follower"
+        epoch = max(registration["epoch"], *self._epochs)
+        action = "promote" if is_leader else "demote"
+        for worker, status in enumerate(await self._post_all("POST", f"/api/v1/node/{action}", {"epoch": epoch})):
+            if status is not None:
+                self._note_status(worker, status)
+        self.is_leader = is_leader
+
+    async def _post_all(self, method: str, path: str, json: Any) -> List[Optional[Dict[str, Any]]]:
+        async def post(worker: int) -> Optional[Dict[str, Any]]:
+            upstream = self._clients[worker].build_request(
+                method, path, json=json, headers={"X-Trace-ID": trace_id_var.get()}
+            )
+            try:
+                response = await self._send(worker, upstream)
+                self._raise_for_status(response)
+                return response.json()
+            except HTTPException as e:
+                self.logger.error(f"Shard worker {worker} rejected {method} {path}: {e.detail}")
+                return None
+
+        return list(await asyncio.gather(*(post(worker) for worker in range(self.worker_count))))
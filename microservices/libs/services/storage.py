@@ -3,14 +3,116 @@ import json
 import logging
 import time
 import uuid
-from typing import Any, Dict, Optional
+from collections import defaultdict
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import urljoin
 
 import httpx
-from aiokafka import AIOKafkaProducer, AIOKafkaConsumer
+from aiokafka import AIOKafkaConsumer, ConsumerRebalanceListener, TopicPartition
 from fastapi import HTTPException
-from prometheus_client import Gauge
+from prometheus_client import Counter, Gauge, Histogram
 
-from microservices.libs.schemas.shard import ReplicationMessage
+from microservices.libs.schemas.shard import (
+    AckMode,
+    BatchItemResult,
+    BatchRecordItem,
+    IndexDefinition,
+    IndexMatch,
+    IndexQuery,
+    MemoryUsage,
+    MigratedRecord,
+    NodeStatus,
+    RecordUpdate,
+    ReplicationMessage,
+    ScanRecord,
+    TableMemoryUsage
+)
+from microservices.libs.services.cold_store import ColdStore
+from microservices.libs.services.replication import ReplicationPipeline
+from microservices.libs.services.table import StoredRecord, Table, decode_value
+from microservices.libs.services.wal import WriteAheadLog
+from microservices.libs.utils.kafka_topics import delete_consumer_group
+from microservices.libs.utils.merge_patch import apply_merge_patch, create_merge_patch
+from microservices.libs.utils.replication_codec import (
+    Operation,
+    decode_record,
+    update_from_dict
+)
+
+_EMPTY_TABLE = Table()
+_DELETED = object()
+_APPLY_RETRY_SECONDS = 1.0
+
+REPLICATION_LAG = Gauge('shard_replication_lag_seconds', 'Lag between leader and follower')
+REPLICATED_OPERATIONS = Counter(
+    'shard_replicated_operations_total', 'Replicated operations received by followers', ['result']
+)
+REPAIRED_RECORDS = Counter(
+    'shard_repaired_records_total', 'Records fetched from the leader after a patch did not match the local version'
+)
+REPLICATION_BATCH_SIZE = Histogram(
+    'shard_replication_batch_operations', 'Operations applied per follower batch',
+    buckets=(1, 10, 100, 1000, 10000, 100000)
+)
+TABLE_MEMORY = Gauge('shard_table_memory_bytes', 'Estimated memory held by the records of all tables')
+SPILLED_BYTES = Counter('shard_cold_spilled_bytes_total', 'Record payload bytes spilled to cold storage')
+EXPIRED_RECORDS = Counter('shard_expired_records_total', 'Records removed after their TTL ran out')
+SNAPSHOT_RECORDS = Counter(
+    'shard_snapshot_records_total', 'Records transferred by follower bootstrap snapshots', ['direction']
+)
+
+
+class _Undo(NamedTuple):
+    """
+    Restores the record a lost leader write replaced, as long as the key is still as the write left it.
+    """
+    table_name: str
+    primary_key: str
+    timestamp: int
+    deleted: bool
+    previous: Optional[Tuple[bytes, int, Optional[int]]]
+    previous_delete: Optional[int]
+
+
+def _logged_operation(operation: List[Any]) -> Operation:
+    """
+    Older entries lack the expiry field or carry a bare merge-patch.
+    """
+    kind, primary_key, timestamp, value, expires_at = tuple(operation) + (None,) * (5 - len(operation))
+    if kind == "patch":
+        value = tuple(value) if isinstance(value, list) else (None, value)
+    return kind, primary_key, timestamp, value, expires_at
+
+
+def _merge_fields(target: Dict[str, Any], fields: Dict[str, Any]):
+    for field, value in fields.items():
+        if isinstance(value, dict) and isinstance(target.get(field), dict):
+            _merge_fields(target[field], value)
+        else:
+            target[field] = value
+
+
+class _ResumeFromCheckpoint(ConsumerRebalanceListener):
+    def __init__(self, storage: "StorageService"):
+        self.storage = storage
+
+    async def on_partitions_revoked(self, revoked):
+        pass
+
+    async def on_partitions_assigned(self, assigned):
+        storage = self.storage
+        storage._partition_timestamps = {
+            tp.partition: storage._partition_timestamps.get(tp.partition, storage._applied_timestamp) for tp in assigned
+        }
+        for tp in assigned:
+            offset = self.storage._replication_offsets.get(tp.partition)
+            if offset is not None:
+                self.storage.consumer.seek(tp, offset + 1)
+                self.storage.logger.info(f"Resuming replication of {tp} from offset {offset + 1}")
+            else:
+                # Offsets committed to the group describe state this node no longer holds.
+                await self.storage.consumer.seek_to_beginning(tp)
 
 
 class StorageService:
@@ -22,145 +124,808 @@ class StorageService:
             is_leader: bool,
             kafka_broker_url: str,
             kafka_topic: str,
-            logger: logging.Logger
+            replication: ReplicationPipeline,
+            logger: logging.Logger,
+            wal: Optional[WriteAheadLog] = None,
+            snapshot_interval: float = 60.0,
+            snapshot_min_entries: int = 10000,
+            catch_up_timeout: float = 5.0,
+            apply_max_records: int = 5000,
+            apply_timeout_ms: int = 100,
+            cold_store: Optional[ColdStore] = None,
+            hot_memory_limit: int = 256 * 1024 * 1024,
+            spill_interval: float = 1.0,
+            compaction_interval: float = 30.0,
+            compaction_live_ratio: float = 0.5,
+            expiry_interval: float = 1.0,
+            expiry_batch_size: int = 1000,
+            consumer_group: Optional[str] = None,
+            checkpoint_interval: float = 5.0,
+            snapshot_page_size: int = 1000,
+            worker_index: int = 0,
+            worker_count: int = 1,
+            weight: int = 1,
+            repair_retry_interval: float = 1.0
     ):
         self.router_service_url = router_service_url
         self.advertised_url = advertised_url
         self.group_id = group_id
+        self.weight = weight
         self.is_leader = is_leader
         self.kafka_broker_url = kafka_broker_url
         self.kafka_topic = kafka_topic
+        self.replication = replication
         self.logger = logger
-        self._data_store: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._data_store: Dict[str, Table] = {}
+        TABLE_MEMORY.set_function(
+            lambda: sum(table.memory_usage()["total_bytes"] for table in list(self._data_store.values()))
+        )
+
+        self.wal = wal
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_min_entries = snapshot_min_entries
+        self._replication_offsets: Dict[int, int] = {}
+        self._partition_timestamps: Dict[int, int] = {}
+        self._last_timestamp = 0
+        self._applied_timestamp = 0
+
+        self.epoch = 0
+        self._replication_epoch = 0
+        self.catch_up_timeout = catch_up_timeout
+
+        self.apply_max_records = apply_max_records
+        self.apply_timeout_ms = apply_timeout_ms
+
+        self.cold_store = cold_store
+        self.hot_memory_limit = hot_memory_limit
+        self.spill_interval = spill_interval
+        self.compaction_interval = compaction_interval
+        self.compaction_live_ratio = compaction_live_ratio
+        self._tiering_task: Optional[asyncio.Task] = None
+
+        self.expiry_interval = expiry_interval
+        self.expiry_batch_size = expiry_batch_size
+        self._expiry_task: Optional[asyncio.Task] = None
+        self._role_lock = asyncio.Lock()
+
+        self.repair_retry_interval = repair_retry_interval
+        self._repairs: Set[Tuple[str, str]] = set()
+        self._repairs_pending = asyncio.Event()
+        self._repairing: Set[Tuple[str, str]] = set()
+        self._repair_deletes: Dict[Tuple[str, str], int] = {}
+        self._repair_task: Optional[asyncio.Task] = None
+
+        self.consumer_group = consumer_group or f"shard-{group_id}-{uuid.uuid4()}"
+        self._replaced_consumer_group: Optional[str] = None
+        self.checkpoint_interval = checkpoint_interval
+        self.snapshot_page_size = snapshot_page_size
+
+        self.worker_index = worker_index
+        self.worker_count = worker_count
+        self._commits_in_flight = 0
+        self._deletes_in_flight: Dict[Tuple[str, str], int] = {}
 
-        self.producer: Optional[AIOKafkaProducer] = None
         self.consumer: Optional[AIOKafkaConsumer] = None
         self._consumer_task: Optional[asyncio.Task] = None
+        self._snapshot_task: Optional[asyncio.Task] = None
 
     async def start(self):
+        if self.cold_store:
+            self.cold_store.open()
+        if self.wal:
+            self._recover_from_wal()
+            await self.wal.start()
+            self._snapshot_task = asyncio.create_task(self._snapshot_loop())
+        if not self.is_leader and not self._replication_offsets and not self._data_store:
+            await self._bootstrap_from_leader()
+        if self.cold_store:
+            self._enforce_memory_budget()
+            self._tiering_task = asyncio.create_task(self._tiering_loop())
+        self._expiry_task = asyncio.create_task(self._expiry_loop())
+
+        await self._start_role()
+        if self._replaced_consumer_group:
+            await self._drop_replaced_consumer_group()
+
+    async def _drop_replaced_consumer_group(self):
+        try:
+            await delete_consumer_group(self.kafka_broker_url, self._replaced_consumer_group, self.logger)
+            self._replaced_consumer_group = None
+        except Exception as e:
+            self.logger.warning(f"Failed to delete replaced consumer group '{self._replaced_consumer_group}': {e}")
+
+    async def _start_role(self):
+        await self.replication.start(self.is_leader)
+
         if self.is_leader:
-            self.producer = AIOKafkaProducer(bootstrap_servers=self.kafka_broker_url)
-            await self.producer.start()
+            self.replication.epoch = self.epoch
+            self.replication.safe_timestamp = self._safe_timestamp
             self.logger.info(f"Leader started. Writing to topic: {self.kafka_topic}")
         else:
-            unique_group = f"shard-{self.group_id}-{uuid.uuid4()}"
             self.consumer = AIOKafkaConsumer(
-                self.kafka_topic,
                 bootstrap_servers=self.kafka_broker_url,
-                group_id=unique_group,
+                group_id=self.consumer_group,
+                enable_auto_commit=False,
                 auto_offset_reset="earliest"
             )
             await self.consumer.start()
+            if self.worker_count > 1:
+                owned = [TopicPartition(self.kafka_topic, partition) for partition in self.replication.owned_partitions]
+                self.consumer.assign(owned)
+                await _ResumeFromCheckpoint(self).on_partitions_assigned(owned)
+            else:
+                self.consumer.subscribe([self.kafka_topic], listener=_ResumeFromCheckpoint(self))
             self._consumer_task = asyncio.create_task(self._replication_loop())
+            self._repair_task = asyncio.create_task(self._repair_loop())
             self.logger.info(f"Follower started. Listening on topic: {self.kafka_topic}")
 
-    async def stop(self):
-        if self.producer:
-            await self.producer.stop()
+    async def _stop_role(self):
+        await self.replication.stop()
+        for task in (self._consumer_task, self._repair_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._consumer_task = self._repair_task = None
+        if self._repairs:
+            self.logger.warning(f"Stopped replicating with {len(self._repairs)} records still to fetch from the leader")
+            self._repairs.clear()
         if self.consumer:
+            await self._checkpoint()
             await self.consumer.stop()
-        if self._consumer_task:
-            self._consumer_task.cancel()
+            self.consumer = None
+
+    async def stop(self):
+        await self._stop_role()
+        for task in (self._snapshot_task, self._tiering_task, self._expiry_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        if self.wal:
+            if self.wal.entries_since_snapshot:
+                await self._write_snapshot()
+            await self.wal.stop()
+        if self.cold_store:
+            self.cold_store.close()
+
+    def _recover_from_wal(self):
+        state, pages, tail = self.wal.recover()
+        for table_name, records in pages:
+            self._get_or_create_table(table_name).put_many(records, encoded=True)
+            if self.cold_store:
+                self._enforce_memory_budget()
+        if state:
+            self._replication_offsets = {int(p): o for p, o in state["offsets"].items()}
+
+        for entry in tail:
+            if "offset" in entry:
+                self._replication_offsets[entry["partition"]] = entry["offset"]
+            for partition, offset in entry.get("offsets", {}).items():
+                self._replication_offsets[int(partition)] = offset
+            if "operations" in entry:
+                self._apply_operations(entry["table_name"], [_logged_operation(op) for op in entry["operations"]])
+                self._applied_timestamp = max(self._applied_timestamp, entry["timestamp"])
+            elif "table_name" in entry:
+                update = update_from_dict(entry)
+                self._apply_operations(update.table_name, update.operations)
+                self._applied_timestamp = max(self._applied_timestamp, update.timestamp)
+
+        records = sum(len(table) for table in self._data_store.values())
+        self.logger.info(f"Restored {records} records in {len(self._data_store)} tables from local WAL")
+        previous_group = state.get("consumer_group") if state else None
+        if previous_group and previous_group != self.consumer_group:
+            self._replaced_consumer_group = previous_group
+
+    async def _write_snapshot(self):
+        state = {"offsets": dict(self._replication_offsets), "consumer_group": self.consumer_group}
+        await self.wal.write_snapshot(state, self._state_pages())
+
+    async def _state_pages(self) -> AsyncIterator[List[Any]]:
+        for table_name in list(self._data_store):
+            cursor = None
+            while True:
+                table = self._data_store.get(table_name)
+                if table is None:
+                    break
+                records = table.export_page(cursor, self.snapshot_page_size)
+                if records or cursor is None:
+                    yield [table_name, records]
+                if len(records) < self.snapshot_page_size:
+                    break
+                cursor = records[-1][0]
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            if self.wal.entries_since_snapshot < self.snapshot_min_entries:
+                continue
+            try:
+                await self._write_snapshot()
+            except Exception as e:
+                self.logger.error(f"Failed to write WAL snapshot: {e}")
+
+    async def _tiering_loop(self):
+        last_compaction = time.monotonic()
+        while True:
+            await asyncio.sleep(self.spill_interval)
             try:
-                await self._consumer_task
-            except asyncio.CancelledError:
-                pass
+                self._enforce_memory_budget()
+                if time.monotonic() - last_compaction >= self.compaction_interval:
+                    last_compaction = time.monotonic()
+                    await self._compact_cold_store()
+            except Exception as e:
+                self.logger.error(f"Cold storage maintenance failed: {e}")
+
+    def _enforce_memory_budget(self):
+        hot_bytes = sum(table.hot_bytes for table in self._data_store.values())
+        if hot_bytes <= self.hot_memory_limit:
+            return
+        # Spill a little below the limit so that every new write does not trigger a sweep.
+        to_free = hot_bytes - int(self.hot_memory_limit * 0.9)
+        freed = 0
+        for table in sorted(self._data_store.values(), key=lambda t: t.hot_bytes, reverse=True):
+            if freed >= to_free:
+                break
+            freed += table.spill(self.cold_store, to_free - freed)
+        SPILLED_BYTES.inc(freed)
+        self.logger.info(f"Spilled {freed} bytes of record payloads to cold storage ({hot_bytes} bytes were hot)")
+
+    async def _compact_cold_store(self):
+        empty, sparse = self.cold_store.reclaimable(self.compaction_live_ratio)
+        if sparse:
+            segments = set(sparse)
+            moved = 0
+            for table in list(self._data_store.values()):
+                moved += table.relocate(segments, self.cold_store)
+                await asyncio.sleep(0)
+            self.logger.info(f"Compacted {len(sparse)} cold segments, relocated {moved} records")
+        for segment in empty + sparse:
+            self.cold_store.drop(segment)
+
+    async def _expiry_loop(self):
+        while True:
+            await asyncio.sleep(self.expiry_interval)
+            try:
+                await self._expire_records()
+            except Exception as e:
+                self.logger.error(f"Record expiry sweep failed: {e}")
+
+    async def _expire_records(self):
+        """
+        The leader also publishes the removals as deletes, which keeps the replication log authoritative.
+        """
+        now = time.time_ns()
+        expired = 0
+        for table_name, table in list(self._data_store.items()):
+            while True:
+                primary_keys = table.pop_expired(now, self.expiry_batch_size)
+                if not primary_keys:
+                    break
+                table.delete_many(primary_keys)
+                expired += len(primary_keys)
+                if self.is_leader:
+                    await self._replicate_batch(table_name, [
+                        ReplicationMessage(
+                            operation="delete",
+                            table_name=table_name,
+                            primary_key=primary_key,
+                            timestamp=self._next_timestamp()
+                        )
+                        for primary_key in primary_keys
+                    ], None)
+                else:
+                    await asyncio.sleep(0)
+                if len(primary_keys) < self.expiry_batch_size:
+                    break
+
+        if expired:
+            EXPIRED_RECORDS.inc(expired)
+            self.logger.info(f"Expired {expired} records")
 
     async def _replication_loop(self):
+        """
+        A partition whose messages could not be applied is fetched again from the first one that failed.
+        """
+        last_checkpoint = time.monotonic()
+        while True:
+            batches = await self.consumer.getmany(timeout_ms=self.apply_timeout_ms, max_records=self.apply_max_records)
+            try:
+                failed = self._apply_replication_batch(batches) if batches else {}
+            except Exception as e:
+                self.logger.error(f"Failed to apply replication batch: {e}")
+                failed = {tp: messages[0].offset for tp, messages in batches.items() if messages}
+            if failed:
+                for tp, offset in failed.items():
+                    self.consumer.seek(tp, offset)
+                await asyncio.sleep(_APPLY_RETRY_SECONDS)
+            if time.monotonic() - last_checkpoint >= self.checkpoint_interval:
+                last_checkpoint = time.monotonic()
+                await self._checkpoint()
+
+    async def _checkpoint(self):
+        """
+        Only keeps the lag visible on the broker; positions on start always come from local state.
+        """
+        if not self._replication_offsets:
+            return
+        try:
+            await self.consumer.commit({
+                TopicPartition(self.kafka_topic, partition): offset + 1
+                for partition, offset in self._replication_offsets.items()
+            })
+        except Exception as e:
+            self.logger.warning(f"Failed to checkpoint replication offsets: {e}")
+
+    async def _bootstrap_from_leader(self):
+        """
+        The snapshot's offsets are taken before its first page; replaying from there covers writes made while paging.
+        """
+        started = time.monotonic()
+        header: Optional[Dict[str, Any]] = None
+        received = 0
+        try:
+            async with httpx.AsyncClient(timeout=30) as client:
+                leader = await self._find_leader(client)
+                if leader is None:
+                    self.logger.info(f"No leader to bootstrap from in group '{self.group_id}', replaying the log")
+                    return
+
+                params = {"worker": self.worker_index} if self.worker_count > 1 else None
+                async with client.stream("GET", urljoin(leader, "api/v1/node/snapshot"), params=params) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        if header is None:
+                            header = json.loads(line)
+                            continue
+                        page = json.loads(line)
+                        table_name = page["table_name"]
+                        records = [
+                            (record["primary_key"], record["value"], record["timestamp"], record.get("expires_at"))
+                            for record in page["records"] if self._owns_key(table_name, record["primary_key"])
+                        ]
+                        self._get_or_create_table(table_name).put_many(records)
+                        received += len(records)
+                        if self.cold_store:
+                            self._enforce_memory_budget()
+            if header is None:
+                raise ValueError("empty snapshot")
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            self.logger.warning(f"Snapshot bootstrap failed, replaying the replication log instead: {e}")
+            self._data_store = {}
+            return
+
+        self._replication_offsets = {int(partition): offset for partition, offset in header["offsets"].items()}
+        self._replication_epoch = header["epoch"]
+        self.epoch = max(self.epoch, header["epoch"])
+        self._applied_timestamp = max(self._applied_timestamp, header["timestamp"])
+        if self.wal:
+            await self._write_snapshot()
+        SNAPSHOT_RECORDS.labels("received").inc(received)
+        self.logger.info(
+            f"Bootstrapped {received} records from leader {leader} in {time.monotonic() - started:.1f}s, "
+            f"replicating from offsets {self._replication_offsets}"
+        )
+
+    def _owns_key(self, table_name: str, primary_key: str) -> bool:
+        # A single-process leader sends its whole keyspace to every worker.
+        if self.worker_count == 1:
+            return True
+        return self.replication.partition_for(table_name, primary_key) % self.worker_count == self.worker_index
+
+    async def _find_leader(self, client: httpx.AsyncClient) -> Optional[str]:
+        response = await client.get(f"{self.router_service_url}/_internal/groups/{self.group_id}")
+        response.raise_for_status()
+        leader = response.json().get("leader")
+        return leader if leader and leader != self.advertised_url else None
+
+    def _request_repair(self, table_name: str, primary_key: str):
+        if self.is_leader:
+            self.logger.error(f"Patch of '{primary_key}' in table '{table_name}' does not match its local version")
+            return
+        self._repairs.add((table_name, primary_key))
+        self._repairs_pending.set()
+
+    async def _repair_loop(self):
+        """
+        Fetches the records whose replicated patches did not match the local version from the leader.
+        """
+        while True:
+            await self._repairs_pending.wait()
+            self._repairs_pending.clear()
+            repairs, self._repairs = self._repairs, set()
+            self._repairing = repairs
+            try:
+                await self._repair_records(repairs)
+            except (httpx.HTTPError, ValueError, KeyError) as e:
+                self.logger.warning(f"Could not fetch {len(repairs)} records from the leader, retrying: {e}")
+                self._repairs |= repairs
+                self._repairs_pending.set()
+                await asyncio.sleep(self.repair_retry_interval)
+            finally:
+                self._repairing = set()
+                self._repair_deletes.clear()
+
+    async def _repair_records(self, repairs: Set[Tuple[str, str]]):
+        async with httpx.AsyncClient(timeout=30) as client:
+            leader = await self._find_leader(client)
+            if leader is None:
+                raise ValueError(f"group '{self.group_id}' has no leader")
+            for table_name, primary_key in sorted(repairs):
+                response = await client.get(
+                    urljoin(leader, f"api/v1/records/{table_name}"),
+                    params={"start": primary_key, "limit": 1, "with_timestamps": "true"}
+                )
+                response.raise_for_status()
+                records = response.json()["records"]
+                if records and records[0]["primary_key"] == primary_key:
+                    self._store_repaired(table_name, records[0])
+                repairs.discard((table_name, primary_key))
+
+    def _store_repaired(self, table_name: str, record: Dict[str, Any]):
+        primary_key, timestamp = record["primary_key"], record["timestamp"]
+        table = self._get_or_create_table(table_name)
+        existing_record = table.records.get(primary_key)
+        if existing_record is not None and existing_record.timestamp >= timestamp:
+            return
+        # Deleted here while the leader's answer was on its way.
+        if self._repair_deletes.get((table_name, primary_key), 0) >= timestamp:
+            return
+        operation = ("create", primary_key, timestamp, record["value"], record.get("expires_at"))
+        table.put(primary_key, record["value"], timestamp, record.get("expires_at"))
+        if self.wal:
+            self.wal.append({"table_name": table_name, "timestamp": self._applied_timestamp, "operations": [operation]})
+        REPAIRED_RECORDS.inc()
+        self.logger.info(f"Fetched record '{primary_key}' of table '{table_name}' from the leader")
+
+    async def open_snapshot(self) -> AsyncIterator[bytes]:
+        """
+        NDJSON: a header with the epoch, timestamp and offsets, then `{"table_name", "records"}` pages.
+        """
+        self._require_leader()
         try:
-            async for msg in self.consumer:
+            offsets = await self.replication.log_end_offsets()
+        except Exception as e:
+            self.logger.error(f"Failed to read replication log offsets for a snapshot: {e}")
+            raise HTTPException(status_code=503, detail="Replication log is unavailable")
+        header = {"epoch": self.epoch, "timestamp": self._last_timestamp, "offsets": offsets}
+        return self._snapshot_pages(header)
+
+    async def _snapshot_pages(self, header: Dict[str, Any]) -> AsyncIterator[bytes]:
+        yield (json.dumps(header) + "\n").encode("utf-8")
+        sent = 0
+        for table_name in list(self._data_store):
+            cursor = None
+            while True:
+                table = self._data_store.get(table_name)
+                if table is None:
+                    break
+                page = list(table.scan(after=cursor, limit=self.snapshot_page_size))
+                if not page:
+                    break
+                records = [
+                    {
+                        "primary_key": primary_key,
+                        "value": record.value,
+                        "timestamp": record.timestamp,
+                        "expires_at": table.expires_at(primary_key)
+                    }
+                    for primary_key, record in page
+                ]
+                yield (json.dumps({"table_name": table_name, "records": records}) + "\n").encode("utf-8")
+                sent += len(records)
+                cursor = page[-1][0]
+        SNAPSHOT_RECORDS.labels("sent").inc(sent)
+        self.logger.info(f"Streamed a {sent} record snapshot at offsets {header['offsets']}")
+
+    def _apply_replication_batch(self, batches: Dict[Any, List[Any]]) -> Dict[Any, int]:
+        """
+        Returns the offset each partition that hit an undecodable message has to be fetched again from.
+        """
+        operations_by_table: Dict[str, List[Operation]] = defaultdict(list)
+        offsets: Dict[int, int] = {}
+        failed: Dict[Any, int] = {}
+        partition_timestamps: Dict[int, int] = {}
+        latest_timestamp = 0
+        fenced = 0
+        for tp, messages in batches.items():
+            for msg in messages:
                 try:
-                    data = json.loads(msg.value.decode("utf-8"))
-                    message = ReplicationMessage(**data)
-                    self._apply_update(message)
+                    update = decode_record(msg.key, msg.value, msg.headers)
                 except Exception as e:
-                    self.logger.error(f"Failed to process replication message: {e}")
-        except asyncio.CancelledError:
-            pass
+                    self.logger.error(f"Failed to decode replication message {tp}@{msg.offset}: {e}")
+                    failed[tp] = msg.offset
+                    break
+                offsets[tp.partition] = msg.offset
+                if update.epoch < self._replication_epoch:
+                    fenced += len(update.operations)
+                    continue
+                self._replication_epoch = update.epoch
+                if update.operations:
+                    operations_by_table[update.table_name].extend(update.operations)
+                partition_timestamps[tp.partition] = max(partition_timestamps.get(tp.partition, 0), update.timestamp)
+                latest_timestamp = max(latest_timestamp, update.timestamp)
 
-    def _apply_update(self, msg: ReplicationMessage):
-        if msg.table_name not in self._data_store:
-            self._data_store[msg.table_name] = {}
+        if fenced:
+            REPLICATED_OPERATIONS.labels("fenced").inc(fenced)
+            self.logger.warning(f"[FENCED] Dropped {fenced} operations from a deposed leader")
+        self.epoch = max(self.epoch, self._replication_epoch)
 
-        existing_record = self._data_store[msg.table_name].get(msg.primary_key)
+        received = applied = 0
+        applied_by_table: List[Tuple[str, List[Operation]]] = []
+        for table_name, operations in operations_by_table.items():
+            received += len(operations)
+            changes = self._apply_operations(table_name, operations)
+            applied += len(changes)
+            if changes:
+                applied_by_table.append((table_name, changes))
 
-        if existing_record:
-            if msg.timestamp <= existing_record["timestamp"]:
-                self.logger.info(f"[LWW] Ignoring stale update for {msg.table_name}/{msg.primary_key}")
-                return
+        for partition, timestamp in partition_timestamps.items():
+            self._partition_timestamps[partition] = max(self._partition_timestamps.get(partition, 0), timestamp)
+        watermark = max(self._applied_timestamp, min(self._partition_timestamps.values(), default=0))
+        if self.wal:
+            # Offsets ride on the last entry so they are never persisted ahead of their data.
+            entries = [
+                {"table_name": table_name, "timestamp": watermark, "operations": changes}
+                for table_name, changes in applied_by_table
+            ]
+            if entries:
+                entries[-1]["offsets"] = offsets
+            elif offsets:
+                entries.append({"offsets": offsets})
+            for entry in entries:
+                self.wal.append(entry)
+        self._replication_offsets.update(offsets)
 
-        if msg.operation == "create":
-            self._data_store[msg.table_name][msg.primary_key] = {
-                "value": msg.value.get("value"),
-                "timestamp": msg.timestamp
-            }
-            self.logger.info(f"[REPLICA] Applied CREATE {msg.table_name}/{msg.primary_key}")
-        elif msg.operation == "delete":
-            if msg.primary_key in self._data_store[msg.table_name]:
-                del self._data_store[msg.table_name][msg.primary_key]
-                self.logger.info(f"[REPLICA] Applied DELETE {msg.table_name}/{msg.primary_key}")
-
-        lag = (time.time_ns() - msg.timestamp) / 1e9
-        Gauge('shard_replication_lag_seconds', 'Lag between leader and follower').set(lag + 10)
-
-    async def create_record(self, table_name: str, primary_key: str, value: Any) -> Any:
-        if not self.is_leader:
-            raise HTTPException(
-                status_code=400,
-                detail="Write operations allowed only on Leader"
-            )
+        if not latest_timestamp:
+            return failed
+        self._applied_timestamp = watermark
+        self.replication.record_applied(watermark)
+        if not received:
+            return failed
 
-        if table_name not in self._data_store:
-            self._data_store[table_name] = {}
+        REPLICATED_OPERATIONS.labels("applied").inc(applied)
+        REPLICATED_OPERATIONS.labels("stale").inc(received - applied)
+        REPLICATION_BATCH_SIZE.observe(received)
+        REPLICATION_LAG.set(max(time.time_ns() - latest_timestamp, 0) / 1e9)
+        self.logger.debug(
+            f"[REPLICA] Applied {applied}/{received} operations across {len(operations_by_table)} tables"
+        )
+        return failed
 
-        # if primary_key in self._data_store[table_name]:
-        #     raise HTTPException(
-        #         status_code=409,
-        #         detail=f"Record with key '{primary_key}' already exists in table '{table_name}'"
-        #     )
+    def _apply_operations(self, table_name: str, operations: List[Operation]) -> List[Operation]:
+        """
+        Returns the operations that changed the store; patches made against another version are repaired instead.
+        """
+        table = self._get_or_create_table(table_name)
+        records = table.records
+        applied: List[Operation] = []
+        changes: Dict[str, Tuple[Any, Optional[int], int]] = {}
+        for operation in operations:
+            kind, primary_key, timestamp, value, expires_at = operation
+            pending = changes.get(primary_key)
+            if pending is None:
+                existing_record = records.get(primary_key)
+                if existing_record is not None and timestamp <= existing_record.timestamp:
+                    continue
+                exists = existing_record is not None
+            else:
+                if timestamp <= pending[2]:
+                    continue
+                exists = pending[0] is not _DELETED
 
-        timestamp = time.time_ns()
+            if kind == "create":
+                changes[primary_key] = (value, expires_at, timestamp)
+            elif kind == "delete":
+                if self._repairing and (table_name, primary_key) in self._repairing:
+                    self._repair_deletes[(table_name, primary_key)] = timestamp
+                if not exists:
+                    continue
+                changes[primary_key] = (_DELETED, None, timestamp)
+            else:
+                base_timestamp, patch = value
+                local_timestamp = (existing_record.timestamp if pending is None else pending[2]) if exists else None
+                if local_timestamp is None or base_timestamp not in (None, local_timestamp):
+                    self._request_repair(table_name, primary_key)
+                    continue
+                if pending is None:
+                    patched = apply_merge_patch(existing_record.value, patch)
+                    changes[primary_key] = (patched, table.expires_at(primary_key), timestamp)
+                else:
+                    changes[primary_key] = (apply_merge_patch(pending[0], patch), pending[1], timestamp)
+            applied.append(operation)
 
-        self._data_store[table_name][primary_key] = {
-            "value": value,
-            "timestamp": timestamp
-        }
+        table.put_many([
+            (primary_key, value, timestamp, expires_at)
+            for primary_key, (value, expires_at, timestamp) in changes.items() if value is not _DELETED
+        ])
+        table.delete_many([
+            primary_key for primary_key, change in changes.items() if change[0] is _DELETED and primary_key in records
+        ])
+        return applied
+
+    async def create_record(
+            self,
+            table_name: str,
+            primary_key: str,
+            value: Any,
+            ack_mode: Optional[AckMode] = None,
+            ttl_seconds: Optional[float] = None,
+            if_absent: bool = False,
+            if_version: Optional[int] = None
+    ) -> int:
+        self._require_leader()
+
+        table = self._get_or_create_table(table_name)
+        self._check_condition(table, table_name, primary_key, if_absent, if_version)
+
+        timestamp = self._next_timestamp()
+        expires_at = self._expires_at(timestamp, ttl_seconds)
+
+        undo: List[_Undo] = []
+        self._put(table_name, table, primary_key, value, timestamp, expires_at, undo)
 
         msg = ReplicationMessage(
             operation="create",
             table_name=table_name,
             primary_key=primary_key,
             value={"value": value},
-            timestamp=timestamp
+            timestamp=timestamp,
+            expires_at=expires_at
         )
-        await self.producer.send_and_wait(self.kafka_topic, json.dumps(msg.model_dump()).encode("utf-8"))
+        await self._commit(msg, ack_mode, undo)
 
         self.logger.info(f"Created record '{primary_key}' in table '{table_name}'")
-        return value
+        return timestamp
+
+    async def update_record(
+            self, table_name: str, primary_key: str, update: RecordUpdate, ack_mode: Optional[AckMode] = None
+    ) -> Tuple[Any, int]:
+        """
+        Read-modify-write on the leader, so concurrent updates cannot overwrite each other.
+        """
+        self._require_leader()
 
-    def read_record(self, table_name: str, primary_key: str) -> Any:
-        if table_name not in self._data_store or primary_key not in self._data_store[table_name]:
+        table = self._get_or_create_table(table_name)
+        record = self._check_condition(table, table_name, primary_key, if_version=update.if_version)
+        previous = record.value if record is not None else None
+        if record is not None:
+            value = record.value
+        elif update.initial is not None:
+            value = dict(update.initial)
+        else:
             raise HTTPException(
                 status_code=404,
                 detail=f"Record '{primary_key}' not found in table '{table_name}'"
             )
-        return self._data_store[table_name][primary_key]["value"]
+        if not isinstance(value, dict):
+            raise HTTPException(status_code=409, detail=f"Record '{primary_key}' is not a JSON object")
 
-    async def delete_record(self, table_name: str, primary_key: str):
-        if not self.is_leader:
+        if update.patch is not None:
+            value = apply_merge_patch(value, update.patch)
+        _merge_fields(value, update.merge)
+        for field, amount in update.increment.items():
+            current = value.get(field, 0)
+            if isinstance(current, bool) or not isinstance(current, (int, float)):
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Field '{field}' of record '{primary_key}' is not a number"
+                )
+            value[field] = current + amount
+
+        timestamp = self._next_timestamp()
+        if record is not None:
+            expires_at = table.expires_at(primary_key)
+        else:
+            expires_at = self._expires_at(timestamp, update.ttl_seconds)
+        undo: List[_Undo] = []
+        self._put(table_name, table, primary_key, value, timestamp, expires_at, undo)
+
+        # A compacted topic may drop the version a patch applies to, so it always gets the full record.
+        patch = None
+        if isinstance(previous, dict) and not self.replication.compaction:
+            patch = create_merge_patch(previous, value)
+        if patch is not None:
+            msg = ReplicationMessage(
+                operation="patch",
+                table_name=table_name,
+                primary_key=primary_key,
+                value={"value": patch},
+                timestamp=timestamp,
+                base_timestamp=record.timestamp
+            )
+        else:
+            msg = ReplicationMessage(
+                operation="create",
+                table_name=table_name,
+                primary_key=primary_key,
+                value={"value": value},
+                timestamp=timestamp,
+                expires_at=expires_at
+            )
+        await self._commit(msg, ack_mode, undo)
+
+        self.logger.info(f"Updated record '{primary_key}' in table '{table_name}'")
+        return value, timestamp
+
+    async def create_records(
+            self, table_name: str, records: List[BatchRecordItem], ack_mode: Optional[AckMode] = None
+    ) -> List[BatchItemResult]:
+        self._require_leader()
+
+        table = self._get_or_create_table(table_name)
+        operations = []
+        undo: List[_Undo] = []
+        for record in records:
+            timestamp = self._next_timestamp()
+            expires_at = self._expires_at(timestamp, record.ttl_seconds)
+            self._put(table_name, table, record.primary_key, record.value, timestamp, expires_at, undo)
+            operations.append(ReplicationMessage(
+                operation="create",
+                table_name=table_name,
+                primary_key=record.primary_key,
+                value={"value": record.value},
+                timestamp=timestamp,
+                expires_at=expires_at
+            ))
+
+        await self._replicate_batch(table_name, operations, ack_mode, undo=undo)
+        self.logger.info(f"Created {len(operations)} records in table '{table_name}'")
+        return [
+            BatchItemResult(primary_key=record.primary_key, status_code=201, value=record.value)
+            for record in records
+        ]
+
+    def read_record(self, table_name: str, primary_key: str) -> StoredRecord:
+        record = self._get_table(table_name).get(primary_key)
+        if record is None:
             raise HTTPException(
-                status_code=400,
-                detail="Write operations allowed only on Leader"
+                status_code=404,
+                detail=f"Record '{primary_key}' not found in table '{table_name}'"
             )
+        return record
+
+    def read_records(self, table_name: str, primary_keys: List[str]) -> List[BatchItemResult]:
+        table = self._get_table(table_name)
+        results = []
+        for primary_key in primary_keys:
+            record = table.get(primary_key)
+            if record is None:
+                results.append(BatchItemResult(
+                    primary_key=primary_key,
+                    status_code=404,
+                    error=f"Record '{primary_key}' not found in table '{table_name}'"
+                ))
+            else:
+                results.append(BatchItemResult(primary_key=primary_key, status_code=200, value=record.value))
+        return results
 
-        if table_name not in self._data_store or primary_key not in self._data_store[table_name]:
+    async def delete_record(
+            self,
+            table_name: str,
+            primary_key: str,
+            ack_mode: Optional[AckMode] = None,
+            if_version: Optional[int] = None
+    ):
+        self._require_leader()
+
+        table = self._get_table(table_name)
+        if primary_key not in table:
             raise HTTPException(
                 status_code=404,
                 detail=f"Record '{primary_key}' not found in table '{table_name}'"
             )
+        self._check_condition(table, table_name, primary_key, if_version=if_version)
 
-        timestamp = time.time_ns()
-        del self._data_store[table_name][primary_key]
+        timestamp = self._next_timestamp()
+        undo: List[_Undo] = []
+        self._delete(table_name, table, primary_key, timestamp, undo)
 
         msg = ReplicationMessage(
             operation="delete",
@@ -168,28 +933,395 @@ class StorageService:
             primary_key=primary_key,
             timestamp=timestamp
         )
-        await self.producer.send_and_wait(self.kafka_topic, json.dumps(msg.model_dump()).encode("utf-8"))
+        await self._commit(msg, ack_mode, undo)
 
         self.logger.info(f"Deleted record '{primary_key}' from table '{table_name}'")
 
+    async def delete_records(
+            self, table_name: str, primary_keys: List[str], ack_mode: Optional[AckMode] = None
+    ) -> List[BatchItemResult]:
+        self._require_leader()
+
+        table = self._get_table(table_name)
+        operations = []
+        results = []
+        undo: List[_Undo] = []
+        for primary_key in primary_keys:
+            if primary_key not in table:
+                results.append(BatchItemResult(
+                    primary_key=primary_key,
+                    status_code=404,
+                    error=f"Record '{primary_key}' not found in table '{table_name}'"
+                ))
+                continue
+            timestamp = self._next_timestamp()
+            self._delete(table_name, table, primary_key, timestamp, undo)
+            operations.append(ReplicationMessage(
+                operation="delete",
+                table_name=table_name,
+                primary_key=primary_key,
+                timestamp=timestamp
+            ))
+            results.append(BatchItemResult(primary_key=primary_key, status_code=204))
+
+        await self._replicate_batch(table_name, operations, ack_mode, undo=undo)
+        self.logger.info(f"Deleted {len(operations)} records from table '{table_name}'")
+        return results
+
+    async def import_records(
+            self, table_name: str, records: List[MigratedRecord], ack_mode: Optional[AckMode] = None
+    ) -> int:
+        """
+        Keeps the original timestamps, so anything written here since the migration started wins.
+        """
+        self._require_leader()
+
+        table = self._get_or_create_table(table_name)
+        operations = []
+        undo: List[_Undo] = []
+        now = time.time_ns()
+        for record in records:
+            if record.expires_at is not None and record.expires_at <= now:
+                continue
+            existing_record = table.records.get(record.primary_key)
+            if existing_record is not None and existing_record.timestamp >= record.timestamp:
+                continue
+            self._put(table_name, table, record.primary_key, record.value, record.timestamp, record.expires_at, undo)
+            self._last_timestamp = max(self._last_timestamp, record.timestamp)
+            operations.append(ReplicationMessage(
+                operation="create",
+                table_name=table_name,
+                primary_key=record.primary_key,
+                value={"value": record.value},
+                timestamp=record.timestamp,
+                expires_at=record.expires_at
+            ))
+
+        await self._replicate_batch(table_name, operations, ack_mode, timestamp=self._next_timestamp(), undo=undo)
+        self.logger.info(f"Imported {len(operations)} of {len(records)} migrated records into '{table_name}'")
+        return len(operations)
+
+    async def _replicate_batch(
+            self,
+            table_name: str,
+            operations: List[ReplicationMessage],
+            ack_mode: Optional[AckMode],
+            timestamp: Optional[int] = None,
+            undo: Optional[List[_Undo]] = None
+    ):
+        if not operations:
+            return
+        msg = ReplicationMessage(
+            operation="batch",
+            table_name=table_name,
+            timestamp=timestamp or operations[-1].timestamp,
+            batch=operations
+        )
+        await self._commit(msg, ack_mode, undo)
+
+    def scan_records(
+            self,
+            table_name: str,
+            start: Optional[str] = None,
+            end: Optional[str] = None,
+            prefix: Optional[str] = None,
+            cursor: Optional[str] = None,
+            limit: int = 1000,
+            with_timestamps: bool = False
+    ) -> Tuple[List[ScanRecord], Optional[str]]:
+        table = self._get_table(table_name)
+        page = list(table.scan(start=start, end=end, prefix=prefix, after=cursor, limit=limit + 1))
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = page[-1][0]
+        return [
+            ScanRecord(
+                primary_key=key,
+                value=record.value,
+                timestamp=record.timestamp if with_timestamps else None,
+                expires_at=table.expires_at(key) if with_timestamps else None
+            )
+            for key, record in page
+        ], next_cursor
+
+    def define_indexes(self, table_name: str, indexes: List[IndexDefinition]):
+        table = self._get_or_create_table(table_name)
+        built = table.set_indexes({index.field: index.kind for index in indexes})
+        if built:
+            self.logger.info(f"Built indexes {built} on table '{table_name}' over {len(table)} records")
+
+    def lookup_index(self, table_name: str, field: str, query: IndexQuery) -> List[IndexMatch]:
+        table = self._get_table(table_name)
+        index = table.indexes.get(field)
+        if index is None:
+            raise HTTPException(status_code=400, detail=f"Field '{field}' is not indexed in table '{table_name}'")
+
+        if not query.is_range:
+            matches = index.lookup(query.value, query.limit)
+        elif index.kind == "sorted":
+            matches = index.range(query.start, query.end, query.limit)
+        else:
+            raise HTTPException(status_code=400, detail=f"Range lookups need a sorted index on '{field}'")
+
+        results = []
+        seen = set()
+        for term, primary_key in matches:
+            if primary_key in seen:
+                continue
+            seen.add(primary_key)
+            record = table.get(primary_key)
+            if record is None:
+                # Expired, waiting for the next sweep.
+                continue
+            results.append(IndexMatch(primary_key=primary_key, index_value=term, value=record.value))
+        return results
+
+    @property
+    def applied_timestamp(self) -> int:
+        return self._last_timestamp if self.is_leader else self._applied_timestamp
+
+    def _get_table(self, table_name: str) -> Table:
+        table = self._data_store.get(table_name)
+        return table if table is not None else _EMPTY_TABLE
+
+    def _get_or_create_table(self, table_name: str) -> Table:
+        table = self._data_store.get(table_name)
+        if table is None:
+            table = self._data_store[table_name] = Table()
+        return table
+
+    def _require_leader(self):
+        if not self.is_leader:
+            raise HTTPException(
+                status_code=400,
+                detail="Write operations allowed only on Leader"
+            )
+
+    @staticmethod
+    def _check_condition(
+            table: Table,
+            table_name: str,
+            primary_key: str,
+            if_absent: bool = False,
+            if_version: Optional[int] = None
+    ) -> Optional[StoredRecord]:
+        """
+        Must run before the first await of a write, so nothing can change the record in between.
+        """
+        record = table.get(primary_key)
+        if if_absent and record is not None:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Record with key '{primary_key}' already exists in table '{table_name}'"
+            )
+        if if_version is not None and (record is None or record.timestamp != if_version):
+            current = record.timestamp if record is not None else None
+            raise HTTPException(
+                status_code=412,
+                detail=f"Record '{primary_key}' in table '{table_name}' is at version {current}, not {if_version}"
+            )
+        return record
+
+    @staticmethod
+    def _expires_at(timestamp: int, ttl_seconds: Optional[float]) -> Optional[int]:
+        return timestamp + int(ttl_seconds * 1_000_000_000) if ttl_seconds else None
+
+    def _next_timestamp(self) -> int:
+        self._last_timestamp = max(time.time_ns(), self._last_timestamp + 1)
+        return self._last_timestamp
+
+    def _put(
+            self,
+            table_name: str,
+            table: Table,
+            primary_key: str,
+            value: Any,
+            timestamp: int,
+            expires_at: Optional[int],
+            undo: List[_Undo]
+    ):
+        undo.append(_Undo(table_name, primary_key, timestamp, False, self._previous(table, primary_key), None))
+        table.put(primary_key, value, timestamp, expires_at)
+
+    def _delete(self, table_name: str, table: Table, primary_key: str, timestamp: int, undo: List[_Undo]):
+        key = (table_name, primary_key)
+        previous_delete = self._deletes_in_flight.get(key)
+        previous = self._previous(table, primary_key)
+        undo.append(_Undo(table_name, primary_key, timestamp, True, previous, previous_delete))
+        self._deletes_in_flight[key] = timestamp
+        table.delete(primary_key)
+
+    @staticmethod
+    def _previous(table: Table, primary_key: str) -> Optional[Tuple[bytes, int, Optional[int]]]:
+        record = table.records.get(primary_key)
+        if record is None:
+            return None
+        return record.payload, record.timestamp, table.expires_at(primary_key)
+
+    def _undo_writes(self, undo: List[_Undo]):
+        for write in reversed(undo):
+            table = self._get_or_create_table(write.table_name)
+            key = (write.table_name, write.primary_key)
+            if write.deleted:
+                if write.primary_key in table.records or self._deletes_in_flight.get(key) != write.timestamp:
+                    continue
+                if write.previous_delete is None:
+                    del self._deletes_in_flight[key]
+                else:
+                    self._deletes_in_flight[key] = write.previous_delete
+            else:
+                record = table.records.get(write.primary_key)
+                if record is None or record.timestamp != write.timestamp:
+                    continue
+
+            if write.previous is None:
+                table.delete(write.primary_key)
+            else:
+                payload, timestamp, expires_at = write.previous
+                table.put(write.primary_key, decode_value(payload), timestamp, expires_at)
+        self.logger.warning(f"Undid {len(undo)} writes whose WAL entry was lost")
+
+    async def _commit(self, msg: ReplicationMessage, ack_mode: Optional[AckMode], undo: Optional[List[_Undo]] = None):
+        """
+        A write the WAL loses is undone in memory and never replicated.
+        """
+        msg.epoch = self.epoch
+        self._commits_in_flight += 1
+        try:
+            if self.wal:
+                try:
+                    lsn = self.wal.append(msg.model_dump(), partial(self._undo_writes, undo) if undo else None)
+                except RuntimeError as e:
+                    if undo:
+                        self._undo_writes(undo)
+                    self._fail_commit(msg, e)
+                try:
+                    await self.wal.wait_durable(lsn)
+                except RuntimeError as e:
+                    self._fail_commit(msg, e)
+            await self.replication.publish(msg, ack_mode)
+        finally:
+            self._commits_in_flight -= 1
+            for write in undo or ():
+                key = (write.table_name, write.primary_key)
+                if write.deleted and self._deletes_in_flight.get(key) == write.timestamp:
+                    del self._deletes_in_flight[key]
+
+    def _fail_commit(self, msg: ReplicationMessage, error: Exception):
+        self.logger.error(f"Write to table '{msg.table_name}' was not made durable and was undone: {error}")
+        raise HTTPException(status_code=503, detail="Write could not be made durable, it was not applied")
+
+    def _safe_timestamp(self) -> int:
+        """
+        Writes are stamped synchronously right before `_commit`, so with none in flight it is the current time.
+        """
+        if self._commits_in_flight:
+            return 0
+        self._last_timestamp = max(self._last_timestamp, time.time_ns())
+        return self._last_timestamp
+
+    def check_epoch(self, epoch: Optional[int]):
+        if epoch is not None and epoch != self.epoch:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Leader epoch mismatch: request has {epoch}, node is at {self.epoch}"
+            )
+
+    def get_memory_usage(self) -> MemoryUsage:
+        tables = {name: TableMemoryUsage(**table.memory_usage()) for name, table in self._data_store.items()}
+        total = sum(usage.total_bytes for usage in tables.values())
+        return MemoryUsage(
+            tables=tables,
+            total_bytes=total,
+            hot_memory_limit=self.hot_memory_limit if self.cold_store else None,
+            cold_storage=self.cold_store.get_stats() if self.cold_store else None
+        )
+
+    def get_status(self) -> NodeStatus:
+        return NodeStatus(
+            group_id=self.group_id,
+            role="leader" if self.is_leader else "follower",
+            epoch=self.epoch,
+            applied_timestamp=self.applied_timestamp
+        )
+
+    async def promote(self, epoch: int):
+        """
+        Only a newer epoch is accepted, except as a repeat of the promotion that made this node leader.
+        """
+        async with self._role_lock:
+            if self.is_leader and epoch == self.epoch:
+                return
+            if epoch <= self.epoch:
+                raise HTTPException(status_code=409, detail=f"Epoch {epoch} is not newer than {self.epoch}")
+            if self.is_leader:
+                self.epoch = epoch
+                self.replication.epoch = epoch
+                return
+
+            await self._catch_up()
+            await self._stop_role()
+            self.epoch = epoch
+            self.is_leader = True
+            self._last_timestamp = max(self._last_timestamp, self._applied_timestamp)
+            await self._start_role()
+            self.logger.warning(f"Promoted to leader of group '{self.group_id}' (epoch {epoch})")
+
+    async def demote(self, epoch: int):
+        async with self._role_lock:
+            if epoch < self.epoch:
+                raise HTTPException(status_code=409, detail=f"Epoch {epoch} is older than {self.epoch}")
+            self.epoch = epoch
+            if not self.is_leader:
+                return
+            await self._stop_role()
+            self.is_leader = False
+            self._applied_timestamp = max(self._applied_timestamp, self._last_timestamp)
+            await self._start_role()
+            self.logger.warning(f"Stepped down to follower of group '{self.group_id}' (epoch {epoch})")
+
+    async def _catch_up(self):
+        if not self.consumer or not self.consumer.assignment():
+            return
+        end_offsets = await self.consumer.end_offsets(list(self.consumer.assignment()))
+        deadline = time.monotonic() + self.catch_up_timeout
+        while any(self._replication_offsets.get(tp.partition, -1) + 1 < end for tp, end in end_offsets.items()):
+            if time.monotonic() > deadline:
+                self.logger.warning("Taking over leadership before the replication log was fully applied")
+                return
+            await asyncio.sleep(0.01)
+
     def exists_record(self, table_name: str, primary_key: str) -> bool:
-        if table_name not in self._data_store:
-            return False
-        return primary_key in self._data_store[table_name]
+        return primary_key in self._get_table(table_name)
 
     async def register_self(self):
         payload = {
             "shard_url": self.advertised_url,
             "group_id": self.group_id,
-            "is_leader": self.is_leader
+            "is_leader": self.is_leader,
+            "epoch": self.epoch,
+            "replication_topic": self.kafka_topic,
+            "weight": self.weight
         }
         try:
             async with httpx.AsyncClient() as client:
-                await client.post(
+                response = await client.post(
                     f"{self.router_service_url}/_internal/register_shard",
                     json=payload,
                     timeout=5
                 )
+            if response.is_success:
+                registration = response.json()
+                for table in registration.get("tables", []):
+                    indexes = [IndexDefinition(**index) for index in table.get("indexes", [])]
+                    self.define_indexes(table["table_name"], indexes)
+                # The group may have failed over to another node while this one was away.
+                if registration.get("role") == "follower" and self.is_leader:
+                    await self.demote(registration["epoch"])
+                elif "epoch" in registration:
+                    self.epoch = max(self.epoch, registration["epoch"])
             self.logger.info(
                 f"Successfully registered at router: {self.router_service_url} as {'Leader' if self.is_leader else 'Follower'}")
         except httpx.RequestError:
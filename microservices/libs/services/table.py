@@ -0,0 +1,437 @@
+import heapq
+import json
+import sys
+import time
+from bisect import bisect_left, bisect_right, insort
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import msgpack
+
+if TYPE_CHECKING:
+    from microservices.libs.services.cold_store import ColdSegment, ColdStore
+
+_SCALARS = (str, int, float, bool)
+
+
+def index_terms(value: Any) -> List[Any]:
+    """
+    Lists are indexed element-wise, so `genres: ["drama", "sci-fi"]` is found under both genres.
+    """
+    if isinstance(value, list):
+        return list(dict.fromkeys(term for term in value if isinstance(term, _SCALARS)))
+    return [value] if isinstance(value, _SCALARS) else []
+
+
+def term_sort_key(term: Any) -> Tuple[int, Any]:
+    """
+    Total order over mixed-type terms: numbers, then strings, then booleans.
+    """
+    if isinstance(term, bool):
+        return 2, term
+    if isinstance(term, (int, float)):
+        return 0, term
+    return 1, term
+
+
+class HashIndex:
+    kind = "hash"
+
+    def __init__(self, field: str):
+        self.field = field
+        self._entries: Dict[Any, Set[str]] = {}
+
+    def add(self, primary_key: str, value: Any):
+        for term in index_terms(value.get(self.field) if isinstance(value, dict) else None):
+            self._entries.setdefault(term, set()).add(primary_key)
+
+    def remove(self, primary_key: str, value: Any):
+        for term in index_terms(value.get(self.field) if isinstance(value, dict) else None):
+            keys = self._entries.get(term)
+            if keys is not None:
+                keys.discard(primary_key)
+                if not keys:
+                    del self._entries[term]
+
+    def lookup(self, term: Any, limit: int) -> List[Tuple[Any, str]]:
+        return [(term, primary_key) for primary_key in sorted(self._entries.get(term, ()))[:limit]]
+
+
+class SortedIndex:
+    kind = "sorted"
+
+    def __init__(self, field: str):
+        self.field = field
+        self._entries: List[Tuple[Tuple[int, Any], str]] = []
+
+    def add(self, primary_key: str, value: Any):
+        for term in index_terms(value.get(self.field) if isinstance(value, dict) else None):
+            insort(self._entries, (term_sort_key(term), primary_key))
+
+    def remove(self, primary_key: str, value: Any):
+        for term in index_terms(value.get(self.field) if isinstance(value, dict) else None):
+            entry = (term_sort_key(term), primary_key)
+            position = bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+
+    def lookup(self, term: Any, limit: int) -> List[Tuple[Any, str]]:
+        return self.range(term, None, limit, inclusive_end=term)
+
+    def range(
+            self, start: Any, end: Any, limit: int, inclusive_end: Any = None
+    ) -> List[Tuple[Any, str]]:
+        position = bisect_left(self._entries, (term_sort_key(start), "")) if start is not None else 0
+        upper = term_sort_key(end) if end is not None else None
+        upper_inclusive = term_sort_key(inclusive_end) if inclusive_end is not None else None
+
+        matches = []
+        while position < len(self._entries) and len(matches) < limit:
+            sort_key, primary_key = self._entries[position]
+            if upper is not None and sort_key >= upper:
+                break
+            if upper_inclusive is not None and sort_key > upper_inclusive:
+                break
+            matches.append((sort_key[1], primary_key))
+            position += 1
+        return matches
+
+
+_INDEX_TYPES = {index_type.kind: index_type for index_type in (HashIndex, SortedIndex)}
+
+# Below this many keys, per-key sorted insertion/removal is cheaper than a full pass.
+_BULK_THRESHOLD = 64
+
+# Smaller payloads cost less in memory than the location record that would replace them.
+_MIN_SPILL_BYTES = 64
+
+
+class StoredRecord:
+    """
+    `touched` is the reference bit of the CLOCK sweep that spills records to disk.
+    """
+    __slots__ = ("payload", "timestamp", "touched")
+
+    def __init__(self, payload: bytes, timestamp: int):
+        self.payload = payload
+        self.timestamp = timestamp
+        self.touched = True
+
+    @property
+    def value(self) -> Any:
+        return decode_value(self.payload)
+
+
+class ColdRecord:
+    __slots__ = ("segment", "offset", "length", "timestamp")
+
+    def __init__(self, segment: "ColdSegment", offset: int, length: int, timestamp: int):
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+        self.timestamp = timestamp
+
+    @property
+    def payload(self) -> bytes:
+        return self.segment.read(self.offset, self.length)
+
+    @property
+    def value(self) -> Any:
+        return decode_value(self.payload)
+
+
+# Values msgpack cannot represent natively (integers beyond 64 bits) are kept as JSON in an ext frame.
+_JSON_EXT = 1
+
+
+def encode_value(value: Any) -> bytes:
+    try:
+        return msgpack.packb(value, use_bin_type=True)
+    except (OverflowError, TypeError):
+        return msgpack.packb(msgpack.ExtType(_JSON_EXT, json.dumps(value).encode("utf-8")))
+
+
+def _decode_ext(code: int, data: bytes) -> Any:
+    if code == _JSON_EXT:
+        return json.loads(data)
+    return msgpack.ExtType(code, data)
+
+
+def decode_value(payload: bytes) -> Any:
+    return msgpack.unpackb(payload, raw=False, ext_hook=_decode_ext)
+
+
+# The slotted record, its timestamp int, the bytes header and the hash map / key list slots.
+_RECORD_OVERHEAD = (
+        sys.getsizeof(StoredRecord(b"", 0)) + sys.getsizeof(2 ** 62) + sys.getsizeof(b"") + 3 * 8 + 8
+)
+
+_EXPIRY_ENTRY_OVERHEAD = sys.getsizeof((0, "")) + sys.getsizeof(2 ** 62) + 8
+
+
+class Table:
+    """
+    Heap entries made obsolete by overwritten expiries are skipped lazily by `pop_expired`.
+    """
+
+    def __init__(self):
+        self.records: Dict[str, Union[StoredRecord, ColdRecord]] = {}
+        self._keys: List[str] = []
+        self.indexes: Dict[str, Any] = {}
+        self._payload_bytes = 0
+        self._key_bytes = 0
+        self._cold_records = 0
+        self._cold_bytes = 0
+        self._hand = 0
+
+        self._expiry: Dict[str, int] = {}
+        self._expiry_heap: List[Tuple[int, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __contains__(self, primary_key: str) -> bool:
+        return primary_key in self.records and not self.is_expired(primary_key)
+
+    @property
+    def hot_bytes(self) -> int:
+        return self._payload_bytes
+
+    def expires_at(self, primary_key: str) -> Optional[int]:
+        return self._expiry.get(primary_key)
+
+    def is_expired(self, primary_key: str, now: Optional[int] = None) -> bool:
+        expires_at = self._expiry.get(primary_key)
+        return expires_at is not None and expires_at <= (now or time.time_ns())
+
+    def get(self, primary_key: str) -> Optional[StoredRecord]:
+        record = self.records.get(primary_key)
+        if record is None or (self._expiry and self.is_expired(primary_key)):
+            return None
+        if type(record) is ColdRecord:
+            return self._promote(primary_key, record)
+        record.touched = True
+        return record
+
+    def put(
+            self, primary_key: str, value: Any, timestamp: int, expires_at: Optional[int] = None, encoded: bool = False
+    ):
+        previous = self._store(primary_key, value, timestamp, expires_at, encoded)
+        if previous is None:
+            insort(self._keys, primary_key)
+
+    def put_many(self, items: List[Tuple[str, Any, int, Optional[int]]], encoded: bool = False):
+        """
+        New keys are merged into the sorted key list in one pass instead of one insertion each.
+        """
+        if len(items) < _BULK_THRESHOLD:
+            for primary_key, value, timestamp, expires_at in items:
+                self.put(primary_key, value, timestamp, expires_at, encoded)
+            return
+
+        new_keys = []
+        for primary_key, value, timestamp, expires_at in items:
+            if self._store(primary_key, value, timestamp, expires_at, encoded) is None:
+                new_keys.append(primary_key)
+
+        if new_keys:
+            self._keys.extend(new_keys)
+            self._keys.sort()
+
+    def delete_many(self, primary_keys: List[str]) -> int:
+        if len(primary_keys) < _BULK_THRESHOLD:
+            return sum(1 for primary_key in primary_keys if self.delete(primary_key))
+
+        removed = {primary_key for primary_key in primary_keys if self._discard(primary_key)}
+        if removed:
+            self._keys = [key for key in self._keys if key not in removed]
+        return len(removed)
+
+    def delete(self, primary_key: str) -> bool:
+        if not self._discard(primary_key):
+            return False
+        del self._keys[bisect_left(self._keys, primary_key)]
+        return True
+
+    def pop_expired(self, now: int, limit: int) -> List[str]:
+        """
+        The records are left in place for the caller to delete.
+        """
+        expired = []
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now and len(expired) < limit:
+            expires_at, primary_key = heapq.heappop(heap)
+            if self._expiry.get(primary_key) == expires_at:
+                expired.append(primary_key)
+        return expired
+
+    def export_page(self, after: Optional[str], limit: int) -> List[List[Any]]:
+        return [
+            [primary_key, record.payload, record.timestamp, self._expiry.get(primary_key)]
+            for primary_key, record in self.scan(after=after, limit=limit)
+        ]
+
+    def memory_usage(self) -> Dict[str, int]:
+        overhead = len(self.records) * _RECORD_OVERHEAD + sys.getsizeof(self.records) + sys.getsizeof(self._keys)
+        if self._expiry:
+            overhead += (
+                    sys.getsizeof(self._expiry) + sys.getsizeof(self._expiry_heap)
+                    + len(self._expiry_heap) * _EXPIRY_ENTRY_OVERHEAD
+            )
+        return {
+            "records": len(self.records),
+            "payload_bytes": self._payload_bytes,
+            "key_bytes": self._key_bytes,
+            "overhead_bytes": overhead,
+            "total_bytes": self._payload_bytes + self._key_bytes + overhead,
+            "cold_records": self._cold_records,
+            "cold_bytes": self._cold_bytes
+        }
+
+    def spill(self, cold_store: "ColdStore", max_bytes: int) -> int:
+        """
+        Second-chance CLOCK sweep: records read since the hand last passed them get another round.
+        """
+        freed = 0
+        visited = 0
+        while freed < max_bytes and visited < 2 * len(self._keys):
+            if self._hand >= len(self._keys):
+                self._hand = 0
+            primary_key = self._keys[self._hand]
+            self._hand += 1
+            visited += 1
+
+            record = self.records[primary_key]
+            if type(record) is not StoredRecord or len(record.payload) < _MIN_SPILL_BYTES:
+                continue
+            if record.touched:
+                record.touched = False
+                continue
+
+            segment, offset = cold_store.write(record.payload)
+            self.records[primary_key] = ColdRecord(segment, offset, len(record.payload), record.timestamp)
+            self._payload_bytes -= len(record.payload)
+            self._cold_bytes += len(record.payload)
+            self._cold_records += 1
+            freed += len(record.payload)
+        return freed
+
+    def relocate(self, segments: Set["ColdSegment"], cold_store: "ColdStore") -> int:
+        moved = 0
+        for record in self.records.values():
+            if type(record) is ColdRecord and record.segment in segments:
+                payload = record.payload
+                record.segment.release(record.length)
+                record.segment, record.offset = cold_store.write(payload)
+                moved += 1
+        return moved
+
+    def _promote(self, primary_key: str, record: ColdRecord) -> StoredRecord:
+        promoted = StoredRecord(record.payload, record.timestamp)
+        self.records[primary_key] = promoted
+        self._forget(record)
+        self._payload_bytes += record.length
+        return promoted
+
+    def _forget(self, record: Union[StoredRecord, ColdRecord]):
+        if type(record) is ColdRecord:
+            record.segment.release(record.length)
+            self._cold_bytes -= record.length
+            self._cold_records -= 1
+        else:
+            self._payload_bytes -= len(record.payload)
+
+    def _store(
+            self, primary_key: str, value: Any, timestamp: int, expires_at: Optional[int] = None, encoded: bool = False
+    ) -> Optional[Union[StoredRecord, ColdRecord]]:
+        """
+        Replaces the record without touching the sorted key list; returns the previous one.
+        """
+        record = StoredRecord(value if encoded else encode_value(value), timestamp)
+        previous = self.records.get(primary_key)
+        self.records[primary_key] = record
+        self._payload_bytes += len(record.payload)
+        self._set_expiry(primary_key, expires_at)
+
+        if self.indexes:
+            previous_value = previous.value if previous is not None else None
+            if encoded:
+                value = record.value
+            for index in self.indexes.values():
+                if previous is not None:
+                    index.remove(primary_key, previous_value)
+                index.add(primary_key, value)
+
+        if previous is None:
+            self._key_bytes += sys.getsizeof(primary_key)
+        else:
+            self._forget(previous)
+        return previous
+
+    def _discard(self, primary_key: str) -> bool:
+        previous = self.records.pop(primary_key, None)
+        if previous is None:
+            return False
+        self._expiry.pop(primary_key, None)
+
+        if self.indexes:
+            previous_value = previous.value
+            for index in self.indexes.values():
+                index.remove(primary_key, previous_value)
+
+        self._key_bytes -= sys.getsizeof(primary_key)
+        self._forget(previous)
+        return True
+
+    def _set_expiry(self, primary_key: str, expires_at: Optional[int]):
+        if expires_at is None:
+            self._expiry.pop(primary_key, None)
+            return
+        self._expiry[primary_key] = expires_at
+        heapq.heappush(self._expiry_heap, (expires_at, primary_key))
+        if len(self._expiry_heap) > 2 * len(self._expiry) + 1024:
+            self._expiry_heap = [(expiry, key) for key, expiry in self._expiry.items()]
+            heapq.heapify(self._expiry_heap)
+
+    def set_indexes(self, definitions: Dict[str, str]) -> List[str]:
+        built = []
+        for field in list(self.indexes):
+            if definitions.get(field) != self.indexes[field].kind:
+                del self.indexes[field]
+
+        for field, kind in definitions.items():
+            if field in self.indexes:
+                continue
+            index = _INDEX_TYPES[kind](field)
+            for primary_key, record in self.records.items():
+                index.add(primary_key, record.value)
+            self.indexes[field] = index
+            built.append(field)
+        return built
+
+    def scan(
+            self,
+            start: Optional[str] = None,
+            end: Optional[str] = None,
+            prefix: Optional[str] = None,
+            after: Optional[str] = None,
+            limit: Optional[int] = None
+    ) -> Iterator[Tuple[str, Union[StoredRecord, ColdRecord]]]:
+        lower = max(filter(None, (start, prefix)), default=None)
+        if after is not None and (lower is None or after >= lower):
+            position = bisect_right(self._keys, after)
+        else:
+            position = bisect_left(self._keys, lower) if lower is not None else 0
+
+        now = time.time_ns()
+        emitted = 0
+        while position < len(self._keys) and (limit is None or emitted < limit):
+            key = self._keys[position]
+            position += 1
+            if end is not None and key >= end:
+                return
+            if prefix is not None and not key.startswith(prefix):
+                return
+            if self._expiry and self.is_expired(key, now):
+                continue
+            yield key, self.records[key]
+            emitted += 1
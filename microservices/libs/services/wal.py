@@ -0,0 +1,339 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+import zlib
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+import msgpack
+
+_RECORD_HEADER = struct.Struct(">II")
+_SEGMENT_PREFIX = "wal-"
+_SEGMENT_SUFFIX = ".log"
+_SNAPSHOT_FILE = "snapshot.bin"
+_DISCARDED_SUFFIX = ".discarded"
+_ROLL = object()
+
+_Pending = Tuple[bytes, Optional[Callable[[], None]]]
+
+
+def _frame(item: Any) -> bytes:
+    payload = msgpack.packb(item, use_bin_type=True)
+    return _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _read_frame(f: BinaryIO) -> Tuple[bool, Any]:
+    header = f.read(_RECORD_HEADER.size)
+    if not header:
+        return False, None
+    if len(header) < _RECORD_HEADER.size:
+        raise ValueError(f"truncated frame header in '{f.name}'")
+    length, checksum = _RECORD_HEADER.unpack(header)
+    payload = f.read(length)
+    if len(payload) < length or zlib.crc32(payload) != checksum:
+        raise ValueError(f"corrupt frame in '{f.name}'")
+    return True, msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+
+class WriteAheadLogBroken(Exception):
+    pass
+
+
+class WriteAheadLog:
+    """
+    Segmented, group-fsynced log; a group that fails to write is cut off again and its entries undone.
+    """
+
+    def __init__(self, directory: str, logger: logging.Logger, fsync_interval: float = 0.005):
+        self.directory = directory
+        self.logger = logger
+        self.fsync_interval = fsync_interval
+
+        self.last_lsn = 0
+        self.snapshot_lsn = 0
+        self._flushed_lsn = 0
+        self._buffer: List[Any] = []
+        self._file = None
+        self._error: Optional[Exception] = None
+        self._lost: List[Tuple[int, int, Exception]] = []
+        self.lost_groups = 0
+        self._closing = False
+        self._pending = asyncio.Event()
+        self._durable = asyncio.Condition()
+        self._flush_lock = asyncio.Lock()
+        self._snapshot_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def entries_since_snapshot(self) -> int:
+        return self.last_lsn - self.snapshot_lsn
+
+    def recover(self) -> Tuple[Optional[Dict[str, Any]], Iterator[Any], List[Dict[str, Any]]]:
+        """
+        Returns the snapshot state, a lazy iterator over its pages and the entries after it.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+
+        state = None
+        pages: Iterator[Any] = iter(())
+        snapshot_path = os.path.join(self.directory, _SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "rb") as f:
+                _, snapshot = _read_frame(f)
+            self.snapshot_lsn = snapshot["lsn"]
+            state = snapshot["state"]
+            pages = self._read_snapshot_pages(snapshot_path)
+
+        self.last_lsn = self.snapshot_lsn
+        tail: List[Dict[str, Any]] = []
+        segments = self._list_segments()
+        for position, (start_lsn, path) in enumerate(segments):
+            records, complete = self._read_segment(path)
+            for lsn, entry in records:
+                if lsn <= self.snapshot_lsn:
+                    continue
+                tail.append(entry)
+                self.last_lsn = lsn
+            if not complete:
+                # Replaying past a torn record would leave a hole in the history.
+                self._discard_segments(segments[position + 1:])
+                break
+
+        self._flushed_lsn = self.last_lsn
+        self.logger.info(
+            f"WAL recovered from '{self.directory}': snapshot LSN {self.snapshot_lsn}, "
+            f"{len(tail)} tail entries, last LSN {self.last_lsn}"
+        )
+        return state, pages, tail
+
+    async def start(self):
+        self._open_segment(self.last_lsn + 1)
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        self._closing = True
+        self._pending.set()
+        if self._flush_task:
+            await self._flush_task
+        if self._buffer:
+            await self._flush()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def append(self, entry: Dict[str, Any], undo: Optional[Callable[[], None]] = None) -> int:
+        if self._error is not None:
+            raise RuntimeError(f"WAL is unavailable: {self._error}")
+        self.last_lsn += 1
+        payload = json.dumps({"lsn": self.last_lsn, "entry": entry}).encode("utf-8")
+        self._buffer.append((_RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload, undo))
+        self._pending.set()
+        return self.last_lsn
+
+    async def wait_durable(self, lsn: int):
+        await self._wait_flushed(lsn)
+        for first, last, error in self._lost:
+            if first <= lsn <= last:
+                raise RuntimeError(f"WAL write failed: {error}")
+
+    async def _wait_flushed(self, lsn: int):
+        async with self._durable:
+            await self._durable.wait_for(lambda: self._flushed_lsn >= lsn or self._error is not None)
+        if self._flushed_lsn < lsn:
+            raise RuntimeError(f"WAL write failed: {self._error}")
+
+    async def write_snapshot(self, state: Dict[str, Any], pages: AsyncIterator[Any]):
+        """
+        `state` must be captured right before the call; the pages may be read while writes go on.
+        """
+        async with self._snapshot_lock:
+            lsn = self.last_lsn
+            lost_groups = self.lost_groups
+            self._buffer.append(_ROLL)
+            await self._flush()
+            await self._wait_flushed(lsn)
+
+            path = os.path.join(self.directory, _SNAPSHOT_FILE)
+            tmp_path = f"{path}.tmp"
+            f = await asyncio.to_thread(open, tmp_path, "wb")
+            try:
+                await asyncio.to_thread(f.write, _frame({"lsn": lsn, "state": state}))
+                async for page in pages:
+                    await asyncio.to_thread(f.write, _frame(page))
+                # The pages may hold writes logged after `lsn`, which must not be lost.
+                end_lsn = self.last_lsn
+                await self._flush()
+                await self._wait_flushed(end_lsn)
+                if self.lost_groups != lost_groups:
+                    raise RuntimeError("WAL writes were lost while the snapshot was taken")
+                await asyncio.to_thread(self._finish_snapshot_file, f, tmp_path, path)
+            except BaseException:
+                f.close()
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        self.snapshot_lsn = lsn
+        removed = await asyncio.to_thread(self._drop_segments_before, lsn + 1)
+        self.logger.info(f"WAL snapshot written at LSN {lsn}, removed {removed} old segment(s)")
+
+    async def _flush_loop(self):
+        while not self._closing:
+            await self._pending.wait()
+            if not self._closing:
+                await asyncio.sleep(self.fsync_interval)
+            self._pending.clear()
+            await self._flush()
+
+    async def _flush(self):
+        async with self._flush_lock:
+            batch, self._buffer = self._buffer, []
+            group: List[_Pending] = []
+            for item in batch:
+                if item is _ROLL:
+                    await self._write_group(group, roll=True)
+                    group = []
+                else:
+                    group.append(item)
+            if group:
+                await self._write_group(group, roll=False)
+
+        async with self._durable:
+            self._durable.notify_all()
+
+    async def _write_group(self, group: List[_Pending], roll: bool):
+        first = self._flushed_lsn + 1
+        last = self._flushed_lsn + len(group)
+        if self._error is None:
+            try:
+                await asyncio.to_thread(self._write_batch, [record for record, _ in group], roll, last + 1)
+            except WriteAheadLogBroken as e:
+                self.logger.critical(f"WAL is broken, refusing further writes: {e}")
+                self._error = e
+            except Exception as e:
+                self.logger.error(f"WAL flush of LSNs {first}-{last} failed: {e}")
+                self._lose(first, last, group, e)
+            self._flushed_lsn = last
+        if self._error is not None:
+            self._lose(first, last, group, self._error)
+
+    def _lose(self, first: int, last: int, group: List[_Pending], error: Exception):
+        if not group:
+            return
+        self.lost_groups += 1
+        self._lost = self._lost[-63:] + [(first, last, error)]
+        for _, undo in reversed(group):
+            if undo is None:
+                continue
+            try:
+                undo()
+            except Exception as e:
+                self.logger.error(f"Failed to undo a lost WAL entry: {e}")
+
+    def _write_batch(self, records: List[bytes], roll: bool, next_lsn: int):
+        position = self._file.tell()
+        try:
+            for record in records:
+                self._file.write(record)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception:
+            # After a failed fsync the written pages cannot be trusted.
+            self._truncate(position)
+            raise
+        if roll:
+            self._file.close()
+            self._open_segment(next_lsn)
+
+    def _truncate(self, position: int):
+        path = self._file.name
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        try:
+            os.truncate(path, position)
+            self._file = open(path, "ab")
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            raise WriteAheadLogBroken(f"could not truncate '{path}' to {position} bytes: {e}") from e
+
+    def _open_segment(self, start_lsn: int):
+        path = os.path.join(self.directory, f"{_SEGMENT_PREFIX}{start_lsn:020d}{_SEGMENT_SUFFIX}")
+        self._file = open(path, "ab")
+
+    def _list_segments(self) -> List[Tuple[int, str]]:
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX):
+                start_lsn = int(name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)])
+                segments.append((start_lsn, os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    def _read_segment(self, path: str) -> Tuple[List[Tuple[int, Dict[str, Any]]], bool]:
+        """
+        A torn record is truncated away together with everything after it.
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+
+        records = []
+        position = 0
+        while position < len(data):
+            if position + _RECORD_HEADER.size > len(data):
+                break
+            length, checksum = _RECORD_HEADER.unpack_from(data, position)
+            start = position + _RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            record = json.loads(payload)
+            records.append((record["lsn"], record["entry"]))
+            position = start + length
+        else:
+            return records, True
+
+        self.logger.warning(f"Torn WAL record in '{path}' at byte {position}, truncating")
+        os.truncate(path, position)
+        return records, False
+
+    def _discard_segments(self, segments: List[Tuple[int, str]]):
+        for start_lsn, path in segments:
+            os.replace(path, f"{path}{_DISCARDED_SUFFIX}")
+        if segments:
+            self.logger.warning(
+                f"Stopped WAL replay at a torn record, set aside {len(segments)} later segment(s) "
+                f"as '*{_DISCARDED_SUFFIX}'"
+            )
+
+    @staticmethod
+    def _read_snapshot_pages(path: str) -> Iterator[Any]:
+        with open(path, "rb") as f:
+            _read_frame(f)
+            while True:
+                found, page = _read_frame(f)
+                if not found:
+                    return
+                yield page
+
+    def _finish_snapshot_file(self, f: BinaryIO, tmp_path: str, path: str):
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        os.replace(tmp_path, path)
+
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def _drop_segments_before(self, lsn: int) -> int:
+        segments = self._list_segments()
+        removed = 0
+        for index, (start_lsn, path) in enumerate(segments):
+            next_start = segments[index + 1][0] if index + 1 < len(segments) else None
+            if next_start is not None and next_start <= lsn:
+                os.remove(path)
+                removed += 1
+        return removed
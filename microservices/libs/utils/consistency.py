@@ -0,0 +1,78 @@
+import contextvars
+from typing import Callable, Optional
+
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+READ_AFTER_HEADER = "X-Read-After"
+MAX_STALENESS_HEADER = "X-Max-Staleness-Ms"
+WRITE_TIMESTAMP_HEADER = "X-Write-Timestamp"
+APPLIED_TIMESTAMP_HEADER = "X-Applied-Timestamp"
+LEADER_EPOCH_HEADER = "X-Leader-Epoch"
+
+_READ_METHODS = {"GET", "HEAD"}
+
+
+class ReadConsistency:
+    """
+    `min_timestamp` is the read-your-writes token returned in X-Write-Timestamp.
+    """
+
+    def __init__(self, min_timestamp: Optional[int] = None, max_staleness_ns: Optional[int] = None):
+        self.min_timestamp = min_timestamp
+        self.max_staleness_ns = max_staleness_ns
+        self.write_timestamp = 0
+
+    @property
+    def is_relaxed(self) -> bool:
+        return self.min_timestamp is None and self.max_staleness_ns is None
+
+    def note_write(self, timestamp: int):
+        self.write_timestamp = max(self.write_timestamp, timestamp)
+
+
+consistency_var: contextvars.ContextVar[Optional[ReadConsistency]] = contextvars.ContextVar(
+    "read_consistency", default=None
+)
+
+
+def _int_header(request: Request, name: str) -> Optional[int]:
+    value = request.headers.get(name)
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+class ConsistencyMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        max_staleness_ms = _int_header(request, MAX_STALENESS_HEADER)
+        consistency = ReadConsistency(
+            min_timestamp=_int_header(request, READ_AFTER_HEADER),
+            max_staleness_ns=max_staleness_ms * 1_000_000 if max_staleness_ms is not None else None
+        )
+        consistency_var.set(consistency)
+
+        response = await call_next(request)
+
+        if consistency.write_timestamp:
+            response.headers[WRITE_TIMESTAMP_HEADER] = str(consistency.write_timestamp)
+        return response
+
+
+class AppliedTimestampMiddleware(BaseHTTPMiddleware):
+    """
+    Reads are stamped with the timestamp taken before they ran, writes with the one after.
+    """
+
+    def __init__(self, app, get_timestamp: Callable[[], int]):
+        super().__init__(app)
+        self.get_timestamp = get_timestamp
+
+    async def dispatch(self, request: Request, call_next):
+        applied_timestamp = self.get_timestamp()
+        response = await call_next(request)
+        if request.method not in _READ_METHODS:
+            applied_timestamp = self.get_timestamp()
+        response.headers[APPLIED_TIMESTAMP_HEADER] = str(applied_timestamp)
+        return response
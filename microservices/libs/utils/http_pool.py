@@ -0,0 +1,143 @@
+import logging
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from prometheus_client import Counter, Gauge, Histogram
+
+HOP_BY_HOP_HEADERS = frozenset({
+    "connection", "keep-alive", "proxy-connection", "te", "trailer", "transfer-encoding", "upgrade"
+})
+
+POOL_IN_USE = Gauge(
+    'http_pool_connections_in_use', 'Requests currently holding a pooled connection', ['pool', 'upstream']
+)
+POOL_WAIT = Histogram(
+    'http_pool_wait_seconds', 'Time spent waiting for a pooled connection', ['pool', 'upstream'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+POOL_REQUESTS = Counter(
+    'http_pool_requests_total', 'Requests sent through the pool by connection reuse', ['pool', 'upstream', 'connection']
+)
+
+
+class _RequestTracer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.acquired: Optional[float] = None
+        self.new_connection = False
+
+    async def __call__(self, event_name: str, info: Dict[str, Any]):
+        if self.acquired is None and (
+                event_name.startswith("connection.") or event_name.endswith("send_request_headers.started")
+        ):
+            self.acquired = time.perf_counter()
+        if event_name == "connection.connect_tcp.started":
+            self.new_connection = True
+
+
+class HttpClientPool:
+    def __init__(
+            self,
+            name: str,
+            logger: logging.Logger,
+            max_connections: int = 100,
+            max_keepalive_connections: int = 20,
+            keepalive_expiry: float = 30.0,
+            connect_timeout: float = 2.0,
+            timeout: float = 10.0,
+            http2: bool = False
+    ):
+        self.name = name
+        self.logger = logger
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._closed = True
+
+    async def start(self):
+        self._closed = False
+        self.logger.info(f"HTTP pool '{self.name}' started (HTTP/2: {self.http2}, limits: {self.limits})")
+
+    async def stop(self):
+        self._closed = True
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+        self.logger.info(f"HTTP pool '{self.name}' closed {len(clients)} upstream client(s)")
+
+    def get_client(self, url: str) -> httpx.AsyncClient:
+        if self._closed:
+            raise RuntimeError(f"HTTP pool '{self.name}' is not running")
+
+        upstream = self._origin(url)
+        client = self._clients.get(upstream)
+        if client is None:
+            client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, http2=self.http2)
+            self._clients[upstream] = client
+            self._stats[upstream] = {"in_use": 0, "requests": 0, "reused": 0, "wait_seconds": 0.0}
+        return client
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        client = self.get_client(url)
+        request = client.build_request(method, url, **kwargs)
+        return await self.send(client, request)
+
+    async def send(self, client: httpx.AsyncClient, request: httpx.Request, stream: bool = False) -> httpx.Response:
+        """
+        Streamed responses keep their connection until they are handed back with `close`.
+        """
+        upstream = self._origin(str(request.url))
+        stats = self._stats[upstream]
+        tracer = _RequestTracer()
+        request.extensions["trace"] = tracer
+
+        stats["in_use"] += 1
+        POOL_IN_USE.labels(self.name, upstream).inc()
+        released = True
+        try:
+            response = await client.send(request, stream=stream)
+            released = not stream
+            return response
+        finally:
+            if released:
+                self._release(upstream)
+
+            wait = (tracer.acquired or time.perf_counter()) - tracer.started
+            connection = "new" if tracer.new_connection else "reused"
+            stats["requests"] += 1
+            stats["reused"] += 0 if tracer.new_connection else 1
+            stats["wait_seconds"] += wait
+            POOL_WAIT.labels(self.name, upstream).observe(wait)
+            POOL_REQUESTS.labels(self.name, upstream, connection).inc()
+
+    async def close(self, response: httpx.Response):
+        await response.aclose()
+        self._release(self._origin(str(response.request.url)))
+
+    def _release(self, upstream: str):
+        self._stats[upstream]["in_use"] -= 1
+        POOL_IN_USE.labels(self.name, upstream).dec()
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            upstream: {
+                "in_use": stats["in_use"],
+                "requests": stats["requests"],
+                "reuse_ratio": stats["reused"] / stats["requests"] if stats["requests"] else 0.0,
+                "avg_wait_ms": 1000 * stats["wait_seconds"] / stats["requests"] if stats["requests"] else 0.0
+            }
+            for upstream, stats in self._stats.items()
+        }
+
+    @staticmethod
+    def _origin(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
@@ -0,0 +1,68 @@
+import logging
+from typing import Dict, Optional
+
+from aiokafka.admin import AIOKafkaAdminClient, NewTopic
+from aiokafka.admin.config_resource import ConfigResource, ConfigResourceType
+from aiokafka.protocol.admin import DeleteGroupsRequest
+
+_TOPIC_ALREADY_EXISTS = 36
+_GROUP_ID_NOT_FOUND = 69
+
+
+async def ensure_topic(
+        kafka_broker_url: str,
+        topic: str,
+        logger: logging.Logger,
+        partitions: int = 1,
+        replication_factor: int = 1,
+        configs: Optional[Dict[str, str]] = None,
+        enforce_configs: bool = False
+):
+    """
+    An existing topic is left as it is, unless `enforce_configs` replaces its configuration.
+    """
+    admin = AIOKafkaAdminClient(bootstrap_servers=kafka_broker_url)
+    await admin.start()
+    try:
+        response = await admin.create_topics([
+            NewTopic(
+                topic,
+                num_partitions=partitions,
+                replication_factor=replication_factor,
+                topic_configs=configs or {}
+            )
+        ])
+        for name, error_code, *_ in response.topic_errors:
+            if error_code == 0:
+                logger.info(f"Created topic '{name}' with {partitions} partition(s) {configs or {}}")
+            elif error_code != _TOPIC_ALREADY_EXISTS:
+                logger.error(f"Failed to create topic '{name}': error code {error_code}")
+            elif enforce_configs and configs:
+                await _alter_configs(admin, name, configs, logger)
+    finally:
+        await admin.close()
+
+
+async def _alter_configs(admin: AIOKafkaAdminClient, topic: str, configs: Dict[str, str], logger: logging.Logger):
+    for response in await admin.alter_configs([ConfigResource(ConfigResourceType.TOPIC, topic, configs=configs)]):
+        for error_code, error_message, *_ in response.resources:
+            if error_code != 0:
+                logger.error(f"Failed to configure topic '{topic}': {error_message or f'error code {error_code}'}")
+
+
+async def delete_consumer_group(kafka_broker_url: str, group: str, logger: logging.Logger):
+    """
+    The broker refuses while the group still has members.
+    """
+    admin = AIOKafkaAdminClient(bootstrap_servers=kafka_broker_url)
+    await admin.start()
+    try:
+        coordinator = await admin.find_coordinator(group)
+        response = await admin._send_request(DeleteGroupsRequest([group]), coordinator)
+        for name, error_code in response.results:
+            if error_code == 0:
+                logger.info(f"Deleted consumer group '{name}'")
+            elif error_code != _GROUP_ID_NOT_FOUND:
+                logger.error(f"Failed to delete consumer group '{name}': error code {error_code}")
+    finally:
+        await admin.close()
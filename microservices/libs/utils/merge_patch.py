@@ -0,0 +1,44 @@
+from typing import Any, Dict, Optional
+
+
+def apply_merge_patch(target: Any, patch: Any) -> Any:
+    """
+    RFC 7396 JSON merge-patch; returns a new document.
+    """
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+def create_merge_patch(source: Dict[str, Any], target: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    None if there is none: merge-patch cannot set a member to `null`.
+    """
+    patch = {}
+    for key in source.keys() - target.keys():
+        patch[key] = None
+    for key, value in target.items():
+        if key in source and source[key] == value and type(source[key]) is type(value):
+            continue
+        if value is None:
+            return None
+        if isinstance(value, dict) and isinstance(source.get(key), dict):
+            nested = create_merge_patch(source[key], value)
+            if nested is None:
+                return None
+            patch[key] = nested
+        elif _has_null_members(value):
+            return None
+        else:
+            patch[key] = value
+    return patch
+
+
+def _has_null_members(value: Any) -> bool:
+    return isinstance(value, dict) and any(member is None or _has_null_members(member) for member in value.values())
@@ -0,0 +1,159 @@
+import json
+from typing import Any, Dict, List, Literal, NamedTuple, Optional, Tuple
+
+import msgpack
+from aiokafka.partitioner import murmur2
+
+from microservices.libs.schemas.shard import ReplicationMessage
+
+WireFormat = Literal["binary", "json"]
+
+# Binary frames start with a magic byte that can never open a JSON document, then the layout version.
+_MAGIC = 0xA7
+WIRE_VERSION = 3
+
+# On compacted topics a delete is a tombstone, its timestamp and epoch travelling in the headers.
+_KEY_SEPARATOR = "::"
+
+# Decoded, a patch's value is `(base_timestamp, merge_patch)`.
+_OPERATION_CODES = {"create": 0, "delete": 1, "patch": 2}
+_OPERATION_NAMES = {code: name for name, code in _OPERATION_CODES.items()}
+_PATCH_CODE = _OPERATION_CODES["patch"]
+
+Operation = Tuple[str, str, int, Any, Optional[int]]
+
+
+class ReplicationUpdate(NamedTuple):
+    """
+    Records are `(operation, primary_key, timestamp, value, expires_at)` tuples.
+    """
+    table_name: str
+    timestamp: int
+    epoch: int
+    operations: List[Operation]
+    is_batch: bool
+
+    @property
+    def target(self) -> str:
+        if self.is_batch:
+            return f"{self.table_name}/[{len(self.operations)} records]"
+        return f"{self.table_name}/{self.operations[0][1]}"
+
+
+def encode_message(msg: ReplicationMessage, wire_format: WireFormat = "binary") -> bytes:
+    if wire_format == "binary":
+        operations = msg.batch if msg.operation == "batch" else [msg]
+        frame = [
+            msg.table_name,
+            msg.timestamp,
+            msg.epoch,
+            msg.operation == "batch",
+            [
+                [
+                    _OPERATION_CODES[operation.operation],
+                    operation.primary_key,
+                    operation.timestamp,
+                    _encoded_value(operation),
+                    operation.expires_at
+                ]
+                for operation in operations
+            ]
+        ]
+        try:
+            return bytes((_MAGIC, WIRE_VERSION)) + msgpack.packb(frame, use_bin_type=True)
+        except (OverflowError, TypeError):
+            # Values msgpack cannot represent (e.g. integers beyond 64 bits) stay on JSON.
+            pass
+    return json.dumps(msg.model_dump()).encode("utf-8")
+
+
+def _encoded_value(operation: ReplicationMessage) -> Any:
+    value = operation.value.get("value") if operation.value else None
+    return [operation.base_timestamp, value] if operation.operation == "patch" else value
+
+
+def _decoded_value(name: str, value: Any, base_timestamp: Optional[int] = None) -> Any:
+    return (base_timestamp, value) if name == "patch" else value
+
+
+def record_key(table_name: str, primary_key: str) -> bytes:
+    return f"{table_name}{_KEY_SEPARATOR}{primary_key}".encode("utf-8")
+
+
+def partition_for_key(table_name: str, primary_key: str, partitions: int) -> int:
+    """
+    Partition of the record's key, as Kafka's default partitioner would pick it.
+    """
+    return (murmur2(record_key(table_name, primary_key)) & 0x7FFFFFFF) % partitions
+
+
+def tombstone_headers(msg: ReplicationMessage) -> List[Tuple[str, bytes]]:
+    return [("timestamp", str(msg.timestamp).encode()), ("epoch", str(msg.epoch).encode())]
+
+
+def decode_record(key: Optional[bytes], value: Optional[bytes], headers: Any = ()) -> ReplicationUpdate:
+    """
+    Decodes a replication topic record, reading a tombstone as a delete of its key.
+    """
+    if value is not None:
+        return decode_update(value)
+    table_name, _, primary_key = key.decode("utf-8").partition(_KEY_SEPARATOR)
+    fields = {name: int(data) for name, data in headers or ()}
+    timestamp = fields["timestamp"]
+    return ReplicationUpdate(
+        table_name, timestamp, fields.get("epoch", 0), [("delete", primary_key, timestamp, None, None)], False
+    )
+
+
+def decode_update(payload: bytes) -> ReplicationUpdate:
+    if payload and payload[0] == _MAGIC:
+        version = payload[1]
+        if version not in (1, 2, WIRE_VERSION):
+            raise ValueError(f"Unsupported replication wire format version {version}")
+        table_name, timestamp, epoch, is_batch, operations = msgpack.unpackb(payload[2:], raw=False)
+        if version == 1:
+            operations = [
+                (_OPERATION_NAMES[code], primary_key, ts, _decoded_value(_OPERATION_NAMES[code], value), None)
+                for code, primary_key, ts, value in operations
+            ]
+        elif version == 2:
+            operations = [
+                (_OPERATION_NAMES[code], primary_key, ts, _decoded_value(_OPERATION_NAMES[code], value), expires_at)
+                for code, primary_key, ts, value, expires_at in operations
+            ]
+        else:
+            operations = [
+                (_OPERATION_NAMES[code], primary_key, ts, tuple(value) if code == _PATCH_CODE else value, expires_at)
+                for code, primary_key, ts, value, expires_at in operations
+            ]
+        return ReplicationUpdate(table_name, timestamp, epoch, operations, is_batch)
+    return update_from_dict(json.loads(payload))
+
+
+def update_from_dict(data: Dict[str, Any]) -> ReplicationUpdate:
+    """
+    Reads the JSON layout of `ReplicationMessage` (legacy topic messages and WAL entries).
+    """
+    is_batch = data["operation"] == "batch"
+    operations = data["batch"] if is_batch else [data]
+    return ReplicationUpdate(
+        data["table_name"],
+        data["timestamp"],
+        data.get("epoch", 0),
+        [
+            (
+                operation["operation"],
+                operation["primary_key"],
+                operation["timestamp"],
+                _decoded_value(
+                    operation["operation"],
+                    operation["value"].get("value") if operation.get("value") else None,
+                    operation.get("base_timestamp")
+                ),
+                operation.get("expires_at")
+            )
+            for operation in operations
+        ],
+        is_batch
+    )
+
@@ -12,9 +12,24 @@ async def register_shard(
         payload: ShardRegistration,
         service: CoordinatorService = Depends(get_coordinator_service)
 ):
-    await service.register_shard_node(
+    assignment = await service.register_shard_node(
         group_id=payload.group_id,
         shard_url=str(payload.shard_url),
-        is_leader=payload.is_leader
+        is_leader=payload.is_leader,
+        epoch=payload.epoch,
+        replication_topic=payload.replication_topic,
+        weight=payload.weight
     )
-    return {"status": "registered"}
+    return {
+        "status": "registered",
+        **assignment,
+        "tables": [table.model_dump() for table in service.get_all_tables()]
+    }
+
+
+@router.get("/groups/{group_id}", status_code=200)
+async def get_shard_group(
+        group_id: str,
+        service: CoordinatorService = Depends(get_coordinator_service)
+):
+    return service.get_group(group_id)
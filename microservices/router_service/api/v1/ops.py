@@ -15,3 +15,40 @@ async def get_health_report(
         "status": "active",
         "details": status
     }
+
+
+@router.get("/pool-stats")
+async def get_pool_stats(
+        service: CoordinatorService = Depends(get_coordinator_service)
+):
+    return service.get_pool_stats()
+
+
+@router.get("/read-balancer")
+async def get_read_balancer_stats(
+        service: CoordinatorService = Depends(get_coordinator_service)
+):
+    return service.get_read_balancer_stats()
+
+
+@router.get("/record-cache")
+async def get_record_cache_stats(
+        service: CoordinatorService = Depends(get_coordinator_service)
+):
+    return service.get_record_cache_stats()
+
+
+@router.get("/rebalance")
+async def get_rebalance_status(
+        service: CoordinatorService = Depends(get_coordinator_service)
+):
+    return service.get_rebalance_status()
+
+
+@router.delete("/shard-groups/{group_id}", status_code=202)
+async def drain_shard_group(
+        group_id: str,
+        service: CoordinatorService = Depends(get_coordinator_service)
+):
+    await service.remove_shard_group(group_id)
+    return {"status": "draining", "group_id": group_id}
@@ -1,6 +1,17 @@
-from fastapi import APIRouter, Request, Depends
+from typing import Any, Dict, Optional
 
-from microservices.libs.schemas.router import RecordResponse, CreateRecordRequest
+from fastapi import APIRouter, Body, Request, Depends, Query
+from fastapi.responses import StreamingResponse
+
+from microservices.libs.schemas.router import (
+    BatchCreateRequest,
+    BatchKeysRequest,
+    BatchResponse,
+    CreateRecordRequest,
+    RecordResponse,
+    UpdateRecordRequest
+)
+from microservices.libs.schemas.shard import IndexLookupResult, IndexQuery
 from microservices.libs.services.coordinator import CoordinatorService
 from microservices.router_service.dependencies import get_coordinator_service
 
@@ -12,7 +23,58 @@ async def create_record(
         record: CreateRecordRequest,
         service: CoordinatorService = Depends(get_coordinator_service)
 ):
-    return await service.create_record_on_shard(record.table_name, record.value)
+    return await service.create_record_on_shard(record)
+
+
+@router.post("/{table_name}/batch/put", response_model=BatchResponse, summary="Create multiple records")
+async def create_records(
+        table_name: str,
+        payload: BatchCreateRequest,
+        service: CoordinatorService = Depends(get_coordinator_service)
+):
+    return await service.create_records_on_shards(table_name, payload.values, payload.ttl_seconds)
+
+
+@router.post("/{table_name}/batch/get", response_model=BatchResponse, summary="Read multiple records")
+async def read_records(
+        table_name: str,
+        payload: BatchKeysRequest,
+        service: CoordinatorService = Depends(get_coordinator_service)
+):
+    return await service.read_records_from_shards(table_name, payload.primary_keys)
+
+
+@router.post("/{table_name}/batch/delete", response_model=BatchResponse, summary="Delete multiple records")
+async def delete_records(
+        table_name: str,
+        payload: BatchKeysRequest,
+        service: CoordinatorService = Depends(get_coordinator_service)
+):
+    return await service.delete_records_on_shards(table_name, payload.primary_keys)
+
+
+@router.get("/{table_name}", summary="Scan a table as NDJSON, ordered by primary key")
+async def scan_records(
+        table_name: str,
+        start: Optional[str] = Query(None, description="Inclusive lower bound of the key range"),
+        end: Optional[str] = Query(None, description="Exclusive upper bound of the key range"),
+        prefix: Optional[str] = Query(None, description="Only return keys with this prefix"),
+        cursor: Optional[str] = Query(None, description="Resume after this key (last key of the previous page)"),
+        limit: Optional[int] = Query(None, ge=1, description="Maximum number of records to return"),
+        service: CoordinatorService = Depends(get_coordinator_service)
+):
+    stream = await service.scan_table(table_name, start, end, prefix, cursor, limit)
+    return StreamingResponse(stream, media_type="application/x-ndjson")
+
+
+@router.post("/{table_name}/_index/{field}", response_model=IndexLookupResult, summary="Look up records by index")
+async def lookup_index(
+        table_name: str,
+        field: str,
+        query: IndexQuery,
+        service: CoordinatorService = Depends(get_coordinator_service)
+):
+    return await service.lookup_index(table_name, field, query)
 
 
 @router.get("/{table_name}/{primary_key}", response_model=RecordResponse, summary="Read a record")
@@ -25,11 +87,36 @@ async def read_record(
     return await service.forward_request_to_shard(table_name, primary_key, request)
 
 
+@router.post(
+    "/{table_name}/{primary_key}/update", response_model=RecordResponse, summary="Atomically update record fields"
+)
+async def update_record(
+        table_name: str,
+        primary_key: str,
+        update: UpdateRecordRequest,
+        service: CoordinatorService = Depends(get_coordinator_service)
+):
+    return await service.update_record_on_shard(table_name, primary_key, update)
+
+
+@router.patch("/{table_name}/{primary_key}", response_model=RecordResponse, summary="Apply a JSON merge-patch")
+async def patch_record(
+        table_name: str,
+        primary_key: str,
+        patch: Dict[str, Any] = Body(..., media_type="application/merge-patch+json"),
+        if_version: Optional[int] = Query(None, description="Only patch the record if it is at this version"),
+        service: CoordinatorService = Depends(get_coordinator_service)
+):
+    update = UpdateRecordRequest(patch=patch, if_version=if_version)
+    return await service.update_record_on_shard(table_name, primary_key, update)
+
+
 @router.delete("/{table_name}/{primary_key}", summary="Delete a record")
 async def delete_record(
         table_name: str,
         primary_key: str,
         request: Request,
+        if_version: Optional[int] = Query(None, description="Only delete the record if it is at this version"),
         service: CoordinatorService = Depends(get_coordinator_service)
 ):
     return await service.forward_request_to_shard(table_name, primary_key, request)
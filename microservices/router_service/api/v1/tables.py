@@ -10,11 +10,11 @@ router = APIRouter()
 
 
 @router.post("", status_code=201, summary="Register a table definition")
-def register_table(
+async def register_table(
         table: TableDefinition,
         service: CoordinatorService = Depends(get_coordinator_service)
 ):
-    return service.register_table(table)
+    return await service.register_table(table)
 
 
 @router.get("", response_model=List[TableDefinition], summary="List all table definitions")
@@ -23,8 +23,8 @@ def list_tables(service: CoordinatorService = Depends(get_coordinator_service)):
 
 
 @router.delete("/{table_name}", summary="Delete a table definition")
-def delete_table(
+async def delete_table(
         table_name: str,
         service: CoordinatorService = Depends(get_coordinator_service)
 ):
-    return service.delete_table(table_name)
+    return await service.delete_table(table_name)
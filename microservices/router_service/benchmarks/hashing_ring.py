@@ -0,0 +1,70 @@
+"""
+Microbenchmark of key -> shard group routing: the previous uhashring path
+against the in-house ring (single and batch lookups).
+
+    python -m microservices.router_service.benchmarks.hashing_ring --groups 8 --keys 100000
+"""
+import argparse
+import logging
+import time
+from typing import Callable, List
+
+import uhashring
+
+from microservices.libs.services.hashing import ConsistentHashingRing
+
+
+def _uhashring_lookup(ring: uhashring.HashRing) -> Callable[[str], str]:
+    def lookup(key: str) -> str:
+        # What ConsistentHashingRing.get_group_for_key did per request.
+        if not ring.get_nodes():
+            return None
+        return ring.get_node(key)
+
+    return lookup
+
+
+def _measure(name: str, keys: List[str], run: Callable[[List[str]], None], repeat: int):
+    best = min(_timed(run, keys) for _ in range(repeat))
+    print(f"{name:<32} {best / len(keys) * 1e9:>10.0f} ns/key {len(keys) / best:>14,.0f} keys/s")
+
+
+def _timed(run: Callable[[List[str]], None], keys: List[str]) -> float:
+    started = time.perf_counter()
+    run(keys)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, default=8)
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    groups = [f"group-{index}" for index in range(args.groups)]
+    keys = [f"users::{index}" for index in range(args.keys)]
+
+    legacy = uhashring.HashRing(nodes=groups)
+    ring = ConsistentHashingRing(logging.getLogger("benchmark"))
+    ring.restore({"groups": groups})
+
+    mismatches = sum(1 for key in keys if legacy.get_node(key) != ring.get_group_for_key(key))
+    print(f"{args.groups} groups, {args.keys} keys, placement mismatches vs uhashring: {mismatches}\n")
+
+    legacy_lookup = _uhashring_lookup(legacy)
+    _measure("uhashring (previous path)", keys[:args.keys // 10 or 1], lambda ks: [legacy_lookup(k) for k in ks], 1)
+    _measure("uhashring get_node only", keys, lambda ks: [legacy.get_node(k) for k in ks], args.repeat)
+
+    _measure("ring lookup", keys, lambda ks: [ring.get_group_for_key(k) for k in ks], args.repeat)
+
+    def batched(ks: List[str]):
+        for start in range(0, len(ks), args.batch_size):
+            ring.get_groups_for_keys(ks[start:start + args.batch_size])
+
+    _measure(f"ring batch ({args.batch_size}/call)", keys, batched, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,54 @@
+import os
+from typing import Optional
+
 from microservices.libs.utils.logger import setup_logger
 
 
 class Config:
-    pass
+    def __init__(self):
+        # Shard connection pool
+        self.shard_pool_max_connections: int = int(os.environ.get("SHARD_POOL_MAX_CONNECTIONS", "100"))
+        self.shard_pool_max_keepalive: int = int(os.environ.get("SHARD_POOL_MAX_KEEPALIVE", "20"))
+        self.shard_pool_keepalive_expiry_seconds: float = float(
+            os.environ.get("SHARD_POOL_KEEPALIVE_EXPIRY_SECONDS", "30")
+        )
+        self.shard_connect_timeout_seconds: float = float(os.environ.get("SHARD_CONNECT_TIMEOUT_SECONDS", "2"))
+        self.shard_request_timeout_seconds: float = float(os.environ.get("SHARD_REQUEST_TIMEOUT_SECONDS", "10"))
+        self.shard_http2: bool = os.environ.get("SHARD_HTTP2", "false").lower() == "true"
+
+        # Hashing ring (bounded loads when RING_LOAD_FACTOR is set)
+        self.ring_load_factor: Optional[float] = float(os.environ.get("RING_LOAD_FACTOR", "0")) or None
+
+        # Read routing
+        self.read_balancer_decay_seconds: float = float(os.environ.get("READ_BALANCER_DECAY_SECONDS", "10"))
+        self.read_balancer_error_penalty_seconds: float = float(
+            os.environ.get("READ_BALANCER_ERROR_PENALTY_SECONDS", "5")
+        )
+
+        # Health checks and failover
+        self.health_check_interval_seconds: float = float(os.environ.get("HEALTH_CHECK_INTERVAL_SECONDS", "1"))
+        self.health_check_timeout_seconds: float = float(os.environ.get("HEALTH_CHECK_TIMEOUT_SECONDS", "0.5"))
+        self.health_failure_threshold: int = int(os.environ.get("HEALTH_FAILURE_THRESHOLD", "3"))
+        self.health_recovery_successes: int = int(os.environ.get("HEALTH_RECOVERY_SUCCESSES", "2"))
+
+        # Record cache (disabled when RECORD_CACHE_MAX_ENTRIES is 0)
+        self.record_cache_max_entries: int = int(os.environ.get("RECORD_CACHE_MAX_ENTRIES", "0"))
+        self.record_cache_max_mb: int = int(os.environ.get("RECORD_CACHE_MAX_MB", "64"))
+        self.record_cache_ttl_seconds: float = float(os.environ.get("RECORD_CACHE_TTL_SECONDS", "30"))
+        self.kafka_broker_url: Optional[str] = os.environ.get("KAFKA_BROKER_URL")
+
+        # Router metadata (shared through Kafka when KAFKA_BROKER_URL is set)
+        self.metadata_topic: str = os.environ.get("METADATA_TOPIC", "router-metadata")
+        self.metadata_replication_factor: int = int(os.environ.get("METADATA_REPLICATION_FACTOR", "1"))
+        # One router holds the controller lease and alone runs failovers and migrations
+        self.controller_lease_seconds: float = float(os.environ.get("CONTROLLER_LEASE_SECONDS", "10"))
+
+        # Table scans
+        self.scan_page_size: int = int(os.environ.get("SCAN_PAGE_SIZE", "500"))
+
+        # Shard group migrations
+        self.rebalance_batch_size: int = int(os.environ.get("REBALANCE_BATCH_SIZE", "500"))
+        self.rebalance_batch_interval_ms: int = int(os.environ.get("REBALANCE_BATCH_INTERVAL_MS", "50"))
 
 
 config = Config()
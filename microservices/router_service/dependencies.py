@@ -1,9 +1,59 @@
 from microservices.libs.services.coordinator import CoordinatorService
 from microservices.libs.services.hashing import ConsistentHashingRing
-from microservices.router_service.config import logger
+from microservices.libs.services.load_balancer import ReadBalancer
+from microservices.libs.services.metadata_store import MetadataStore
+from microservices.libs.services.record_cache import RecordCache
+from microservices.libs.utils.http_pool import HttpClientPool
+from microservices.router_service.config import config, logger
 
-hashing_ring = ConsistentHashingRing(logger=logger)
-coordinator_service = CoordinatorService(hashing_ring=hashing_ring, logger=logger)
+hashing_ring = ConsistentHashingRing(
+    logger=logger,
+    load_factor=config.ring_load_factor
+)
+shard_pool = HttpClientPool(
+    name="router-shards",
+    logger=logger,
+    max_connections=config.shard_pool_max_connections,
+    max_keepalive_connections=config.shard_pool_max_keepalive,
+    keepalive_expiry=config.shard_pool_keepalive_expiry_seconds,
+    connect_timeout=config.shard_connect_timeout_seconds,
+    timeout=config.shard_request_timeout_seconds,
+    http2=config.shard_http2
+)
+read_balancer = ReadBalancer(
+    logger=logger,
+    decay_seconds=config.read_balancer_decay_seconds,
+    error_penalty_seconds=config.read_balancer_error_penalty_seconds
+)
+record_cache = RecordCache(
+    logger=logger,
+    max_entries=config.record_cache_max_entries,
+    max_bytes=config.record_cache_max_mb * 1024 * 1024,
+    default_ttl=config.record_cache_ttl_seconds,
+    kafka_broker_url=config.kafka_broker_url
+)
+metadata_store = MetadataStore(
+    kafka_broker_url=config.kafka_broker_url,
+    topic=config.metadata_topic,
+    logger=logger,
+    replication_factor=config.metadata_replication_factor,
+    lease_seconds=config.controller_lease_seconds
+) if config.kafka_broker_url else None
+coordinator_service = CoordinatorService(
+    hashing_ring=hashing_ring,
+    http_pool=shard_pool,
+    logger=logger,
+    read_balancer=read_balancer,
+    record_cache=record_cache,
+    metadata_store=metadata_store,
+    scan_page_size=config.scan_page_size,
+    rebalance_batch_size=config.rebalance_batch_size,
+    rebalance_batch_interval=config.rebalance_batch_interval_ms / 1000,
+    health_check_interval=config.health_check_interval_seconds,
+    health_check_timeout=config.health_check_timeout_seconds,
+    health_failure_threshold=config.health_failure_threshold,
+    health_recovery_successes=config.health_recovery_successes
+)
 
 
 def get_coordinator_service() -> CoordinatorService:
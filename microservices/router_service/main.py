@@ -1,15 +1,29 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Response
 from prometheus_fastapi_instrumentator import Instrumentator
 
 from api.v1.router import router as router_v1
+from microservices.libs.utils.consistency import ConsistencyMiddleware
 from microservices.libs.utils.middleware import TraceIdMiddleware
+from microservices.router_service.dependencies import coordinator_service
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await coordinator_service.start()
+    yield
+    await coordinator_service.stop()
+
 
 app = FastAPI(
     title="Router Service (Coordinator)",
-    description="Manages data sharding across multiple nodes."
+    description="Manages data sharding across multiple nodes.",
+    lifespan=lifespan
 )
 
 app.add_middleware(TraceIdMiddleware)
+app.add_middleware(ConsistencyMiddleware)
 
 Instrumentator().instrument(app).expose(app)
 
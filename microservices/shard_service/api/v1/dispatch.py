@@ -0,0 +1,215 @@
+import asyncio
+import heapq
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from microservices.libs.schemas.shard import (
+    BatchKeysData,
+    BatchResult,
+    BatchWriteData,
+    EpochChange,
+    IndexLookupResult,
+    IndexMatch,
+    MemoryUsage,
+    MigrationData,
+    MigrationResult,
+    NodeStatus,
+    ScanPage,
+    ScanRecord
+)
+from microservices.libs.services.shard_dispatcher import ShardDispatcher
+from microservices.libs.services.table import term_sort_key
+from microservices.shard_service.dispatcher_dependencies import get_dispatcher
+
+router = APIRouter(prefix="/v1")
+
+
+async def _split_batch(
+        dispatcher: ShardDispatcher,
+        request: Request,
+        table_name: str,
+        operation: str,
+        field: str,
+        items: List[Any],
+        primary_keys: List[str]
+) -> Tuple[Dict[int, List[int]], Dict[int, Dict[str, Any]]]:
+    """
+    Returns the positions of the items and the answer of every worker involved.
+    """
+    positions = dispatcher.split_keys(table_name, primary_keys)
+    workers = list(positions)
+    answers = await asyncio.gather(*(
+        dispatcher.call(
+            worker, request, "POST", f"/api/v1/records/{table_name}/batch/{operation}",
+            json={field: [items[position] for position in positions[worker]]}
+        )
+        for worker in workers
+    ))
+    return positions, dict(zip(workers, answers))
+
+
+async def _batch_results(
+        dispatcher: ShardDispatcher,
+        request: Request,
+        table_name: str,
+        operation: str,
+        field: str,
+        items: List[Any],
+        primary_keys: List[str]
+) -> BatchResult:
+    positions, answers = await _split_batch(dispatcher, request, table_name, operation, field, items, primary_keys)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    for worker, owned in positions.items():
+        for position, result in zip(owned, answers[worker]["results"]):
+            results[position] = result
+    return BatchResult(table_name=table_name, results=results)
+
+
+@router.get("/records/{table_name}", response_model=ScanPage, response_model_exclude_none=True)
+async def scan_records(
+        table_name: str,
+        request: Request,
+        limit: int = Query(1000, ge=1, le=10000),
+        dispatcher: ShardDispatcher = Depends(get_dispatcher)
+):
+    pages = await dispatcher.broadcast(request, "GET", f"/api/v1/records/{table_name}")
+    merged = list(heapq.merge(*(page["records"] for page in pages), key=lambda record: record["primary_key"]))
+    records = merged[:limit]
+    next_cursor = None
+    if records and (len(merged) > limit or any(page.get("next_cursor") for page in pages)):
+        next_cursor = records[-1]["primary_key"]
+    return ScanPage(
+        table_name=table_name, records=[ScanRecord(**record) for record in records], next_cursor=next_cursor
+    )
+
+
+@router.post("/records/{table_name}/batch/put", response_model=BatchResult)
+async def create_records(
+        table_name: str,
+        data: BatchWriteData,
+        request: Request,
+        dispatcher: ShardDispatcher = Depends(get_dispatcher)
+):
+    items = [record.model_dump(exclude_unset=True) for record in data.records]
+    primary_keys = [record.primary_key for record in data.records]
+    return await _batch_results(dispatcher, request, table_name, "put", "records", items, primary_keys)
+
+
+@router.post("/records/{table_name}/batch/get", response_model=BatchResult)
+async def read_records(
+        table_name: str,
+        data: BatchKeysData,
+        request: Request,
+        dispatcher: ShardDispatcher = Depends(get_dispatcher)
+):
+    return await _batch_results(
+        dispatcher, request, table_name, "get", "primary_keys", data.primary_keys, data.primary_keys
+    )
+
+
+@router.post("/records/{table_name}/batch/delete", response_model=BatchResult)
+async def delete_records(
+        table_name: str,
+        data: BatchKeysData,
+        request: Request,
+        dispatcher: ShardDispatcher = Depends(get_dispatcher)
+):
+    return await _batch_results(
+        dispatcher, request, table_name, "delete", "primary_keys", data.primary_keys, data.primary_keys
+    )
+
+
+@router.post("/records/{table_name}/batch/import", response_model=MigrationResult)
+async def import_records(
+        table_name: str,
+        data: MigrationData,
+        request: Request,
+        dispatcher: ShardDispatcher = Depends(get_dispatcher)
+):
+    items = [record.model_dump(exclude_unset=True) for record in data.records]
+    primary_keys = [record.primary_key for record in data.records]
+    _, answers = await _split_batch(dispatcher, request, table_name, "import", "records", items, primary_keys)
+    imported = sum(answer["imported"] for answer in answers.values())
+    return MigrationResult(table_name=table_name, imported=imported, skipped=len(items) - imported)
+
+
+@router.post("/records/{table_name}/_index/{field}", response_model=IndexLookupResult)
+async def lookup_index(
+        table_name: str,
+        field: str,
+        request: Request,
+        dispatcher: ShardDispatcher = Depends(get_dispatcher)
+):
+    query = await request.json()
+    answers = await dispatcher.broadcast(request, "POST", f"/api/v1/records/{table_name}/_index/{field}", json=query)
+    matches = sorted(
+        (IndexMatch(**match) for answer in answers for match in answer["records"]),
+        key=lambda match: (term_sort_key(match.index_value), match.primary_key)
+    )
+    return IndexLookupResult(table_name=table_name, field=field, records=matches[:query.get("limit", 1000)])
+
+
+@router.post("/records/{table_name}/{primary_key}/update")
+async def update_record(
+        table_name: str,
+        primary_key: str,
+        request: Request,
+        dispatcher: ShardDispatcher = Depends(get_dispatcher)
+):
+    return await dispatcher.forward(dispatcher.worker_for(table_name, primary_key), request)
+
+
+@router.api_route("/records/{table_name}/{primary_key}", methods=["GET", "HEAD", "POST", "PATCH", "DELETE"])
+async def forward_record(
+        table_name: str,
+        primary_key: str,
+        request: Request,
+        dispatcher: ShardDispatcher = Depends(get_dispatcher)
+):
+    return await dispatcher.forward(dispatcher.worker_for(table_name, primary_key), request)
+
+
+@router.put("/tables/{table_name}/indexes")
+async def define_indexes(
+        table_name: str,
+        request: Request,
+        dispatcher: ShardDispatcher = Depends(get_dispatcher)
+):
+    await dispatcher.broadcast(request, "PUT", f"/api/v1/tables/{table_name}/indexes", json=await request.json())
+    return {"status": "applied"}
+
+
+@router.get("/node/status", response_model=NodeStatus)
+async def get_status(request: Request, dispatcher: ShardDispatcher = Depends(get_dispatcher)):
+    return dispatcher.merge_statuses(await dispatcher.broadcast(request, "GET", "/api/v1/node/status"))
+
+
+@router.get("/node/memory", response_model=MemoryUsage)
+async def get_memory_usage(request: Request, dispatcher: ShardDispatcher = Depends(get_dispatcher)):
+    return dispatcher.merge_memory_usage(await dispatcher.broadcast(request, "GET", "/api/v1/node/memory"))
+
+
+@router.post("/node/promote", response_model=NodeStatus)
+async def promote(payload: EpochChange, request: Request, dispatcher: ShardDispatcher = Depends(get_dispatcher)):
+    return await dispatcher.change_role(request, True, payload.epoch)
+
+
+@router.post("/node/demote", response_model=NodeStatus)
+async def demote(payload: EpochChange, request: Request, dispatcher: ShardDispatcher = Depends(get_dispatcher)):
+    return await dispatcher.change_role(request, False, payload.epoch)
+
+
+@router.get("/node/snapshot", summary="Stream a snapshot of one worker's records as NDJSON")
+async def stream_snapshot(
+        request: Request,
+        worker: Optional[int] = Query(None, description="Worker whose records to stream"),
+        dispatcher: ShardDispatcher = Depends(get_dispatcher)
+):
+    if worker is None or not 0 <= worker < dispatcher.worker_count:
+        raise HTTPException(
+            status_code=400, detail=f"A multi-core node streams snapshots per worker (0..{dispatcher.worker_count - 1})"
+        )
+    stream = await dispatcher.stream(worker, request, "/api/v1/node/snapshot")
+    return StreamingResponse(stream, media_type="application/x-ndjson")
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from microservices.libs.schemas.shard import EpochChange, MemoryUsage, NodeStatus
+from microservices.libs.services.storage import StorageService
+from microservices.shard_service.dependencies import get_storage_service
+
+router = APIRouter()
+
+
+@router.get("/status", response_model=NodeStatus)
+async def get_status(service: StorageService = Depends(get_storage_service)):
+    return service.get_status()
+
+
+@router.get("/memory", response_model=MemoryUsage)
+async def get_memory_usage(service: StorageService = Depends(get_storage_service)):
+    return service.get_memory_usage()
+
+
+@router.post("/promote", response_model=NodeStatus)
+async def promote(
+        payload: EpochChange,
+        service: StorageService = Depends(get_storage_service)
+):
+    await service.promote(payload.epoch)
+    return service.get_status()
+
+
+@router.post("/demote", response_model=NodeStatus)
+async def demote(
+        payload: EpochChange,
+        service: StorageService = Depends(get_storage_service)
+):
+    await service.demote(payload.epoch)
+    return service.get_status()
+
+
+@router.get("/snapshot", summary="Stream a snapshot of the leader's records as NDJSON")
+async def stream_snapshot(service: StorageService = Depends(get_storage_service)):
+    stream = await service.open_snapshot()
+    return StreamingResponse(stream, media_type="application/x-ndjson")
@@ -1,21 +1,61 @@
-from fastapi import APIRouter, Path, Response, status, Depends
+from typing import Any, Dict, Optional
 
-from microservices.libs.schemas.shard import RecordData, RecordResponse
+from fastapi import APIRouter, Body, Path, Query, Response, status, Depends
+
+from microservices.libs.schemas.shard import (
+    AckMode,
+    BatchKeysData,
+    BatchResult,
+    BatchWriteData,
+    IndexLookupResult,
+    IndexQuery,
+    MigrationData,
+    MigrationResult,
+    RecordData,
+    RecordResponse,
+    RecordUpdate,
+    ScanPage
+)
 from microservices.libs.services.storage import StorageService
-from microservices.shard_service.dependencies import get_storage_service
+from microservices.shard_service.dependencies import get_storage_service, verify_leader_epoch
 
 router = APIRouter()
 
 
-@router.post("/{table_name}/{primary_key}", response_model=RecordResponse, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/{table_name}/{primary_key}",
+    response_model=RecordResponse,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(verify_leader_epoch)]
+)
 async def create_record(
         table_name: str,
         primary_key: str,
         data: RecordData,
+        ack: Optional[AckMode] = Query(None, description="Replication acknowledgement mode"),
+        if_absent: bool = Query(False, description="Only create the record if the key does not exist yet"),
+        if_version: Optional[int] = Query(None, description="Only overwrite the record if it is at this version"),
+        service: StorageService = Depends(get_storage_service)
+):
+    version = await service.create_record(
+        table_name, primary_key, data.value, ack, data.ttl_seconds, if_absent, if_version
+    )
+    return RecordResponse(table_name=table_name, primary_key=primary_key, value=data.value, version=version)
+
+
+@router.get("/{table_name}", response_model=ScanPage, response_model_exclude_none=True)
+async def scan_records(
+        table_name: str = Path(...),
+        start: Optional[str] = Query(None, description="Inclusive lower bound of the key range"),
+        end: Optional[str] = Query(None, description="Exclusive upper bound of the key range"),
+        prefix: Optional[str] = Query(None, description="Only return keys with this prefix"),
+        cursor: Optional[str] = Query(None, description="Return keys strictly after this one"),
+        limit: int = Query(1000, ge=1, le=10000),
+        with_timestamps: bool = Query(False, description="Include record timestamps (used by rebalancing)"),
         service: StorageService = Depends(get_storage_service)
 ):
-    stored_value = await service.create_record(table_name, primary_key, data.value)
-    return RecordResponse(table_name=table_name, primary_key=primary_key, value=stored_value)
+    records, next_cursor = service.scan_records(table_name, start, end, prefix, cursor, limit, with_timestamps)
+    return ScanPage(table_name=table_name, records=records, next_cursor=next_cursor)
 
 
 @router.get("/{table_name}/{primary_key}", response_model=RecordResponse)
@@ -24,17 +64,25 @@ async def read_record(
         primary_key: str = Path(...),
         service: StorageService = Depends(get_storage_service)
 ):
-    value = service.read_record(table_name, primary_key)
-    return RecordResponse(table_name=table_name, primary_key=primary_key, value=value)
+    record = service.read_record(table_name, primary_key)
+    return RecordResponse(
+        table_name=table_name, primary_key=primary_key, value=record.value, version=record.timestamp
+    )
 
 
-@router.delete("/{table_name}/{primary_key}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete(
+    "/{table_name}/{primary_key}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(verify_leader_epoch)]
+)
 async def delete_record(
         table_name: str = Path(...),
         primary_key: str = Path(...),
+        ack: Optional[AckMode] = Query(None, description="Replication acknowledgement mode"),
+        if_version: Optional[int] = Query(None, description="Only delete the record if it is at this version"),
         service: StorageService = Depends(get_storage_service)
 ):
-    await service.delete_record(table_name, primary_key)
+    await service.delete_record(table_name, primary_key, ack, if_version)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
@@ -47,3 +95,88 @@ async def exists_record(
     if service.exists_record(table_name, primary_key):
         return Response(status_code=status.HTTP_200_OK)
     return Response(status_code=status.HTTP_404_NOT_FOUND)
+
+
+@router.post("/{table_name}/batch/put", response_model=BatchResult, dependencies=[Depends(verify_leader_epoch)])
+async def create_records(
+        table_name: str,
+        data: BatchWriteData,
+        ack: Optional[AckMode] = Query(None, description="Replication acknowledgement mode"),
+        service: StorageService = Depends(get_storage_service)
+):
+    results = await service.create_records(table_name, data.records, ack)
+    return BatchResult(table_name=table_name, results=results)
+
+
+@router.post("/{table_name}/batch/get", response_model=BatchResult)
+async def read_records(
+        table_name: str,
+        data: BatchKeysData,
+        service: StorageService = Depends(get_storage_service)
+):
+    results = service.read_records(table_name, data.primary_keys)
+    return BatchResult(table_name=table_name, results=results)
+
+
+@router.post("/{table_name}/batch/delete", response_model=BatchResult, dependencies=[Depends(verify_leader_epoch)])
+async def delete_records(
+        table_name: str,
+        data: BatchKeysData,
+        ack: Optional[AckMode] = Query(None, description="Replication acknowledgement mode"),
+        service: StorageService = Depends(get_storage_service)
+):
+    results = await service.delete_records(table_name, data.primary_keys, ack)
+    return BatchResult(table_name=table_name, results=results)
+
+
+@router.post("/{table_name}/batch/import", response_model=MigrationResult, dependencies=[Depends(verify_leader_epoch)])
+async def import_records(
+        table_name: str,
+        data: MigrationData,
+        ack: Optional[AckMode] = Query(None, description="Replication acknowledgement mode"),
+        service: StorageService = Depends(get_storage_service)
+):
+    imported = await service.import_records(table_name, data.records, ack)
+    return MigrationResult(table_name=table_name, imported=imported, skipped=len(data.records) - imported)
+
+
+@router.post("/{table_name}/_index/{field}", response_model=IndexLookupResult)
+async def lookup_index(
+        table_name: str,
+        field: str,
+        query: IndexQuery,
+        service: StorageService = Depends(get_storage_service)
+):
+    records = service.lookup_index(table_name, field, query)
+    return IndexLookupResult(table_name=table_name, field=field, records=records)
+
+
+@router.post(
+    "/{table_name}/{primary_key}/update",
+    response_model=RecordResponse,
+    dependencies=[Depends(verify_leader_epoch)]
+)
+async def update_record(
+        table_name: str,
+        primary_key: str,
+        update: RecordUpdate,
+        ack: Optional[AckMode] = Query(None, description="Replication acknowledgement mode"),
+        service: StorageService = Depends(get_storage_service)
+):
+    value, version = await service.update_record(table_name, primary_key, update, ack)
+    return RecordResponse(table_name=table_name, primary_key=primary_key, value=value, version=version)
+
+
+@router.patch("/{table_name}/{primary_key}", response_model=RecordResponse, dependencies=[Depends(verify_leader_epoch)])
+async def patch_record(
+        table_name: str,
+        primary_key: str,
+        patch: Dict[str, Any] = Body(..., media_type="application/merge-patch+json"),
+        ack: Optional[AckMode] = Query(None, description="Replication acknowledgement mode"),
+        if_version: Optional[int] = Query(None, description="Only patch the record if it is at this version"),
+        service: StorageService = Depends(get_storage_service)
+):
+    value, version = await service.update_record(
+        table_name, primary_key, RecordUpdate(patch=patch, if_version=if_version), ack
+    )
+    return RecordResponse(table_name=table_name, primary_key=primary_key, value=value, version=version)
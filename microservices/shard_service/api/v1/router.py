@@ -1,7 +1,11 @@
 from fastapi import APIRouter
 
+from microservices.shard_service.api.v1.node import router as node_router
 from microservices.shard_service.api.v1.records import router as records_router
+from microservices.shard_service.api.v1.tables import router as tables_router
 
 router = APIRouter(prefix="/v1")
 
 router.include_router(records_router, prefix="/records", tags=["Records"])
+router.include_router(tables_router, prefix="/tables", tags=["Tables"])
+router.include_router(node_router, prefix="/node", tags=["Node"])
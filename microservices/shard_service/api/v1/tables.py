@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Depends
+
+from microservices.libs.schemas.shard import TableIndexes
+from microservices.libs.services.storage import StorageService
+from microservices.shard_service.dependencies import get_storage_service
+
+router = APIRouter()
+
+
+@router.put("/{table_name}/indexes")
+async def define_indexes(
+        table_name: str,
+        payload: TableIndexes,
+        service: StorageService = Depends(get_storage_service)
+):
+    service.define_indexes(table_name, payload.indexes)
+    return {"status": "applied"}
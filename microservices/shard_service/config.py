@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 
 from microservices.libs.utils.logger import setup_logger
 
@@ -9,10 +10,74 @@ class Config:
         self.advertised_url: str = self._get_env_variable("ADVERTISED_URL")
 
         self.group_id: str = self._get_env_variable("SHARD_GROUP_ID")
+        self.weight: int = int(os.environ.get("SHARD_WEIGHT", "1"))
         self.is_leader: bool = os.environ.get("IS_LEADER", "false").lower() == "true"
         self.kafka_broker_url: str = self._get_env_variable("KAFKA_BROKER_URL")
         self.kafka_topic: str = self._get_env_variable("KAFKA_TOPIC")
 
+        # Replication pipeline
+        self.replication_ack_mode: str = os.environ.get("REPLICATION_ACK_MODE", "kafka")
+        self.replication_replica_acks: int = int(os.environ.get("REPLICATION_REPLICA_ACKS", "1"))
+        self.replication_ack_timeout_seconds: float = float(os.environ.get("REPLICATION_ACK_TIMEOUT_SECONDS", "5"))
+        self.replication_linger_ms: int = int(os.environ.get("REPLICATION_LINGER_MS", "5"))
+        self.replication_max_batch_bytes: int = int(os.environ.get("REPLICATION_MAX_BATCH_BYTES", "65536"))
+        self.replication_compression: Optional[str] = os.environ.get("REPLICATION_COMPRESSION") or None
+        self.replication_wire_format: str = os.environ.get("REPLICATION_WIRE_FORMAT", "binary")
+        self.replication_partitions: int = int(os.environ.get("REPLICATION_PARTITIONS", "1"))
+        self.replication_compaction: bool = os.environ.get("REPLICATION_COMPACTION", "false").lower() == "true"
+        self.replication_topic_replicas: int = int(os.environ.get("REPLICATION_TOPIC_REPLICAS", "1"))
+        self.replication_apply_max_records: int = int(os.environ.get("REPLICATION_APPLY_MAX_RECORDS", "5000"))
+        self.replication_apply_timeout_ms: int = int(os.environ.get("REPLICATION_APPLY_TIMEOUT_MS", "100"))
+        # Has to outlive the pod (a StatefulSet pod name): the group keeps the follower's lag on the broker
+        self.replication_consumer_group: Optional[str] = os.environ.get("REPLICATION_CONSUMER_GROUP") or None
+        if not self.is_leader and not self.replication_consumer_group:
+            raise RuntimeError("REPLICATION_CONSUMER_GROUP must be set on followers, e.g. to the StatefulSet pod name")
+        self.replication_checkpoint_interval_seconds: float = float(
+            os.environ.get("REPLICATION_CHECKPOINT_INTERVAL_SECONDS", "5")
+        )
+        self.bootstrap_page_size: int = int(os.environ.get("BOOTSTRAP_PAGE_SIZE", "1000"))
+
+        # Local durability (WAL is disabled when WAL_DIR is not set)
+        self.wal_dir: Optional[str] = os.environ.get("WAL_DIR")
+        self.wal_fsync_interval_ms: int = int(os.environ.get("WAL_FSYNC_INTERVAL_MS", "5"))
+        self.snapshot_interval_seconds: float = float(os.environ.get("SNAPSHOT_INTERVAL_SECONDS", "60"))
+        self.snapshot_min_entries: int = int(os.environ.get("SNAPSHOT_MIN_ENTRIES", "10000"))
+
+        # Cold storage tier (disabled when COLD_STORAGE_DIR is not set)
+        self.cold_storage_dir: Optional[str] = os.environ.get("COLD_STORAGE_DIR")
+        self.hot_memory_limit_mb: int = int(os.environ.get("HOT_MEMORY_LIMIT_MB", "256"))
+        self.cold_segment_mb: int = int(os.environ.get("COLD_SEGMENT_MB", "64"))
+        self.cold_compaction_interval_seconds: float = float(
+            os.environ.get("COLD_COMPACTION_INTERVAL_SECONDS", "30")
+        )
+
+        # Record expiry
+        self.expiry_interval_seconds: float = float(os.environ.get("EXPIRY_INTERVAL_SECONDS", "1"))
+        self.expiry_batch_size: int = int(os.environ.get("EXPIRY_BATCH_SIZE", "1000"))
+
+        # Failover
+        self.failover_catch_up_timeout_seconds: float = float(
+            os.environ.get("FAILOVER_CATCH_UP_TIMEOUT_SECONDS", "5")
+        )
+
+        # Multi-core node (SHARD_WORKERS > 1): the dispatcher starts the workers and sets their WORKER_INDEX
+        self.shard_workers: int = int(os.environ.get("SHARD_WORKERS", "1"))
+        worker_index = os.environ.get("WORKER_INDEX")
+        self.worker_index: Optional[int] = int(worker_index) if worker_index else None
+        self.worker_count: int = self.shard_workers if self.worker_index is not None else 1
+        self.worker_app: str = os.environ.get("WORKER_APP", "main:app")
+        self.worker_socket_dir: str = os.environ.get("WORKER_SOCKET_DIR", "/tmp/shard-workers")
+        self.worker_start_timeout_seconds: float = float(os.environ.get("WORKER_START_TIMEOUT_SECONDS", "60"))
+        self.worker_request_timeout_seconds: float = float(os.environ.get("WORKER_REQUEST_TIMEOUT_SECONDS", "30"))
+        self.worker_status_interval_seconds: float = float(os.environ.get("WORKER_STATUS_INTERVAL_SECONDS", "0.5"))
+        if self.worker_index is not None:
+            # Every worker keeps its own WAL, cold segments and replication offsets.
+            worker_dir = f"worker-{self.worker_index}"
+            self.wal_dir = os.path.join(self.wal_dir, worker_dir) if self.wal_dir else None
+            self.cold_storage_dir = os.path.join(self.cold_storage_dir, worker_dir) if self.cold_storage_dir else None
+            if self.replication_consumer_group:
+                self.replication_consumer_group = f"{self.replication_consumer_group}-w{self.worker_index}"
+
     @staticmethod
     def _get_env_variable(var_name: str) -> str:
         value = os.environ.get(var_name)
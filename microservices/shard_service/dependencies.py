@@ -1,16 +1,79 @@
+from typing import Optional
+
+from fastapi import Depends, Header
+
+from microservices.libs.services.cold_store import ColdStore
+from microservices.libs.services.replication import ReplicationPipeline
 from microservices.libs.services.storage import StorageService
+from microservices.libs.services.wal import WriteAheadLog
 from microservices.shard_service.config import config, logger
 
+wal = WriteAheadLog(
+    directory=config.wal_dir,
+    logger=logger,
+    fsync_interval=config.wal_fsync_interval_ms / 1000
+) if config.wal_dir else None
+
+cold_store = ColdStore(
+    directory=config.cold_storage_dir,
+    logger=logger,
+    segment_bytes=config.cold_segment_mb * 1024 * 1024
+) if config.cold_storage_dir else None
+
+replication = ReplicationPipeline(
+    kafka_broker_url=config.kafka_broker_url,
+    kafka_topic=config.kafka_topic,
+    node_id=config.advertised_url,
+    logger=logger,
+    ack_mode=config.replication_ack_mode,
+    replica_acks=config.replication_replica_acks,
+    ack_timeout=config.replication_ack_timeout_seconds,
+    linger_ms=config.replication_linger_ms,
+    max_batch_bytes=config.replication_max_batch_bytes,
+    compression_type=config.replication_compression,
+    wire_format=config.replication_wire_format,
+    partitions=config.replication_partitions,
+    compaction=config.replication_compaction,
+    replication_factor=config.replication_topic_replicas,
+    worker_index=config.worker_index or 0,
+    worker_count=config.worker_count
+)
+
 storage_service = StorageService(
     router_service_url=config.router_service_url,
     advertised_url=config.advertised_url,
     group_id=config.group_id,
+    weight=config.weight,
     is_leader=config.is_leader,
     kafka_broker_url=config.kafka_broker_url,
     kafka_topic=config.kafka_topic,
-    logger=logger
+    replication=replication,
+    logger=logger,
+    wal=wal,
+    snapshot_interval=config.snapshot_interval_seconds,
+    snapshot_min_entries=config.snapshot_min_entries,
+    catch_up_timeout=config.failover_catch_up_timeout_seconds,
+    apply_max_records=config.replication_apply_max_records,
+    apply_timeout_ms=config.replication_apply_timeout_ms,
+    cold_store=cold_store,
+    hot_memory_limit=config.hot_memory_limit_mb * 1024 * 1024,
+    compaction_interval=config.cold_compaction_interval_seconds,
+    expiry_interval=config.expiry_interval_seconds,
+    expiry_batch_size=config.expiry_batch_size,
+    consumer_group=config.replication_consumer_group,
+    checkpoint_interval=config.replication_checkpoint_interval_seconds,
+    snapshot_page_size=config.bootstrap_page_size,
+    worker_index=config.worker_index or 0,
+    worker_count=config.worker_count
 )
 
 
 def get_storage_service() -> StorageService:
     return storage_service
+
+
+def verify_leader_epoch(
+        x_leader_epoch: Optional[int] = Header(None),
+        service: StorageService = Depends(get_storage_service)
+):
+    service.check_epoch(x_leader_epoch)
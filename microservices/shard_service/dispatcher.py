@@ -0,0 +1,37 @@
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
+from prometheus_fastapi_instrumentator import Instrumentator
+
+from microservices.libs.utils.consistency import AppliedTimestampMiddleware
+from microservices.libs.utils.middleware import TraceIdMiddleware
+from microservices.shard_service.api.v1.dispatch import router as dispatch_router
+from microservices.shard_service.dispatcher_dependencies import dispatcher
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await dispatcher.start()
+    await dispatcher.register_self()
+    yield
+    await dispatcher.stop()
+
+
+app = FastAPI(
+    title="Shard Service (dispatcher)",
+    description="A multi-core shard node: routes every request to the worker process that owns its keys.",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+app.add_middleware(TraceIdMiddleware)
+app.add_middleware(AppliedTimestampMiddleware, get_timestamp=lambda: dispatcher.applied_timestamp)
+
+Instrumentator().instrument(app).expose(app)
+
+app.include_router(dispatch_router, prefix="/api")
+
+
+@app.get("/", tags=["Health"])
+async def health_check():
+    return Response(status_code=200, content="OK")
@@ -0,0 +1,23 @@
+from microservices.libs.services.shard_dispatcher import ShardDispatcher
+from microservices.shard_service.config import config, logger
+
+dispatcher = ShardDispatcher(
+    worker_count=config.shard_workers,
+    partitions=config.replication_partitions,
+    socket_dir=config.worker_socket_dir,
+    worker_app=config.worker_app,
+    router_service_url=config.router_service_url,
+    advertised_url=config.advertised_url,
+    group_id=config.group_id,
+    weight=config.weight,
+    is_leader=config.is_leader,
+    kafka_topic=config.kafka_topic,
+    logger=logger,
+    start_timeout=config.worker_start_timeout_seconds,
+    request_timeout=config.worker_request_timeout_seconds,
+    status_interval=config.worker_status_interval_seconds
+)
+
+
+def get_dispatcher() -> ShardDispatcher:
+    return dispatcher
@@ -0,0 +1,11 @@
+#!/bin/sh
+set -e
+
+# SHARD_WORKERS > 1 runs the dispatcher, which starts the worker processes itself.
+if [ "${SHARD_WORKERS:-1}" -gt 1 ]; then
+    app="dispatcher:app"
+else
+    app="main:app"
+fi
+
+exec uvicorn "$app" --host 0.0.0.0 --port 8000
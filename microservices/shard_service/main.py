@@ -3,15 +3,24 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, Response
 from prometheus_fastapi_instrumentator import Instrumentator
 
+from microservices.libs.utils.consistency import AppliedTimestampMiddleware
 from microservices.libs.utils.middleware import TraceIdMiddleware
 from microservices.shard_service.api.v1.router import router as router_v1
+from microservices.shard_service.config import config
 from microservices.shard_service.dependencies import storage_service
 
+if config.shard_workers > 1 and config.worker_index is None:
+    raise RuntimeError(
+        f"SHARD_WORKERS is {config.shard_workers} but WORKER_INDEX is not set: run dispatcher:app, which starts the "
+        f"workers, or set SHARD_WORKERS=1"
+    )
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await storage_service.start()
-    await storage_service.register_self()
+    # Workers of a multi-core node are registered by their dispatcher.
+    if config.worker_index is None:
+        await storage_service.register_self()
     yield
     await storage_service.stop()
 
@@ -24,6 +33,7 @@ app = FastAPI(
 )
 
 app.add_middleware(TraceIdMiddleware)
+app.add_middleware(AppliedTimestampMiddleware, get_timestamp=lambda: storage_service.applied_timestamp)
 
 Instrumentator().instrument(app).expose(app)
 
@@ -0,0 +1,37 @@
+import logging
+
+import pytest
+
+from microservices.libs.services.storage import StorageService
+
+
+class StubReplication:
+    compaction = False
+    partitions = 1
+
+    def __init__(self):
+        self.published = []
+        self.applied = 0
+
+    async def start(self, is_leader):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, msg, ack_mode=None):
+        self.published.append(msg)
+
+    def record_applied(self, timestamp):
+        self.applied = max(self.applied, timestamp)
+
+
+@pytest.fixture
+def make_storage():
+    def make(is_leader=False, **kwargs):
+        return StorageService(
+            "http://router", "http://node", "group-a", is_leader, "kafka:9092", "shard-a-log", StubReplication(),
+            logging.getLogger("test-storage"), **kwargs
+        )
+
+    return make
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import random
+import time
+from bisect import bisect
+
+import numpy as np
+import pytest
+
+from microservices.libs.services.hashing import _PREFIX_SHIFT, ConsistentHashingRing, RingLayout
+
+GROUPS = [f"group-{index}" for index in range(8)]
+KEYS = [f"users::{index}" for index in range(20_000)]
+
+
+def _ring(groups=GROUPS, **kwargs):
+    ring = ConsistentHashingRing(logging.getLogger("test-ring"), **kwargs)
+    ring.restore({"groups": list(groups)})
+    return ring
+
+
+def _bisect_owner(layout, hashed):
+    return layout._owners[bisect(layout._points, hashed)]
+
+
+def test_placement_matches_uhashring():
+    uhashring = pytest.importorskip("uhashring")
+    legacy = uhashring.HashRing(nodes=GROUPS)
+    ring = _ring()
+    assert [ring.get_group_for_key(key) for key in KEYS] == [legacy.get_node(key) for key in KEYS]
+
+
+def test_prefix_table_agrees_with_bisect_around_every_virtual_node():
+    layout = RingLayout(GROUPS)
+    hashes = [0, (1 << 128) - 1]
+    for point in layout._points:
+        hashes += [point - 1, point, point + 1]
+        prefix_start = (point >> _PREFIX_SHIFT) << _PREFIX_SHIFT
+        hashes += [prefix_start - 1, prefix_start]
+    rng = random.Random(7)
+    hashes += [rng.getrandbits(128) for _ in range(20_000)]
+    for hashed in hashes:
+        hashed %= 1 << 128
+        assert layout.digest_owner(hashed.to_bytes(16, "big")) == _bisect_owner(layout, hashed)
+
+
+def test_batch_lookups_agree_with_single_lookups():
+    ring = _ring()
+    assert ring.get_groups_for_keys(KEYS) == [ring.get_group_for_key(key) for key in KEYS]
+
+
+def test_batch_lookup_orders_points_that_share_the_upper_half():
+    layout = RingLayout(GROUPS)
+    point = layout._points[10]
+    hashes = [point - 1, point, point + 1]
+    rows = np.array([[hashed >> 64, hashed & ((1 << 64) - 1)] for hashed in hashes], dtype=np.uint64)
+    assert layout.owners(rows) == [_bisect_owner(layout, hashed) for hashed in hashes]
+
+
+def test_empty_ring_has_no_owners():
+    ring = ConsistentHashingRing(logging.getLogger("test-ring"))
+    assert ring.get_group_for_key("users::1") is None
+    assert ring.get_groups_for_keys(["users::1", "users::2"]) == [None, None]
+
+
+def test_keys_move_only_to_the_new_group_while_migrating():
+    ring = _ring()
+    before = ring.get_groups_for_keys(KEYS)
+    asyncio.run(ring.begin_migration(add="group-new"))
+    after = ring.get_groups_for_keys(KEYS)
+    previous = ring.get_previous_groups_for_keys(KEYS)
+    assert previous == [ring.get_previous_group_for_key(key) for key in KEYS]
+    for key, old, new, moved_from in zip(KEYS, before, after, previous):
+        if old == new:
+            assert moved_from is None
+        else:
+            assert new == "group-new" and moved_from == old
+    assert set(ring.migration_sources()) == {group for group in previous if group}
+
+    ring.commit_migration()
+    assert not ring.is_migrating
+    assert ring.get_groups_for_keys(KEYS) == after
+    assert ring.get_previous_group_for_key(KEYS[0]) is None
+
+
+def test_groups_joining_during_a_migration_join_the_target_too():
+    ring = _ring(GROUPS[:4])
+    asyncio.run(ring.begin_migration(remove="group-0"))
+    asyncio.run(ring.add_group("group-late"))
+    assert "group-late" in ring.snapshot.current.groups and "group-late" in ring.snapshot.pending.groups
+    asyncio.run(ring.remove_group("group-1"))
+    assert "group-1" not in ring.snapshot.current.groups and "group-1" not in ring.snapshot.pending.groups
+    ring.commit_migration()
+    assert ring.get_groups() == ["group-2", "group-3", "group-late"]
+
+
+def test_state_round_trips_through_restore():
+    ring = _ring()
+    asyncio.run(ring.begin_migration(add="group-new", weights={"group-1": 2}))
+    restored = _ring([])
+    restored.restore(ring.get_state())
+    assert restored.get_state() == ring.get_state()
+    assert restored.get_groups_for_keys(KEYS) == ring.get_groups_for_keys(KEYS)
+    assert restored.get_previous_groups_for_keys(KEYS) == ring.get_previous_groups_for_keys(KEYS)
+
+
+def _best_of(repeat, run):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def test_lookups_are_faster_than_uhashring():
+    uhashring = pytest.importorskip("uhashring")
+    legacy = uhashring.HashRing(nodes=GROUPS)
+    ring = _ring()
+    keys = KEYS[:5000]
+    legacy_time = _best_of(5, lambda: [legacy.get_node(key) for key in keys])
+    single_time = _best_of(5, lambda: [ring.get_group_for_key(key) for key in keys])
+    batch_time = _best_of(5, lambda: ring.get_groups_for_keys(keys))
+    assert single_time < legacy_time
+    assert batch_time < legacy_time
+
+
+def test_weights_scale_the_key_share():
+    layout = RingLayout(GROUPS[:4], {"group-0": 3})
+    assert layout.shares["group-0"] == pytest.approx(0.5, abs=0.05)
+    assert sum(layout.shares.values()) == pytest.approx(1)
+
+
+@pytest.mark.parametrize("load_factor", [1.05, 1.25])
+def test_bounded_load_caps_every_share(load_factor):
+    weights = {"group-0": 2}
+    layout = RingLayout(GROUPS, weights, load_factor)
+    total_weight = len(GROUPS) + 1
+    for group, share in layout.shares.items():
+        assert share <= load_factor * weights.get(group, 1) / total_weight + 1e-9
+    assert sum(layout.shares.values()) == pytest.approx(1)
+
+
+def test_bounded_load_routes_batches_and_single_keys_alike():
+    ring = _ring(load_factor=1.05)
+    assert ring.get_groups_for_keys(KEYS) == [ring.get_group_for_key(key) for key in KEYS]
+
+
+def test_load_factor_below_one_is_rejected():
+    with pytest.raises(ValueError):
+        ConsistentHashingRing(logging.getLogger("test-ring"), load_factor=0.9)
+
+
+def test_moved_from_names_the_groups_that_hand_keys_over():
+    current = RingLayout(GROUPS[:4])
+    assert current.moved_from(RingLayout(GROUPS[:4])) == []
+    assert current.moved_from(RingLayout(GROUPS[:4], {"group-2": 2})) == ["group-0", "group-1", "group-3"]
+    assert current.moved_from(RingLayout(GROUPS[1:4])) == ["group-0"]
@@ -0,0 +1,64 @@
+import pytest
+
+from microservices.libs.utils.merge_patch import apply_merge_patch, create_merge_patch
+
+# RFC 7396, appendix A.
+RFC_EXAMPLES = [
+    ({"a": "b"}, {"a": "c"}, {"a": "c"}),
+    ({"a": "b"}, {"b": "c"}, {"a": "b", "b": "c"}),
+    ({"a": "b"}, {"a": None}, {}),
+    ({"a": "b", "b": "c"}, {"a": None}, {"b": "c"}),
+    ({"a": ["b"]}, {"a": "c"}, {"a": "c"}),
+    ({"a": "c"}, {"a": ["b"]}, {"a": ["b"]}),
+    ({"a": {"b": "c"}}, {"a": {"b": "d", "c": None}}, {"a": {"b": "d"}}),
+    ({"a": [{"b": "c"}]}, {"a": [1]}, {"a": [1]}),
+    (["a", "b"], ["c", "d"], ["c", "d"]),
+    ({"a": "b"}, ["c"], ["c"]),
+    ({"a": "foo"}, None, None),
+    ({"a": "foo"}, "bar", "bar"),
+    ({"e": None}, {"a": 1}, {"e": None, "a": 1}),
+    ([1, 2], {"a": "b", "c": None}, {"a": "b"}),
+    ({}, {"a": {"bb": {"ccc": None}}}, {"a": {"bb": {}}}),
+]
+
+
+@pytest.mark.parametrize("target, patch, expected", RFC_EXAMPLES)
+def test_apply_follows_the_rfc_examples(target, patch, expected):
+    assert apply_merge_patch(target, patch) == expected
+
+
+def test_apply_leaves_the_target_untouched():
+    target = {"a": {"b": 1}, "c": 2}
+    apply_merge_patch(target, {"a": {"b": None}, "c": None})
+    assert target == {"a": {"b": 1}, "c": 2}
+
+
+@pytest.mark.parametrize("source, target", [
+    ({"a": 1, "b": {"c": 2, "d": 3}}, {"a": 1, "b": {"c": 4}, "e": [1, None]}),
+    ({"a": {"b": {"c": 1}}}, {"a": {"b": {}}}),
+    ({"a": 1}, {"a": {"b": 2}}),
+    ({"a": {"b": 2}}, {"a": 1}),
+    ({}, {}),
+])
+def test_created_patch_turns_source_into_target(source, target):
+    patch = create_merge_patch(source, target)
+    assert patch is not None
+    assert apply_merge_patch(source, patch) == target
+
+
+def test_created_patch_holds_only_the_changes():
+    assert create_merge_patch({"a": 1, "b": 2, "c": 3}, {"a": 1, "b": 5}) == {"b": 5, "c": None}
+
+
+def test_created_patch_replaces_equal_values_of_another_type():
+    patch = create_merge_patch({"a": 1}, {"a": 1.0})
+    assert patch == {"a": 1.0} and type(patch["a"]) is float
+
+
+@pytest.mark.parametrize("source, target", [
+    ({"a": 1}, {"a": None}),
+    ({}, {"a": {"b": None}}),
+    ({"a": {"b": 1}}, {"a": {"b": None}}),
+])
+def test_no_patch_can_write_null_members(source, target):
+    assert create_merge_patch(source, target) is None
@@ -0,0 +1,89 @@
+import json
+
+import msgpack
+import pytest
+from aiokafka.partitioner import DefaultPartitioner
+
+from microservices.libs.schemas.shard import ReplicationMessage
+from microservices.libs.utils.replication_codec import (
+    WIRE_VERSION,
+    decode_record,
+    decode_update,
+    encode_message,
+    partition_for_key,
+    record_key,
+    tombstone_headers
+)
+
+
+def _message(**fields):
+    return ReplicationMessage(**{"operation": "create", "table_name": "users", "timestamp": 10, "epoch": 2, **fields})
+
+
+def _frame(version, frame):
+    return bytes((0xA7, version)) + msgpack.packb(frame, use_bin_type=True)
+
+
+@pytest.mark.parametrize("wire_format", ["binary", "json"])
+def test_single_write_round_trips(wire_format):
+    msg = _message(primary_key="a", value={"value": {"name": "Ada"}}, expires_at=99)
+    update = decode_update(encode_message(msg, wire_format))
+    assert update == ("users", 10, 2, [("create", "a", 10, {"name": "Ada"}, 99)], False)
+    assert update.target == "users/a"
+
+
+@pytest.mark.parametrize("wire_format", ["binary", "json"])
+def test_batch_with_patch_and_delete_round_trips(wire_format):
+    msg = _message(operation="batch", batch=[
+        _message(primary_key="a", value={"value": [1, 2]}, timestamp=8),
+        _message(operation="patch", primary_key="b", value={"value": {"x": None}}, timestamp=9, base_timestamp=4),
+        _message(operation="delete", primary_key="c", timestamp=10)
+    ])
+    update = decode_update(encode_message(msg, wire_format))
+    assert update.is_batch
+    assert update.operations == [
+        ("create", "a", 8, [1, 2], None),
+        ("patch", "b", 9, (4, {"x": None}), None),
+        ("delete", "c", 10, None, None)
+    ]
+
+
+def test_binary_frames_are_versioned():
+    payload = encode_message(_message(primary_key="a", value={"value": 1}))
+    assert payload[:2] == bytes((0xA7, WIRE_VERSION))
+
+
+def test_values_msgpack_cannot_hold_fall_back_to_json():
+    payload = encode_message(_message(primary_key="a", value={"value": 2 ** 70}))
+    assert json.loads(payload)["value"] == {"value": 2 ** 70}
+    assert decode_update(payload).operations[0][3] == 2 ** 70
+
+
+def test_older_frame_versions_still_decode():
+    v1 = _frame(1, ["users", 5, 1, True, [[0, "a", 5, {"n": 1}], [2, "b", 5, {"n": None}]]])
+    assert decode_update(v1).operations == [
+        ("create", "a", 5, {"n": 1}, None),
+        ("patch", "b", 5, (None, {"n": None}), None)
+    ]
+    v2 = _frame(2, ["users", 5, 1, False, [[0, "a", 5, {"n": 1}, 50]]])
+    assert decode_update(v2).operations == [("create", "a", 5, {"n": 1}, 50)]
+
+
+def test_unknown_frame_version_is_rejected():
+    with pytest.raises(ValueError, match="version 9"):
+        decode_update(_frame(9, ["users", 5, 1, False, []]))
+
+
+def test_tombstone_decodes_as_a_delete_of_its_key():
+    msg = _message(operation="delete", primary_key="a::b", timestamp=42, epoch=3)
+    update = decode_record(record_key("users", "a::b"), None, tombstone_headers(msg))
+    assert update == ("users", 42, 3, [("delete", "a::b", 42, None, None)], False)
+
+
+@pytest.mark.parametrize("partitions", [1, 3, 8])
+def test_partition_matches_the_kafka_default_partitioner(partitions):
+    partitioner = DefaultPartitioner()
+    every = list(range(partitions))
+    for index in range(500):
+        key = record_key("users", f"user-{index}")
+        assert partition_for_key("users", f"user-{index}", partitions) == partitioner(key, every, every)
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+from aiokafka import TopicPartition
+
+from microservices.libs.schemas.shard import ReplicationMessage
+from microservices.libs.utils.replication_codec import encode_message
+
+TP0 = TopicPartition("shard-a-log", 0)
+TP1 = TopicPartition("shard-a-log", 1)
+
+
+def _record(offset, operation="create", primary_key="a", value=None, timestamp=1, epoch=0, **fields):
+    msg = ReplicationMessage(
+        operation=operation,
+        table_name="users",
+        primary_key=primary_key,
+        value={"value": value} if value is not None else None,
+        timestamp=timestamp,
+        epoch=epoch,
+        **fields
+    )
+    return SimpleNamespace(offset=offset, key=None, value=encode_message(msg), headers=())
+
+
+def _values(storage):
+    table = storage._data_store.get("users")
+    return {key: (record.value, record.timestamp) for key, record in table.records.items()} if table else {}
+
+
+def test_newest_timestamp_wins_whatever_the_arrival_order(make_storage):
+    storage = make_storage()
+    storage._apply_replication_batch({
+        TP0: [_record(0, primary_key="a", value=1, timestamp=20), _record(1, primary_key="b", value=1, timestamp=5)],
+        TP1: [_record(0, primary_key="a", value=2, timestamp=10), _record(1, primary_key="b", value=2, timestamp=6)]
+    })
+    assert _values(storage) == {"a": (1, 20), "b": (2, 6)}
+    assert storage._replication_offsets == {0: 1, 1: 1}
+
+
+def test_stale_and_replayed_operations_leave_the_store_alone(make_storage):
+    storage = make_storage()
+    storage._apply_replication_batch({TP0: [_record(0, value="new", timestamp=10)]})
+    storage._apply_replication_batch({TP0: [
+        _record(1, value="old", timestamp=9),
+        _record(2, value="same", timestamp=10),
+        _record(3, operation="delete", timestamp=8)
+    ]})
+    assert _values(storage) == {"a": ("new", 10)}
+    assert storage._replication_offsets == {0: 3}
+
+
+def test_operations_on_one_key_fold_into_its_final_state(make_storage):
+    storage = make_storage()
+    storage._apply_replication_batch({TP0: [
+        _record(0, value={"n": 1}, timestamp=1),
+        _record(1, operation="delete", timestamp=2),
+        _record(2, value={"n": 3}, timestamp=3),
+        _record(3, operation="delete", primary_key="missing", timestamp=4)
+    ]})
+    assert _values(storage) == {"a": ({"n": 3}, 3)}
+
+
+def test_operations_of_a_deposed_leader_are_fenced(make_storage):
+    storage = make_storage()
+    storage._apply_replication_batch({TP0: [_record(0, value="leader-2", timestamp=10, epoch=2)]})
+    storage._apply_replication_batch({TP0: [_record(1, value="leader-1", timestamp=11, epoch=1)]})
+    assert _values(storage) == {"a": ("leader-2", 10)}
+    assert storage.epoch == 2
+
+
+def test_partition_stops_at_a_message_that_cannot_be_decoded(make_storage):
+    storage = make_storage()
+    broken = SimpleNamespace(offset=1, key=None, value=b"\xa7\x09garbage", headers=())
+    failed = storage._apply_replication_batch({
+        TP0: [_record(0, primary_key="a", value=1), broken, _record(2, primary_key="c", value=1)],
+        TP1: [_record(0, primary_key="b", value=1)]
+    })
+    assert failed == {TP0: 1}
+    assert sorted(_values(storage)) == ["a", "b"]
+    assert storage._replication_offsets == {0: 0, 1: 0}
+
+
+def test_applied_timestamp_is_the_lowest_partition_watermark(make_storage):
+    storage = make_storage()
+    storage._apply_replication_batch({
+        TP0: [_record(0, timestamp=50)],
+        TP1: [_record(0, primary_key="b", timestamp=30)]
+    })
+    assert storage.applied_timestamp == 30
+    storage._apply_replication_batch({TP1: [_record(1, primary_key="b", timestamp=70)]})
+    assert storage.applied_timestamp == 50
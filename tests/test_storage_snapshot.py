@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import os
+import random
+
+from microservices.libs.services.cold_store import ColdStore
+from microservices.libs.services.wal import WriteAheadLog
+
+
+def _storage(make_storage, directory):
+    logger = logging.getLogger("test-storage")
+    return make_storage(
+        is_leader=True,
+        wal=WriteAheadLog(os.path.join(directory, "wal"), logger, fsync_interval=0),
+        cold_store=ColdStore(os.path.join(directory, "cold"), logger, segment_bytes=1 << 16),
+        hot_memory_limit=40_000,
+        snapshot_interval=1000,
+        snapshot_page_size=50
+    )
+
+
+def test_snapshot_taken_under_writes_recovers_the_exact_state(make_storage, tmp_path):
+    rng = random.Random(3)
+    expected = {}
+
+    async def write(storage, count, prefix):
+        for index in range(count):
+            key = f"k{rng.randrange(1200):05d}"
+            if rng.random() < 0.3:
+                try:
+                    await storage.delete_record("movies", key)
+                    expected.pop(key, None)
+                except Exception:
+                    pass
+            else:
+                value = {"id": f"{prefix}{index}", "desc": "x" * rng.randint(50, 300)}
+                await storage.create_record("movies", key, value, ttl_seconds=1000 if index % 7 == 0 else None)
+                expected[key] = value
+
+    async def scenario():
+        storage = _storage(make_storage, tmp_path)
+        await storage.start()
+        await write(storage, 1000, "a")
+        await storage.create_record("empty", "a", {})
+        await storage.delete_record("empty", "a")
+        storage._enforce_memory_budget()
+        assert storage._data_store["movies"].memory_usage()["cold_records"]
+
+        await asyncio.gather(storage._write_snapshot(), write(storage, 300, "b"))
+        await asyncio.gather(storage._write_snapshot(), write(storage, 300, "c"))
+        expiries = {key: storage._data_store["movies"].expires_at(key) for key in expected}
+        # Crash: the WAL is closed without the final snapshot `stop` would write.
+        await storage.wal.stop()
+        return expiries
+
+    expiries = asyncio.run(scenario())
+
+    recovered = _storage(make_storage, tmp_path)
+    recovered.cold_store.open()
+    recovered._recover_from_wal()
+    table = recovered._data_store["movies"]
+    assert sorted(recovered._data_store) == ["empty", "movies"]
+    assert {key: record.value for key, record in table.scan()} == expected
+    assert {key: table.expires_at(key) for key in expected} == expiries
+    assert table.memory_usage()["cold_records"]
+    recovered.cold_store.close()
@@ -0,0 +1,171 @@
+import logging
+
+import pytest
+
+from microservices.libs.services.cold_store import ColdStore
+from microservices.libs.services.table import ColdRecord, StoredRecord, Table, decode_value, encode_value
+
+
+def _table(count=0, prefix="k"):
+    table = Table()
+    for index in range(count):
+        table.put(f"{prefix}{index:04d}", {"n": index}, index + 1)
+    return table
+
+
+def _keys(records):
+    return [key for key, _ in records]
+
+
+@pytest.mark.parametrize("value", [
+    {"name": "Ada", "tags": ["a", "b"], "nested": {"x": 1.5, "y": None}},
+    [1, "two", 3.0, True, None],
+    "text",
+    b"\x00bytes",
+    2 ** 64,
+    {"big": -(2 ** 70), "small": 1},
+])
+def test_values_round_trip_through_the_encoding(value):
+    assert decode_value(encode_value(value)) == value
+
+
+def test_put_get_and_delete():
+    table = _table()
+    table.put("a", {"n": 1}, 5)
+    table.put("a", {"n": 2}, 6)
+    assert len(table) == 1 and "a" in table
+    record = table.get("a")
+    assert (record.value, record.timestamp) == ({"n": 2}, 6)
+    assert table.delete("a")
+    assert not table.delete("a")
+    assert table.get("a") is None and "a" not in table
+
+
+def test_scan_ranges_prefixes_and_cursors():
+    table = _table()
+    for key in ["b:2", "a:1", "b:1", "c:1", "b:3"]:
+        table.put(key, key, 1)
+    assert _keys(table.scan()) == ["a:1", "b:1", "b:2", "b:3", "c:1"]
+    assert _keys(table.scan(start="b:2", end="c:1")) == ["b:2", "b:3"]
+    assert _keys(table.scan(prefix="b:")) == ["b:1", "b:2", "b:3"]
+    assert _keys(table.scan(prefix="b:", after="b:1", limit=1)) == ["b:2"]
+    assert _keys(table.scan(after="b:3")) == ["c:1"]
+
+
+@pytest.mark.parametrize("count", [10, 500])
+def test_bulk_puts_and_deletes_keep_the_key_order(count):
+    table = _table(count, prefix="old")
+    table.put_many([(f"new{index:04d}", index, 1, None) for index in reversed(range(count))])
+    table.put_many([(f"old{index:04d}", "updated", 2, None) for index in range(0, count, 2)])
+    assert _keys(table.scan()) == sorted(table.records)
+    assert len(table) == 2 * count
+    assert table.get("old0000").value == "updated"
+
+    assert table.delete_many([f"old{index:04d}" for index in range(count)] + ["missing"]) == count
+    assert _keys(table.scan()) == [f"new{index:04d}" for index in range(count)]
+
+
+def test_memory_usage_follows_the_payloads():
+    table = _table(100)
+    usage = table.memory_usage()
+    assert usage["records"] == 100
+    assert usage["payload_bytes"] == sum(len(record.payload) for record in table.records.values())
+    table.delete_many([f"k{index:04d}" for index in range(100)])
+    usage = table.memory_usage()
+    assert (usage["records"], usage["payload_bytes"], usage["key_bytes"]) == (0, 0, 0)
+
+
+def test_expired_records_are_hidden_and_popped_in_expiry_order():
+    table = _table()
+    table.put("late", 1, 1, expires_at=300)
+    table.put("early", 1, 1, expires_at=100)
+    table.put("never", 1, 1)
+    table.put("future", 1, 1, expires_at=2 ** 62)
+    assert table.is_expired("early", now=150) and not table.is_expired("never", now=150)
+    assert "early" not in table and table.get("late") is None
+    assert _keys(table.scan()) == ["future", "never"]
+    assert table.pop_expired(now=1000, limit=1) == ["early"]
+    assert table.pop_expired(now=1000, limit=10) == ["late"]
+    assert table.pop_expired(now=1000, limit=10) == []
+
+
+def test_overwritten_expiries_are_skipped():
+    table = _table()
+    table.put("a", 1, 1, expires_at=100)
+    table.put("a", 2, 2, expires_at=500)
+    table.put("b", 1, 1, expires_at=100)
+    table.put("b", 2, 2)
+    table.put("c", 1, 1, expires_at=100)
+    table.delete("c")
+    assert table.expires_at("a") == 500 and table.expires_at("b") is None
+    assert table.pop_expired(now=200, limit=10) == []
+    assert table.pop_expired(now=600, limit=10) == ["a"]
+
+
+def test_expiry_heap_is_rebuilt_before_stale_entries_pile_up():
+    table = _table()
+    for expires_at in range(5000):
+        table.put("a", 1, 1, expires_at=2 ** 62 + expires_at)
+    assert len(table._expiry_heap) <= 2 * len(table._expiry) + 1024
+
+
+@pytest.fixture
+def cold_store(tmp_path):
+    store = ColdStore(str(tmp_path), logging.getLogger("test-cold"), segment_bytes=4096)
+    store.open()
+    yield store
+    store.close()
+
+
+def _spilled_table(cold_store, count=100):
+    table = Table()
+    table.set_indexes({"n": "sorted"})
+    table.put_many([(f"k{index:04d}", {"n": index, "pad": "x" * 100}, 1, None) for index in range(count)])
+    for _, record in table.scan():
+        record.touched = False
+    table.spill(cold_store, 10 ** 9)
+    return table
+
+
+def test_spill_moves_untouched_payloads_to_disk(cold_store):
+    table = Table()
+    table.put("tiny", 1, 1)
+    table.put("cold", {"pad": "x" * 100}, 1)
+    table.put("hot", {"pad": "y" * 100}, 1)
+    table.records["cold"].touched = False
+    assert table.spill(cold_store, 1) == len(table.records["cold"].payload)
+    assert type(table.records["cold"]) is ColdRecord
+    assert type(table.records["hot"]) is StoredRecord and type(table.records["tiny"]) is StoredRecord
+    assert table.memory_usage()["cold_records"] == 1
+
+    assert table.get("cold").value == {"pad": "x" * 100}
+    assert type(table.records["cold"]) is StoredRecord
+    assert table.memory_usage()["cold_records"] == 0
+
+
+def test_cold_records_are_exported_and_reloaded_without_decoding(cold_store):
+    table = _spilled_table(cold_store)
+    assert table.memory_usage()["cold_records"] == 100
+    pages = [table.export_page(None, 40)]
+    while len(pages[-1]) == 40:
+        pages.append(table.export_page(pages[-1][-1][0], 40))
+    assert [len(page) for page in pages] == [40, 40, 20]
+
+    reloaded = Table()
+    reloaded.set_indexes({"n": "sorted"})
+    for page in pages:
+        reloaded.put_many(page, encoded=True)
+    assert {key: record.value for key, record in reloaded.scan()} == {key: record.value for key, record in table.scan()}
+    assert reloaded.indexes["n"].range(10, 13, limit=10) == [(10, "k0010"), (11, "k0011"), (12, "k0012")]
+
+
+def test_relocation_empties_sparse_segments(cold_store):
+    table = _spilled_table(cold_store)
+    table.delete_many([f"k{index:04d}" for index in range(0, 100, 4)])
+    empty, sparse = cold_store.reclaimable(max_live_ratio=0.9)
+    assert sparse and not empty
+    table.relocate(set(sparse), cold_store)
+    assert all(segment.live_bytes == 0 for segment in sparse)
+    for segment in sparse:
+        cold_store.drop(segment)
+    assert [record.value["n"] for _, record in table.scan()] == [n for n in range(100) if n % 4]
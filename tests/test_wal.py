@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import shutil
+
+import pytest
+
+from microservices.libs.services.wal import WriteAheadLog
+
+logger = logging.getLogger("test-wal")
+
+
+async def _pages(*pages):
+    for page in pages:
+        yield page
+
+
+def _segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("wal-"))
+
+
+async def _write(wal, entries):
+    lsns = [wal.append(entry) for entry in entries]
+    await wal.wait_durable(lsns[-1])
+    return lsns
+
+
+def _fail_fsync_once(monkeypatch):
+    real_fsync = os.fsync
+    calls = {"failed": False}
+
+    def fsync(fd):
+        if not calls["failed"]:
+            calls["failed"] = True
+            raise OSError("disk full")
+        return real_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", fsync)
+
+
+def test_recover_replays_entries_logged_after_the_snapshot(tmp_path):
+    async def scenario():
+        wal = WriteAheadLog(str(tmp_path), logger, fsync_interval=0)
+        wal.recover()
+        await wal.start()
+        await _write(wal, [{"n": 1}, {"n": 2}, {"n": 3}])
+        await wal.write_snapshot({"offsets": {0: 7}}, _pages(["users", [["a", b"\x01", 1, None]]], ["users", []]))
+        await _write(wal, [{"n": 4}, {"n": 5}])
+        await wal.stop()
+
+    asyncio.run(scenario())
+
+    recovered = WriteAheadLog(str(tmp_path), logger)
+    state, pages, tail = recovered.recover()
+    assert state == {"offsets": {0: 7}}
+    assert list(pages) == [["users", [["a", b"\x01", 1, None]]], ["users", []]]
+    assert tail == [{"n": 4}, {"n": 5}]
+    assert (recovered.snapshot_lsn, recovered.last_lsn) == (3, 5)
+
+
+def test_snapshot_drops_the_segments_it_covers(tmp_path):
+    async def scenario():
+        wal = WriteAheadLog(str(tmp_path), logger, fsync_interval=0)
+        wal.recover()
+        await wal.start()
+        await _write(wal, [{"n": 1}, {"n": 2}])
+        await wal.write_snapshot({}, _pages())
+        await _write(wal, [{"n": 3}])
+        await wal.stop()
+
+    asyncio.run(scenario())
+    assert _segments(tmp_path) == ["wal-00000000000000000003.log"]
+    assert "snapshot.bin.tmp" not in os.listdir(tmp_path)
+
+
+def test_torn_record_is_truncated_and_later_segments_set_aside(tmp_path):
+    async def scenario():
+        wal = WriteAheadLog(str(tmp_path), logger, fsync_interval=0)
+        wal.recover()
+        await wal.start()
+        await _write(wal, [{"n": 1}, {"n": 2}, {"n": 3}])
+        await wal.stop()
+
+    asyncio.run(scenario())
+    [first] = _segments(tmp_path)
+    first_path = os.path.join(tmp_path, first)
+    later_path = os.path.join(tmp_path, "wal-00000000000000000004.log")
+    shutil.copy(first_path, later_path)
+    size = os.path.getsize(first_path)
+    os.truncate(first_path, size - 3)
+
+    recovered = WriteAheadLog(str(tmp_path), logger)
+    _, _, tail = recovered.recover()
+    assert tail == [{"n": 1}, {"n": 2}]
+    assert recovered.last_lsn == 2
+    assert os.path.exists(f"{later_path}.discarded")
+    assert not os.path.exists(later_path)
+    assert WriteAheadLog(str(tmp_path), logger).recover()[2] == [{"n": 1}, {"n": 2}]
+
+
+def test_lost_group_is_undone_and_cut_off_while_later_groups_are_written(tmp_path, monkeypatch):
+    undone = []
+
+    async def scenario():
+        wal = WriteAheadLog(str(tmp_path), logger, fsync_interval=0)
+        wal.recover()
+        await wal.start()
+        await _write(wal, [{"n": 1}])
+
+        _fail_fsync_once(monkeypatch)
+        lost = wal.append({"n": 2}, undo=lambda: undone.append(2))
+        with pytest.raises(RuntimeError):
+            await wal.wait_durable(lost)
+
+        await _write(wal, [{"n": 3}])
+        await wal.stop()
+        return wal.lost_groups
+
+    assert asyncio.run(scenario()) == 1
+    assert undone == [2]
+    assert WriteAheadLog(str(tmp_path), logger).recover()[2] == [{"n": 1}, {"n": 3}]
+
+
+def test_snapshot_is_refused_when_a_group_is_lost_while_pages_are_read(tmp_path, monkeypatch):
+    async def scenario():
+        wal = WriteAheadLog(str(tmp_path), logger, fsync_interval=0)
+        wal.recover()
+        await wal.start()
+        await _write(wal, [{"n": 1}])
+
+        async def pages():
+            yield ["users", [["a", b"\x01", 1, None]]]
+            _fail_fsync_once(monkeypatch)
+            wal.append({"n": 2})
+
+        with pytest.raises(RuntimeError, match="lost"):
+            await wal.write_snapshot({}, pages())
+        await wal.stop()
+
+    asyncio.run(scenario())
+    assert "snapshot.bin" not in os.listdir(tmp_path)
+    assert "snapshot.bin.tmp" not in os.listdir(tmp_path)